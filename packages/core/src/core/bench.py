@@ -0,0 +1,647 @@
+"""
+离线同步基准测试
+
+FakeAkshare 是 akshare 的本地替身：为同步模块用到的接口返回列名、列顺序
+与数据类型都与真实接口一致的合成数据，并可以模拟延迟、随机错误与限流。
+run_benchmark 把数据库切换到临时 SQLite 文件，把同步模块的 akshare 入口
+（core.sync.ak_client.ak）指向替身，依次运行各 sync_* 并统计端到端吞吐。
+
+同步模块也可以在正常运行时指向替身：.env 中设置 AK_PROVIDER=fake，
+FAKE_AK_LATENCY / FAKE_AK_ERROR_RATE / FAKE_AK_RATE_LIMIT / FAKE_AK_SYMBOLS
+控制替身行为。
+
+注意：core.sync 在导入时会初始化数据库，run_benchmark 先切换数据库再导入。
+"""
+
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from core.database import configure_database, init_db
+from core.logger import log
+
+
+class ThrottledError(ConnectionError):
+    """替身模拟的限流错误（对应数据源返回 429 / 断开连接）"""
+
+
+# stock_zh_a_spot_em 返回的列，与 sync_spot 中按位置重命名的顺序一致
+SPOT_COLUMNS = [
+    "序号", "代码", "名称", "最新价", "涨跌幅", "涨跌额", "成交量", "成交额", "振幅",
+    "最高", "最低", "今开", "昨收", "量比", "换手率", "市盈率-动态", "市净率",
+    "总市值", "流通市值", "涨速", "5分钟涨跌", "60日涨跌幅", "年初至今涨跌幅",
+]
+
+# stock_zh_a_hist 返回的列，与 sync_hist 中按位置重命名的顺序一致
+HIST_COLUMNS = [
+    "日期", "股票代码", "开盘", "收盘", "最高", "最低", "成交量", "成交额",
+    "振幅", "涨跌幅", "涨跌额", "换手率",
+]
+
+# stock_financial_debt_ths 的部分报表科目
+DEBT_ITEMS = [
+    "货币资金", "交易性金融资产", "应收票据及应收账款", "预付款项", "存货",
+    "流动资产合计", "固定资产", "无形资产", "资产合计", "短期借款",
+    "应付票据及应付账款", "流动负债合计", "长期借款", "负债合计",
+    "实收资本（或股本）", "资本公积", "未分配利润", "所有者权益（或股东权益）合计",
+]
+
+
+def _amount(value: float) -> str:
+    """同花顺接口的金额格式，如 1.23亿、4567.89万"""
+    if abs(value) >= 1e8:
+        return f"{value / 1e8:.2f}亿"
+    return f"{value / 1e4:.2f}万"
+
+
+class FakeAkshare:
+    """
+    akshare 的本地替身
+
+    Args:
+        symbols: 全市场股票数
+        latency: 平均响应时间（秒）
+        jitter: 响应时间的随机波动比例
+        error_rate: 随机失败的概率
+        rate_limit: 每秒允许的请求数，超出时抛出 ThrottledError，0 表示不限流
+        history_days: 无开始日期时生成的日线天数
+        seed: 随机种子，相同参数下生成的数据相同
+    """
+
+    def __init__(
+        self,
+        symbols: int = 200,
+        latency: float = 0.05,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        history_days: int = 750,
+        seed: int = 42,
+    ):
+        self.symbols = symbols
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.history_days = history_days
+        self.seed = seed
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    @classmethod
+    def from_env(cls) -> "FakeAkshare":
+        return cls(
+            symbols=int(os.getenv("FAKE_AK_SYMBOLS", 200)),
+            latency=float(os.getenv("FAKE_AK_LATENCY", 0.05)),
+            error_rate=float(os.getenv("FAKE_AK_ERROR_RATE", 0.0)),
+            rate_limit=float(os.getenv("FAKE_AK_RATE_LIMIT", 0.0)),
+        )
+
+    # ----------------------------- 故障注入 -----------------------------
+
+    def _request(self, name: str):
+        """模拟一次网络请求：限流检查、延迟与随机错误"""
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            throttled = False
+            if self.rate_limit > 0:
+                while self._recent and now - self._recent[0] > 1.0:
+                    self._recent.popleft()
+                throttled = len(self._recent) >= self.rate_limit
+                self._recent.append(now)
+            failed = self._random.random() < self.error_rate
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+            if throttled or failed:
+                self.errors += 1
+        time.sleep(max(0.0, delay))
+        if throttled:
+            raise ThrottledError(f"{name}: 429 Too Many Requests")
+        if failed:
+            raise ConnectionError(f"{name}: Connection aborted")
+
+    def _rng(self, *key) -> np.random.Generator:
+        # 同一只股票、同一接口每次生成相同的数据
+        seed = zlib.crc32("|".join(map(str, (self.seed, *key))).encode("utf-8"))
+        return np.random.default_rng(seed)
+
+    def codes(self) -> List[str]:
+        """合成的股票代码：沪市主板、深市主板、创业板交替"""
+        prefixes = ("600", "000", "300")
+        return [
+            f"{prefixes[i % 3]}{i // 3:03d}" for i in range(self.symbols)
+        ]
+
+    @staticmethod
+    def _code(symbol: str) -> str:
+        return "".join(ch for ch in symbol if ch.isdigit())[-6:]
+
+    def _report_dates(self, count: int) -> List[datetime.date]:
+        today = datetime.date.today()
+        quarter_ends = []
+        year = today.year
+        while len(quarter_ends) < count:
+            for month, day in ((12, 31), (9, 30), (6, 30), (3, 31)):
+                date = datetime.date(year, month, day)
+                if date < today and len(quarter_ends) < count:
+                    quarter_ends.append(date)
+            year -= 1
+        return quarter_ends
+
+    # ----------------------------- 接口 -----------------------------
+
+    def stock_zh_a_spot_em(self) -> pd.DataFrame:
+        self._request("stock_zh_a_spot_em")
+        codes = self.codes()
+        n = len(codes)
+        rng = self._rng("spot", datetime.date.today())
+        price = rng.uniform(3, 200, n).round(2)
+        pre_close = (price / (1 + rng.normal(0, 0.02, n))).round(2)
+        values = {
+            "序号": np.arange(1, n + 1),
+            "代码": codes,
+            "名称": [f"股票{code}" for code in codes],
+            "最新价": price,
+            "涨跌幅": ((price / pre_close - 1) * 100).round(2),
+            "涨跌额": (price - pre_close).round(2),
+            "成交量": rng.integers(1_000, 5_000_000, n).astype(float),
+            "成交额": rng.uniform(1e6, 5e9, n).round(2),
+            "振幅": rng.uniform(0, 10, n).round(2),
+            "最高": (price * 1.02).round(2),
+            "最低": (price * 0.98).round(2),
+            "今开": pre_close,
+            "昨收": pre_close,
+            "量比": rng.uniform(0.3, 3, n).round(2),
+            "换手率": rng.uniform(0.1, 15, n).round(2),
+            "市盈率-动态": rng.uniform(-50, 200, n).round(2),
+            "市净率": rng.uniform(0.5, 20, n).round(2),
+            "总市值": rng.uniform(1e9, 2e12, n).round(0),
+            "流通市值": rng.uniform(5e8, 1e12, n).round(0),
+            "涨速": rng.normal(0, 0.3, n).round(2),
+            "5分钟涨跌": rng.normal(0, 0.5, n).round(2),
+            "60日涨跌幅": rng.normal(0, 15, n).round(2),
+            "年初至今涨跌幅": rng.normal(0, 25, n).round(2),
+        }
+        # 真实接口中停牌股票的价格字段为空
+        df = pd.DataFrame(values, columns=SPOT_COLUMNS)
+        df.loc[rng.random(n) < 0.02, ["最新价", "涨跌幅", "成交量"]] = np.nan
+        return df
+
+    def stock_zh_a_hist(
+        self,
+        symbol: str = "000001",
+        period: str = "daily",
+        start_date: str = "19700101",
+        end_date: str = "20500101",
+        adjust: str = "",
+        **kwargs,
+    ) -> pd.DataFrame:
+        self._request("stock_zh_a_hist")
+        code = self._code(symbol)
+        last = min(pd.Timestamp(end_date), pd.Timestamp(datetime.date.today()))
+        first = max(
+            pd.Timestamp(start_date), last - pd.offsets.BDay(self.history_days - 1)
+        )
+        dates = pd.bdate_range(first, last)
+        if dates.empty:
+            return pd.DataFrame(columns=HIST_COLUMNS)
+        # 同一只股票、同一复权类型每次生成相同的价格序列
+        rng = self._rng("hist", code, adjust)
+        steps = rng.normal(0, 0.02, len(dates) + 1)
+        close = (20 * np.exp(np.cumsum(steps)))[1:].round(2)
+        prev = np.concatenate([[close[0]], close[:-1]])
+        volume = rng.integers(10_000, 2_000_000, len(dates))
+        return pd.DataFrame(
+            {
+                "日期": dates.date,
+                "股票代码": code,
+                "开盘": prev,
+                "收盘": close,
+                "最高": np.maximum(prev, close) * 1.01,
+                "最低": np.minimum(prev, close) * 0.99,
+                "成交量": volume,
+                "成交额": (volume * close * 100).round(2),
+                "振幅": (np.abs(close - prev) / prev * 100 + 1).round(2),
+                "涨跌幅": ((close / prev - 1) * 100).round(2),
+                "涨跌额": (close - prev).round(2),
+                "换手率": rng.uniform(0.1, 10, len(dates)).round(2),
+            },
+            columns=HIST_COLUMNS,
+        )
+
+    def stock_zh_a_daily(self, symbol: str, adjust: str = "", **kwargs) -> pd.DataFrame:
+        self._request("stock_zh_a_daily")
+        code = self._code(symbol)
+        column = "hfq_factor" if adjust.startswith("hfq") else "qfq_factor"
+        rng = self._rng("factor", code)
+        dates = pd.to_datetime(
+            sorted(rng.choice(pd.bdate_range("2010-01-01", periods=3500), 6, replace=False))
+        )
+        factors = np.cumprod(rng.uniform(1.0, 1.2, len(dates)))
+        if column == "qfq_factor":
+            factors = factors / factors[-1]
+        return pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), column: factors})
+
+    def stock_zygc_em(self, symbol: str) -> pd.DataFrame:
+        self._request("stock_zygc_em")
+        code = self._code(symbol)
+        rng = self._rng("zygc", code)
+        rows = []
+        for report_date in self._report_dates(4):
+            for category in ("按产品分类", "按地区分类"):
+                for i in range(3):
+                    income = float(rng.uniform(1e7, 1e10))
+                    cost = income * float(rng.uniform(0.4, 0.9))
+                    rows.append(
+                        {
+                            "股票代码": symbol,
+                            "报告日期": report_date,
+                            "分类类型": category,
+                            "主营构成": f"{category[1:3]}{i + 1}",
+                            "主营收入": income,
+                            "收入比例": float(rng.uniform(0, 1)),
+                            "主营成本": cost,
+                            "成本比例": float(rng.uniform(0, 1)),
+                            "主营利润": income - cost,
+                            "利润比例": float(rng.uniform(0, 1)),
+                            "毛利率": (income - cost) / income,
+                        }
+                    )
+        return pd.DataFrame(rows)
+
+    def stock_news_em(self, symbol: str) -> pd.DataFrame:
+        self._request("stock_news_em")
+        code = self._code(symbol)
+        now = datetime.datetime.now().replace(microsecond=0)
+        return pd.DataFrame(
+            {
+                "关键词": code,
+                "新闻标题": [f"{code} 公司公告 {i}" for i in range(10)],
+                "新闻内容": [f"{code} 的第 {i} 条新闻内容" for i in range(10)],
+                "发布时间": [
+                    (now - datetime.timedelta(hours=6 * i)).strftime("%Y-%m-%d %H:%M:%S")
+                    for i in range(10)
+                ],
+                "文章来源": "本地替身",
+                "新闻链接": [f"http://localhost/news/{code}/{i}" for i in range(10)],
+            }
+        )
+
+    def stock_financial_debt_ths(self, symbol: str, indicator: str = "按报告期") -> pd.DataFrame:
+        self._request("stock_financial_debt_ths")
+        code = self._code(symbol)
+        rng = self._rng("debt", code)
+        dates = self._report_dates(12)
+        data = {"报告期": [d.strftime("%Y-%m-%d") for d in dates]}
+        for item in DEBT_ITEMS:
+            data[item] = [_amount(v) for v in rng.uniform(1e6, 1e11, len(dates))]
+        data["报表核心指标"] = ""
+        data["报表全部指标"] = ""
+        return pd.DataFrame(data)
+
+    def stock_research_report_em(self, symbol: str) -> pd.DataFrame:
+        self._request("stock_research_report_em")
+        code = self._code(symbol)
+        rng = self._rng("report", code)
+        n = 8
+        from core.sync.sync_research_report import COLUMN_MAP
+
+        data = {}
+        for column in COLUMN_MAP:
+            if column == "股票代码":
+                data[column] = code
+            elif column == "日期":
+                data[column] = [
+                    (datetime.date.today() - datetime.timedelta(days=20 * i)).isoformat()
+                    for i in range(n)
+                ]
+            elif column == "近一月个股研报数":
+                data[column] = rng.integers(0, 20, n)
+            elif "盈利预测" in column:
+                data[column] = rng.uniform(0.1, 50, n).round(2)
+            elif column == "报告PDF链接":
+                data[column] = [f"http://localhost/report/{code}/{i}.pdf" for i in range(n)]
+            else:
+                data[column] = f"{column}{code}"
+        return pd.DataFrame(data)
+
+    def stock_financial_abstract_ths(self, symbol: str, indicator: str = "按报告期") -> pd.DataFrame:
+        self._request("stock_financial_abstract_ths")
+        code = self._code(symbol)
+        rng = self._rng("abstract", code)
+        from core.sync.sync_financial_abstract import COLUMN_MAP
+
+        dates = self._report_dates(20)
+        data = {"报告期": [d.strftime("%Y-%m-%d") for d in dates]}
+        for column in COLUMN_MAP:
+            if column == "报告期":
+                continue
+            values = rng.uniform(-50, 1e10, len(dates))
+            if "率" in column:
+                data[column] = [f"{v % 100:.2f}%" for v in values]
+            else:
+                data[column] = [_amount(v) for v in values]
+        return pd.DataFrame(data)
+
+    def stock_financial_analysis_indicator(
+        self, symbol: str, start_year: str = "1900"
+    ) -> pd.DataFrame:
+        self._request("stock_financial_analysis_indicator")
+        code = self._code(symbol)
+        rng = self._rng("analysis", code)
+        from core.sync.sync_financial_analysis import COLUMN_MAP
+
+        dates = [d for d in self._report_dates(40) if d.year >= int(start_year)]
+        data = {"日期": [d.strftime("%Y-%m-%d") for d in dates]}
+        for column in COLUMN_MAP:
+            if column != "日期":
+                values = rng.normal(10, 30, len(dates))
+                # 新浪接口中部分指标缺失为空
+                values[rng.random(len(dates)) < 0.1] = np.nan
+                data[column] = values
+        return pd.DataFrame(data)
+
+    def stock_yysj_em(self, symbol: str = "沪深A股", date: str = "20240331") -> pd.DataFrame:
+        self._request("stock_yysj_em")
+        period = datetime.datetime.strptime(date, "%Y%m%d").date()
+        codes = self.codes()
+        n = len(codes)
+        rng = self._rng("yysj", period)
+        scheduled = [period + datetime.timedelta(days=int(d)) for d in rng.integers(15, 120, n)]
+        today = datetime.date.today()
+        return pd.DataFrame(
+            {
+                "序号": np.arange(1, n + 1),
+                "股票代码": codes,
+                "股票简称": [f"股票{code}" for code in codes],
+                "首次预约时间": scheduled,
+                "一次变更日期": None,
+                "二次变更日期": None,
+                "三次变更日期": None,
+                "实际披露时间": [d if d <= today else None for d in scheduled],
+                "报告期": period,
+            }
+        )
+
+    def stock_zh_a_gdhs_detail_em(self, symbol: str) -> pd.DataFrame:
+        self._request("stock_zh_a_gdhs_detail_em")
+        code = self._code(symbol)
+        rng = self._rng("gdhs", code)
+        dates = self._report_dates(12)
+        current = rng.integers(10_000, 500_000, len(dates))
+        previous = np.concatenate([current[1:], current[-1:]])
+        equity = int(rng.integers(1e8, 1e10))
+        return pd.DataFrame(
+            {
+                "股东户数统计截止日": [d.isoformat() for d in dates],
+                "区间涨跌幅": rng.normal(0, 10, len(dates)).round(2),
+                "股东户数-本次": current,
+                "股东户数-上次": previous,
+                "股东户数-增减": current - previous,
+                "股东户数-增减比例": ((current / previous - 1) * 100).round(2),
+                "户均持股市值": rng.uniform(1e4, 1e6, len(dates)).round(2),
+                "户均持股数量": (equity / current).round(2),
+                "总市值": rng.uniform(1e9, 1e11, len(dates)).round(0),
+                "总股本": equity,
+                "股本变动": 0,
+                "股本变动原因": "",
+                "股东户数公告日期": [
+                    (d + datetime.timedelta(days=20)).isoformat() for d in dates
+                ],
+                "代码": code,
+                "名称": f"股票{code}",
+            }
+        )
+
+    def stock_zh_a_gdhs(self, symbol: str = "最新") -> pd.DataFrame:
+        self._request("stock_zh_a_gdhs")
+        codes = self.codes()
+        n = len(codes)
+        end_date = (
+            self._report_dates(1)[0]
+            if symbol == "最新"
+            else datetime.datetime.strptime(symbol, "%Y%m%d").date()
+        )
+        rng = self._rng("gdhs_bulk", end_date)
+        current = rng.integers(10_000, 500_000, n)
+        previous = rng.integers(10_000, 500_000, n)
+        equity = rng.integers(1e8, 1e10, n)
+        return pd.DataFrame(
+            {
+                "代码": codes,
+                "名称": [f"股票{code}" for code in codes],
+                "最新价": rng.uniform(3, 200, n).round(2),
+                "涨跌幅": rng.normal(0, 2, n).round(2),
+                "股东户数-本次": current,
+                "股东户数-上次": previous,
+                "股东户数-增减": current - previous,
+                "股东户数-增减比例": ((current / previous - 1) * 100).round(2),
+                "区间涨跌幅": rng.normal(0, 10, n).round(2),
+                "股东户数统计截止日-本次": end_date,
+                "股东户数统计截止日-上次": end_date - datetime.timedelta(days=91),
+                "户均持股市值": rng.uniform(1e4, 1e6, n).round(2),
+                "户均持股数量": (equity / current).round(2),
+                "总市值": rng.uniform(1e9, 1e11, n).round(0),
+                "总股本": equity,
+                "公告日期": end_date + datetime.timedelta(days=20),
+            }
+        )
+
+    def stock_gpzy_pledge_ratio_em(self, date: str) -> pd.DataFrame:
+        self._request("stock_gpzy_pledge_ratio_em")
+        trade_date = datetime.datetime.strptime(date, "%Y%m%d").date()
+        # 真实接口按周发布，非周五返回空结果
+        if trade_date.weekday() != 4:
+            return pd.DataFrame()
+        codes = self.codes()
+        n = len(codes)
+        rng = self._rng("pledge", trade_date)
+        shares = rng.uniform(10, 1e5, n).round(2)
+        restricted = (shares * rng.uniform(0, 0.5, n)).round(2)
+        return pd.DataFrame(
+            {
+                "序号": np.arange(1, n + 1),
+                "股票代码": codes,
+                "股票简称": [f"股票{code}" for code in codes],
+                "交易日期": trade_date,
+                "所属行业": "制造业",
+                "质押比例": rng.uniform(0, 60, n).round(2),
+                "质押股数": shares,
+                "质押市值": (shares * rng.uniform(3, 200, n)).round(2),
+                "质押笔数": rng.integers(1, 50, n).astype(float),
+                "无限售股质押数": shares - restricted,
+                "限售股质押数": restricted,
+                "近一年涨跌幅": rng.normal(0, 25, n).round(2),
+                "所属行业代码": "016",
+            }
+        )
+
+    def stock_main_stock_holder(self, stock: str) -> pd.DataFrame:
+        self._request("stock_main_stock_holder")
+        code = self._code(stock)
+        rng = self._rng("holder", code)
+        rows = []
+        for report_date in self._report_dates(4):
+            for i in range(10):
+                rows.append(
+                    {
+                        "编号": str(i + 1),
+                        "股东名称": f"股东{code}-{i + 1}",
+                        "持股数量": float(rng.integers(1e6, 1e9)),
+                        "持股比例": float(rng.uniform(0.1, 30)),
+                        "股本性质": "流通A股",
+                        "截至日期": report_date.isoformat(),
+                        "公告日期": (report_date + datetime.timedelta(days=30)).isoformat(),
+                        "股东说明": "",
+                        "股东总数": float(rng.integers(1e4, 5e5)),
+                        "平均持股数": float(rng.uniform(1e3, 1e5)),
+                    }
+                )
+        return pd.DataFrame(rows)
+
+
+# ----------------------------- 基准测试 -----------------------------
+
+
+@dataclass
+class BenchResult:
+    """一个同步函数的基准结果"""
+
+    name: str
+    symbols: int
+    success: int
+    failed: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        return self.symbols / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _targets(max_workers: int) -> Dict[str, Callable[[], object]]:
+    from core import sync
+
+    today = datetime.date.today()
+    # 任务表按结束日期区分批次，两种引擎使用不同的结束日期与复权类型，互不影响
+    yesterday = today - datetime.timedelta(days=1)
+    return {
+        "hist": lambda: sync.sync_stock_zh_a_hist_all(
+            end_date=today.strftime("%Y%m%d"), adjust="hfq", max_workers=max_workers
+        ),
+        "hist_async": lambda: sync.sync_stock_zh_a_hist_all(
+            end_date=yesterday.strftime("%Y%m%d"),
+            adjust="qfq",
+            max_workers=max_workers,
+            engine="async",
+        ),
+        "business_composition": lambda: sync.sync_all_stock_business_compositions(max_workers),
+        "news": lambda: sync.sync_all_stock_news(max_workers),
+        "financial_debt": lambda: sync.sync_all_stock_financial_debts(max_workers),
+        "research_report": lambda: sync.sync_all_stock_research_reports(max_workers),
+        "financial_abstract": lambda: sync.sync_all_stock_financial_abstracts(max_workers),
+        "financial_analysis": lambda: sync.sync_all_stock_financial_analyses(max_workers),
+        "gdhs": lambda: sync.sync_all_stock_gdhs(max_workers),
+        "main_holder": lambda: sync.sync_all_stock_main_holders(max_workers),
+        "pledge_ratio": lambda: _market_result(sync.sync_stock_pledge_ratio),
+    }
+
+
+def _market_result(sync_market):
+    """全市场接口一次请求同步全部股票，按写入的股票数统计"""
+    from core.sync.runner import RunResult
+
+    records = sync_market()
+    return RunResult(total=len(records), success=len(records))
+
+
+BENCH_TARGETS = (
+    "hist",
+    "hist_async",
+    "business_composition",
+    "news",
+    "financial_debt",
+    "research_report",
+    "financial_abstract",
+    "financial_analysis",
+    "gdhs",
+    "main_holder",
+    "pledge_ratio",
+)
+
+
+def run_benchmark(
+    targets: Optional[Sequence[str]] = None,
+    provider: Optional[FakeAkshare] = None,
+    max_workers: int = 5,
+    db_path: Optional[str] = None,
+) -> List[BenchResult]:
+    """
+    在临时 SQLite 库上用替身数据源运行同步函数并统计吞吐
+
+    Args:
+        targets: 要测试的同步函数，见 BENCH_TARGETS，默认全部
+        provider: akshare 替身，默认 FakeAkshare()
+        max_workers: 并发数
+        db_path: SQLite 文件路径，默认临时文件
+
+    Returns:
+        List[BenchResult]: 每个同步函数的股票数、成功 / 失败数与耗时
+    """
+    targets = list(targets or BENCH_TARGETS)
+    unknown = [t for t in targets if t not in BENCH_TARGETS]
+    if unknown:
+        raise ValueError(f"不支持的基准测试目标: {unknown}，可选 {BENCH_TARGETS}")
+    provider = provider or FakeAkshare()
+
+    # 必须在导入 core.sync 之前切换数据库，core.sync 导入时会初始化表结构
+    db_path = db_path or os.path.join(tempfile.mkdtemp(prefix="stock-bench-"), "bench.db")
+    configure_database("sqlite", f"sqlite:///{os.path.abspath(db_path)}")
+    init_db()
+    os.environ["AK_CACHE_MODE"] = "off"
+    log.info(f"基准测试数据库: {db_path}")
+
+    from core.sync.ak_client import ak
+    from core.sync import sync_stock_zh_a_spot_em
+
+    ak.use(provider)
+    # 行情快照决定全市场股票列表
+    started = time.time()
+    spot = sync_stock_zh_a_spot_em()
+    results = [BenchResult("spot", len(spot), len(spot), 0, time.time() - started)]
+
+    runners = _targets(max_workers)
+    for name in targets:
+        log.info(f"基准测试: {name}")
+        started = time.time()
+        result = runners[name]()
+        elapsed = time.time() - started
+        results.append(
+            BenchResult(
+                name,
+                getattr(result, "total", 0),
+                getattr(result, "success", 0),
+                getattr(result, "failed", 0),
+                elapsed,
+            )
+        )
+
+    log.info(f"替身数据源请求: {provider.calls}，模拟失败: {provider.errors}")
+    for result in results:
+        log.info(
+            f"{result.name}: {result.symbols} 只, 成功 {result.success}, 失败 {result.failed}, "
+            f"耗时 {result.elapsed:.2f}s, {result.rate:.2f} 只/秒"
+        )
+    return results
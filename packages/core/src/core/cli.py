@@ -17,6 +17,28 @@ def version():
     typer.echo(f"Stock Chose Service CLI version: {VERSION}")
 
 
+@app.command()
+def migrate(
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Print the statements without executing them"
+    ),
+    partition: bool = typer.Option(
+        False, "--partition", help="Range-partition large tables by year (MySQL only)"
+    ),
+):
+    """
+    Migrate the database schema to match the models (tables, columns, primary keys, indexes).
+    Safe to run repeatedly.
+    """
+    from core.migrations import migrate as run_migrations
+
+    typer.echo("Starting database migration...")
+    statements = run_migrations(dry_run=dry_run, partition=partition)
+    for statement in statements:
+        typer.echo(statement)
+    typer.echo(f"Database migration completed, statements: {len(statements)}")
+
+
 @app.command()
 def sync_all():
     """
@@ -54,17 +76,157 @@ def sync_hist_all(
     end_date: str = "20500101",
     adjust: str = "hfq",
     max_workers: int = 5,  # 新增参数，默认并发数为5
+    engine: str = typer.Option(
+        "thread",
+        "--engine",
+        help="thread: thread pool; async: rate-limited asyncio fetch/write pipeline",
+    ),
 ):
     """
     Sync historical stock data for all symbols.
+    Use --adjust factor to store unadjusted bars plus adjustment factors.
+    Use --adjust qfq,hfq,raw (or all) to fetch several adjust types per symbol in one pass.
     """
     from core.sync import sync_stock_zh_a_hist_all
 
     typer.echo("Starting historical stock data synchronization...")
-    sync_stock_zh_a_hist_all(period, start_date, end_date, adjust, max_workers)
+    sync_stock_zh_a_hist_all(period, start_date, end_date, adjust, max_workers, engine)
     typer.echo("Historical stock data synchronization completed.")
 
 
+@app.command(
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True}
+)
+def sync_sharded(
+    ctx: typer.Context,
+    command: str = typer.Argument(
+        ..., help="Sync command to shard, e.g. sync-hist-all, sync-all-gdhs"
+    ),
+    shards: int = typer.Option(2, "--shards", "-n", help="Number of shard workers"),
+    proxies: str = typer.Option(
+        None,
+        "--proxies",
+        help="JSON file with a list of proxy URLs; shard i uses proxy i % len",
+    ),
+    poll_interval: float = typer.Option(
+        10.0, "--poll-interval", help="Seconds between progress reports"
+    ),
+):
+    """
+    Run a sync command across N shard workers and merge their results.
+    Extra options are passed through to every worker, e.g.
+    `sync-sharded sync-all-gdhs -n 4 --proxies proxies.json -w 5`.
+    On several machines, set SYNC_SHARD_INDEX / SYNC_SHARD_COUNT and run the command on each.
+    """
+    from core.sync.shard import load_proxies, run_shards
+
+    typer.echo(f"Starting {command} on {shards} shards...")
+    summary = run_shards(
+        [command, *ctx.args], shards, load_proxies(proxies), poll_interval
+    )
+    for shard in summary.shards:
+        progress = shard.progress
+        typer.echo(
+            f"shard {shard.shard}: exit={shard.returncode} "
+            f"total={progress.get('total', 0)} success={progress.get('success', 0)} "
+            f"failed={progress.get('failed', 0)}"
+        )
+    typer.echo(
+        f"Sharded sync completed. total={summary.total} success={summary.success} "
+        f"failed={summary.failed} elapsed={summary.elapsed:.0f}s"
+    )
+    if not summary.ok:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def repair_hist_gaps(
+    adjust: str = typer.Option("hfq", "--adjust", "-a", help="Adjustment type"),
+    start_date: str = typer.Option(
+        None, "--start-date", "-s", help="Only check bars from this date, e.g., 20150101"
+    ),
+    end_date: str = typer.Option(None, "--end-date", "-e", help="Only check bars up to this date"),
+    max_workers: int = typer.Option(
+        5, "--max-workers", "-w", help="Maximum number of concurrent workers"
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only report the gaps, do not fetch"
+    ),
+):
+    """
+    Find missing trading days inside each symbol's stored history and fetch only those ranges.
+    """
+    from core.sync.gaps import detect_history_gaps, repair_history_gaps
+
+    if dry_run:
+        gaps = detect_history_gaps(adjust, start_date=start_date, end_date=end_date)
+        typer.echo(gaps.to_string(index=False) if not gaps.empty else "No gaps found.")
+        return
+
+    typer.echo(f"Repairing history gaps for adjust: {adjust}...")
+    result = repair_history_gaps(
+        adjust, start_date=start_date, end_date=end_date, max_workers=max_workers
+    )
+    typer.echo(
+        f"History gap repair completed. ranges={result.total} "
+        f"success={result.success} failed={result.failed}"
+    )
+
+
+@app.command()
+def sync_adjust_factor(
+    symbol: str = typer.Argument(
+        ...,
+        help="Stock symbol to sync, e.g., SH600519, 600519",
+    ),
+):
+    """
+    Sync adjustment factors (qfq/hfq) for a specific stock symbol from Sina (新浪财经).
+    """
+    from core.sync import sync_stock_adjust_factor
+
+    typer.echo(f"Starting adjust factor synchronization for symbol: {symbol}...")
+    sync_stock_adjust_factor(symbol)
+    typer.echo("Adjust factor synchronization completed.")
+
+
+@app.command()
+def compact_hist_store(
+    adjust: str = typer.Option("hfq", "--adjust", "-a", help="Adjustment type"),
+):
+    """
+    Compact the columnar history store partitions of an adjust type.
+    """
+    from core.data import hist_store
+
+    typer.echo(f"Compacting history store for adjust: {adjust}...")
+    rows = hist_store.compact(adjust)
+    typer.echo(f"History store compaction completed, rows: {rows}")
+
+
+@app.command()
+def build_hist_cube(
+    adjust: str = typer.Option("hfq", "--adjust", "-a", help="Adjustment type"),
+    start_date: str = typer.Option(
+        None, "--start-date", "-s", help="First date to materialize, e.g., 20150101"
+    ),
+    update: bool = typer.Option(
+        False, "--update", "-u", help="Append new trading days instead of rebuilding"
+    ),
+):
+    """
+    Build (or incrementally update) the memory-mapped daily history cube of an adjust type.
+    """
+    from core.data.cube import OhlcvCube
+
+    cube = OhlcvCube(adjust)
+    typer.echo(f"Building history cube for adjust: {adjust}...")
+    meta = cube.update() if update else cube.build(start_date)
+    typer.echo(
+        f"History cube completed: {len(meta['symbols'])} symbols, {len(meta['dates'])} days"
+    )
+
+
 @app.command()
 def sync_business_composition(
     symbol: str = typer.Argument(
@@ -124,6 +286,14 @@ def sync_all_financial_debts(
     max_workers: int = typer.Option(
         5, "--max-workers", "-w", help="Maximum number of concurrent workers"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
+    scheduled: bool = typer.Option(
+        True,
+        "--scheduled/--all",
+        help="Only sync symbols whose next report is due or recently published",
+    ),
 ):
     """
     Sync financial debt data (balance sheet) for all stocks from THS (同花顺).
@@ -131,7 +301,7 @@ def sync_all_financial_debts(
     from core.sync import sync_all_stock_financial_debts
 
     typer.echo("Starting financial debt data synchronization for all stocks...")
-    sync_all_stock_financial_debts(max_workers)
+    sync_all_stock_financial_debts(max_workers, swap=swap, scheduled=scheduled)
     typer.echo("Financial debt data synchronization for all stocks completed.")
 
 
@@ -167,6 +337,9 @@ def sync_all_research_reports(
     max_workers: int = typer.Option(
         5, "--max-workers", "-w", help="Maximum number of concurrent workers"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
 ):
     """
     Sync research report data for all stocks from EM (东方财富).
@@ -174,10 +347,45 @@ def sync_all_research_reports(
     from core.sync import sync_all_stock_research_reports
 
     typer.echo("Starting research report data synchronization for all stocks...")
-    sync_all_stock_research_reports(max_workers)
+    sync_all_stock_research_reports(max_workers, swap=swap)
     typer.echo("Research report data synchronization for all stocks completed.")
 
 
+@app.command()
+def sync_news(
+    symbol: str = typer.Argument(
+        ...,
+        help="Stock symbol to sync, e.g., SH688041, SZ000001, BJ838169, 688041, 000001, 838169",
+    ),
+):
+    """
+    Sync new stock news for a specific stock symbol from EM (东方财富).
+    Only articles newer than the stored watermark and not yet saved are inserted.
+    """
+    from core.sync import sync_stock_news
+
+    typer.echo(f"Starting stock news synchronization for symbol: {symbol}...")
+    sync_stock_news(symbol)
+    typer.echo("Stock news synchronization completed.")
+
+
+@app.command()
+def sync_all_news(
+    max_workers: int = typer.Option(
+        5, "--max-workers", "-w", help="Maximum number of concurrent workers"
+    ),
+):
+    """
+    Sync new stock news for all stocks from EM (东方财富).
+    Symbols whose latest headline is unchanged are skipped.
+    """
+    from core.sync import sync_all_stock_news
+
+    typer.echo("Starting stock news synchronization for all stocks...")
+    sync_all_stock_news(max_workers)
+    typer.echo("Stock news synchronization for all stocks completed.")
+
+
 @app.command()
 def sync_financial_abstract(
     symbol: str = typer.Argument(
@@ -210,6 +418,14 @@ def sync_all_financial_abstracts(
     max_workers: int = typer.Option(
         5, "--max-workers", "-w", help="Maximum number of concurrent workers"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
+    scheduled: bool = typer.Option(
+        True,
+        "--scheduled/--all",
+        help="Only sync symbols whose next report is due or recently published",
+    ),
 ):
     """
     Sync financial abstract data (key indicators) for all stocks from THS (同花顺).
@@ -217,7 +433,7 @@ def sync_all_financial_abstracts(
     from core.sync import sync_all_stock_financial_abstracts
 
     typer.echo("Starting financial abstract data synchronization for all stocks...")
-    sync_all_stock_financial_abstracts(max_workers)
+    sync_all_stock_financial_abstracts(max_workers, swap=swap, scheduled=scheduled)
     typer.echo("Financial abstract data synchronization for all stocks completed.")
 
 
@@ -259,6 +475,14 @@ def sync_all_financial_analyses(
     start_year: str = typer.Option(
         None, "--start-year", "-y", help="Start year for financial data (default: 10 years ago)"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
+    scheduled: bool = typer.Option(
+        True,
+        "--scheduled/--all",
+        help="Only sync symbols whose next report is due or recently published",
+    ),
 ):
     """
     Sync financial analysis data (financial indicators) for all stocks from Sina (新浪财经).
@@ -266,7 +490,9 @@ def sync_all_financial_analyses(
     from core.sync import sync_all_stock_financial_analyses
 
     typer.echo("Starting financial analysis data synchronization for all stocks...")
-    sync_all_stock_financial_analyses(max_workers, start_year)
+    sync_all_stock_financial_analyses(
+        max_workers, start_year, swap=swap, scheduled=scheduled
+    )
     typer.echo("Financial analysis data synchronization for all stocks completed.")
 
 
@@ -302,6 +528,14 @@ def sync_all_gdhs(
     max_workers: int = typer.Option(
         5, "--max-workers", "-w", help="Maximum number of concurrent workers"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
+    bulk: bool = typer.Option(
+        True,
+        "--bulk/--per-symbol",
+        help="Update from the market-wide endpoint first, per-symbol calls only for the rest",
+    ),
 ):
     """
     Sync gdhs data (股东户数详情) for all stocks from EM (东方财富).
@@ -309,10 +543,26 @@ def sync_all_gdhs(
     from core.sync import sync_all_stock_gdhs
 
     typer.echo("Starting gdhs data synchronization for all stocks...")
-    sync_all_stock_gdhs(max_workers)
+    sync_all_stock_gdhs(max_workers, swap=swap, bulk=bulk)
     typer.echo("Gdhs data synchronization for all stocks completed.")
 
 
+@app.command()
+def sync_pledge_ratio(
+    date: str = typer.Option(
+        None, "--date", "-d", help="Trade date, e.g., 20240906; default the latest published"
+    ),
+):
+    """
+    Sync the market-wide pledge ratio (上市公司质押比例) from EM (东方财富) in one request.
+    """
+    from core.sync import sync_stock_pledge_ratio
+
+    typer.echo("Starting pledge ratio synchronization...")
+    records = sync_stock_pledge_ratio(date)
+    typer.echo(f"Pledge ratio synchronization completed, records: {len(records)}")
+
+
 @app.command()
 def sync_main_holder(
     symbol: str = typer.Argument(
@@ -345,6 +595,9 @@ def sync_all_main_holders(
     max_workers: int = typer.Option(
         5, "--max-workers", "-w", help="Maximum number of concurrent workers"
     ),
+    swap: bool = typer.Option(
+        False, "--swap", help="Load into a staging table and swap it in atomically"
+    ),
 ):
     """
     Sync main holder data (主要股东) for all stocks from Sina (新浪财经).
@@ -352,7 +605,7 @@ def sync_all_main_holders(
     from core.sync import sync_all_stock_main_holders
 
     typer.echo("Starting main holder data synchronization for all stocks...")
-    sync_all_stock_main_holders(max_workers)
+    sync_all_stock_main_holders(max_workers, swap=swap)
     typer.echo("Main holder data synchronization for all stocks completed.")
 
 
@@ -396,22 +649,14 @@ def sync_stock_all_data(
         sync_stock_gdhs,
         sync_stock_main_holder
     )
+    from core.symbols import parse_symbol
     from datetime import datetime, timedelta
     import traceback
 
     typer.echo(f"Starting full data synchronization for symbol: {symbol}...")
     
     # Format symbol
-    formatted_symbol = symbol
-    if not symbol.startswith(("SH", "SZ", "BJ")):
-        if symbol.startswith("6"):
-            formatted_symbol = f"SH{symbol}"
-        elif symbol.startswith(("0", "3")):
-            formatted_symbol = f"SZ{symbol}"
-        elif symbol.startswith(("4", "8")):
-            formatted_symbol = f"BJ{symbol}"
-        else:
-            formatted_symbol = f"SH{symbol}"  # Default to SH
+    formatted_symbol = parse_symbol(symbol).prefixed
     
     success_count = 0
     fail_count = 0
@@ -512,10 +757,55 @@ def sync_stock_all_data(
     typer.echo(f"Successful operations: {success_count}, Failed operations: {fail_count}")
 
 
+@app.command()
+def bench(
+    targets: str = typer.Option(
+        None,
+        "--targets",
+        "-t",
+        help="Comma separated sync functions to benchmark, default all "
+        "(hist, hist_async, gdhs, financial_analysis, ...)",
+    ),
+    symbols: int = typer.Option(200, "--symbols", "-n", help="Size of the synthetic market"),
+    max_workers: int = typer.Option(
+        5, "--max-workers", "-w", help="Maximum number of concurrent workers"
+    ),
+    latency: float = typer.Option(0.05, "--latency", help="Mean response time in seconds"),
+    error_rate: float = typer.Option(0.0, "--error-rate", help="Probability of a failed request"),
+    rate_limit: float = typer.Option(
+        0.0, "--rate-limit", help="Requests per second before throttling, 0 = unlimited"
+    ),
+    db_path: str = typer.Option(None, "--db", help="SQLite file, default a temp file"),
+):
+    """
+    Benchmark the sync pipeline offline against a local akshare stand-in and a temporary
+    SQLite database, reporting end-to-end symbols/sec per sync function.
+    """
+    from core.bench import FakeAkshare, run_benchmark
+
+    provider = FakeAkshare(
+        symbols=symbols, latency=latency, error_rate=error_rate, rate_limit=rate_limit
+    )
+    results = run_benchmark(
+        targets.split(",") if targets else None, provider, max_workers, db_path
+    )
+    typer.echo(f"{'target':<22}{'symbols':>9}{'failed':>8}{'seconds':>10}{'symbols/s':>11}")
+    for result in results:
+        typer.echo(
+            f"{result.name:<22}{result.symbols:>9}{result.failed:>8}"
+            f"{result.elapsed:>10.2f}{result.rate:>11.2f}"
+        )
+
+
 @app.command()
 def generate_stock_report(
     adjust: Annotated[
-        str, typer.Option("--adjust", "-a", help="Adjustment type (default: qfq)")
+        str,
+        typer.Option(
+            "--adjust",
+            "-a",
+            help="Adjustment type: qfq, hfq, or any (first available per stock)",
+        ),
     ] = "hfq",
     output_dir: Annotated[
         str, typer.Option("--out-html", "-o", help="Output HTML file path")
@@ -0,0 +1,19 @@
+# 数据访问层：面向选股、报告与因子计算的批量读取接口
+from .history import OHLCV_COLUMNS, load_hist_panel, to_wide_panel
+from .hist_store import HistStore, hist_store
+from .cube import CubeView, OhlcvCube, open_cube
+from .spot_history import latest_snapshot_date, load_spot_history, load_spot_snapshot
+
+__all__ = [
+    "OHLCV_COLUMNS",
+    "load_hist_panel",
+    "to_wide_panel",
+    "HistStore",
+    "hist_store",
+    "CubeView",
+    "OhlcvCube",
+    "open_cube",
+    "latest_snapshot_date",
+    "load_spot_history",
+    "load_spot_snapshot",
+]
@@ -0,0 +1,119 @@
+"""
+基于复权因子的读取时复权
+
+历史行情只保存不复权（adjust=""）数据，另存每只股票的复权因子序列
+（stock_adjust_factor_data，仅在除权除息日产生新记录）。读取时按日期
+向后对齐因子并做向量化乘除：
+
+    后复权价 = 不复权价 × hfq_factor
+    前复权价 = 不复权价 ÷ qfq_factor
+"""
+
+import os
+from typing import Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import select
+
+from core.models import StockAdjustFactorDB
+from core.database import get_db_session
+from core.logger import log
+from core.symbols import symbol_registry
+
+# 不复权行情在 stock_history_data 中的 adjust 取值
+RAW_ADJUST = ""
+
+# 需要复权的价格字段
+PRICE_COLUMNS = ("open", "close", "high", "low")
+
+
+def derive_adjust_enabled() -> bool:
+    """
+    是否从不复权行情 + 复权因子推导 qfq / hfq，由 .env 中的 HIST_ADJUST_MODE 控制：
+    stored（默认，直接读取已存储的复权行情）/ factor（读取时推导）
+    """
+    return os.getenv("HIST_ADJUST_MODE", "stored").lower() == "factor"
+
+
+def load_adjust_factors(symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    加载复权因子序列
+
+    Args:
+        symbols: 不带市场标识的股票代码，None 表示全市场
+
+    Returns:
+        pd.DataFrame: [symbol, date, hfq_factor, qfq_factor]，同一股票的行连续、按日期排序
+    """
+    stmt = select(
+        StockAdjustFactorDB.symbol,
+        StockAdjustFactorDB.date,
+        StockAdjustFactorDB.hfq_factor,
+        StockAdjustFactorDB.qfq_factor,
+    )
+    if symbols is not None:
+        ids = symbol_registry.lookup(symbols)
+        stmt = stmt.where(StockAdjustFactorDB.symbol_id.in_(list(ids.values())))
+    stmt = stmt.order_by(StockAdjustFactorDB.symbol_id, StockAdjustFactorDB.date)
+
+    db = get_db_session()
+    try:
+        factors = pd.read_sql(stmt, db.connection())
+    finally:
+        db.close()
+
+    factors["date"] = pd.to_datetime(factors["date"])
+    return factors
+
+
+def apply_adjust_factors(
+    panel: pd.DataFrame, factors: pd.DataFrame, adjust: str
+) -> pd.DataFrame:
+    """
+    将不复权面板转换为前复权 / 后复权面板（向量化）
+
+    Args:
+        panel: 不复权长表 [symbol, date, ...]
+        factors: load_adjust_factors 返回的因子序列
+        adjust: qfq / hfq
+
+    Returns:
+        pd.DataFrame: 复权后的长表，按 (symbol, date) 排序
+    """
+    if adjust not in ("qfq", "hfq"):
+        raise ValueError(f"不支持的复权类型: {adjust}，可选值为 qfq / hfq")
+    if panel.empty:
+        return panel
+
+    factor_column = f"{adjust}_factor"
+    price_columns: List[str] = [c for c in PRICE_COLUMNS if c in panel.columns]
+
+    # merge_asof 要求按对齐键全局有序；每个交易日取不晚于它的最近一次因子
+    merged = pd.merge_asof(
+        panel.sort_values("date"),
+        factors[["symbol", "date", factor_column]].sort_values("date"),
+        on="date",
+        by="symbol",
+        direction="backward",
+    )
+
+    # 早于首个因子日期的记录使用该股票的首个因子，没有因子的股票视为 1
+    first_factor = factors.groupby("symbol")[factor_column].first()
+    factor = merged[factor_column].fillna(merged["symbol"].map(first_factor)).fillna(1.0)
+
+    missing = int((~pd.Index(panel["symbol"].unique()).isin(first_factor.index)).sum())
+    if missing:
+        log.warning(f"{missing} 只股票缺少复权因子，按不复权价格返回")
+
+    values = merged[price_columns].to_numpy(dtype="float64")
+    factor_values = factor.to_numpy(dtype="float64")[:, None]
+    if adjust == "hfq":
+        merged[price_columns] = values * factor_values
+    else:
+        merged[price_columns] = values / factor_values
+
+    return (
+        merged.drop(columns=[factor_column])
+        .sort_values(["symbol", "date"])
+        .reset_index(drop=True)
+    )
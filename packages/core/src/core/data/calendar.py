@@ -0,0 +1,183 @@
+"""
+A 股交易日历
+
+交易日来自已存储的数据，不依赖额外的数据源：
+
+- stock_history_data 中若干参考股票（TRADE_CALENDAR_SYMBOLS，默认几只上市早、
+  极少停牌的股票）出现过的日期，按主键 (symbol_id, adjust, date) 读取，不扫全表
+- 可选的种子文件 TRADE_CALENDAR_FILE：每行一个日期，或 CSV 的第一列
+  （如 ak.tool_trade_date_hist_sina() 导出的 trade_date），用于补全尚未同步的
+  日期以及当年剩余的交易日
+
+已知范围之后的日期按工作日推断，并且不会晚于今天。结果在进程内缓存一小时。
+"""
+
+import datetime
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import distinct, select
+
+from core.models import StockHistoryDB
+from core.database import get_db_session
+from core.logger import log
+from core.symbols import symbol_registry
+from core.data.history import DateLike, _to_date
+
+# 默认参考股票：平安银行、万科A、浦发银行、白云机场、五粮液
+DEFAULT_REFERENCE_SYMBOLS = ("000001", "000002", "600000", "600004", "000858")
+
+# 进程内缓存时长（秒）
+CALENDAR_CACHE_SECONDS = 3600
+
+
+class TradingCalendar:
+    """
+    已排序的交易日序列
+
+    Args:
+        dates: 交易日，任意顺序，可重复
+    """
+
+    def __init__(self, dates: Iterable):
+        values = pd.to_datetime(pd.Series(list(dates)), errors="coerce").dropna()
+        self.dates = np.unique(values.to_numpy().astype("datetime64[D]"))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def first(self) -> Optional[datetime.date]:
+        return self.dates[0].astype(datetime.date) if len(self.dates) else None
+
+    @property
+    def last(self) -> Optional[datetime.date]:
+        return self.dates[-1].astype(datetime.date) if len(self.dates) else None
+
+    def _bounds(self, start: DateLike, end: DateLike):
+        start_day = np.datetime64(_to_date(start) or self.first or datetime.date.today(), "D")
+        end_day = np.datetime64(
+            min(_to_date(end) or datetime.date.today(), datetime.date.today()), "D"
+        )
+        # 已知范围之后的第一天，之后按工作日推断
+        beyond = max(self.dates[-1] + 1, start_day) if len(self.dates) else start_day
+        return start_day, end_day, beyond
+
+    def trading_days(self, start: DateLike, end: DateLike) -> np.ndarray:
+        """
+        [start, end] 区间内的交易日（datetime64[D]）
+
+        已知范围之后的部分按工作日推断，end 不会晚于今天。
+        """
+        start_day, end_day, beyond = self._bounds(start, end)
+        if start_day > end_day:
+            return np.array([], dtype="datetime64[D]")
+        left = np.searchsorted(self.dates, start_day, side="left")
+        right = np.searchsorted(self.dates, end_day, side="right")
+        known = self.dates[left:right]
+        if beyond > end_day:
+            return known
+        extra = np.arange(beyond, end_day + 1, dtype="datetime64[D]")
+        return np.concatenate([known, extra[np.is_busday(extra)]])
+
+    def has_trading_day(self, start: DateLike, end: DateLike) -> bool:
+        """[start, end] 区间内是否有交易日，不展开区间"""
+        start_day, end_day, beyond = self._bounds(start, end)
+        if start_day > end_day:
+            return False
+        left = np.searchsorted(self.dates, start_day, side="left")
+        right = np.searchsorted(self.dates, end_day, side="right")
+        if right > left:
+            return True
+        return beyond <= end_day and np.busday_count(beyond, end_day + 1) > 0
+
+    def is_trading_day(self, day: DateLike) -> bool:
+        return self.has_trading_day(day, day)
+
+    def previous_trading_day(self, day: DateLike = None) -> Optional[datetime.date]:
+        """不晚于 day 的最近一个交易日，day 默认今天"""
+        end = min(_to_date(day) or datetime.date.today(), datetime.date.today())
+        days = self.trading_days(end - datetime.timedelta(days=31), end)
+        return days[-1].astype(datetime.date) if len(days) else None
+
+    def positions(self, dates: np.ndarray):
+        """
+        把日期映射为交易日序号
+
+        Returns:
+            (序号数组, 是否为已知交易日的布尔数组)
+        """
+        dates = np.asarray(dates).astype("datetime64[D]")
+        pos = np.searchsorted(self.dates, dates)
+        valid = pos < len(self.dates)
+        known = np.zeros(len(dates), dtype=bool)
+        known[valid] = self.dates[pos[valid]] == dates[valid]
+        return pos, known
+
+
+def load_seed_file(path: str) -> pd.Series:
+    """读取种子文件中的日期（每行一个日期或 CSV 第一列，表头自动跳过）"""
+    frame = pd.read_csv(path, header=None, usecols=[0], dtype=str)
+    dates = pd.to_datetime(frame[0].str.strip(), errors="coerce").dropna()
+    log.info(f"从 {path} 读取交易日 {len(dates)} 个")
+    return dates
+
+
+def _reference_symbols():
+    value = os.getenv("TRADE_CALENDAR_SYMBOLS")
+    if not value:
+        return list(DEFAULT_REFERENCE_SYMBOLS)
+    return [symbol.strip() for symbol in value.split(",") if symbol.strip()]
+
+
+def derive_from_storage() -> pd.Series:
+    """
+    从参考股票的历史行情中读取出现过的日期
+
+    不使用行情快照的日期：快照按同步当天记录，非交易日同步也会产生快照。
+    """
+    db = get_db_session()
+    try:
+        dates = db.execute(
+            select(distinct(StockHistoryDB.date)).where(
+                StockHistoryDB.symbol_id.in_(
+                    list(symbol_registry.lookup(_reference_symbols()).values())
+                )
+            )
+        ).scalars().all()
+    finally:
+        db.close()
+    return pd.Series(list(dates), dtype=object)
+
+
+def build_calendar(seed_file: Optional[str] = None) -> TradingCalendar:
+    """合并已存储的日期与种子文件，构建交易日历"""
+    parts = [pd.to_datetime(derive_from_storage(), errors="coerce")]
+    seed_file = seed_file or os.getenv("TRADE_CALENDAR_FILE")
+    if seed_file:
+        if os.path.exists(seed_file):
+            parts.append(load_seed_file(seed_file))
+        else:
+            log.warning(f"交易日历种子文件不存在，忽略: {seed_file}")
+    calendar = TradingCalendar(pd.concat(parts, ignore_index=True))
+    log.info(f"交易日历: {len(calendar)} 个交易日，{calendar.first} ~ {calendar.last}")
+    return calendar
+
+
+_cache_lock = threading.Lock()
+_cached: Optional[TradingCalendar] = None
+_cached_at = 0.0
+
+
+def get_trading_calendar(refresh: bool = False) -> TradingCalendar:
+    """进程内缓存的交易日历"""
+    global _cached, _cached_at
+    with _cache_lock:
+        if refresh or _cached is None or time.time() - _cached_at > CALENDAR_CACHE_SECONDS:
+            _cached = build_calendar()
+            _cached_at = time.time()
+        return _cached
@@ -0,0 +1,370 @@
+"""
+日线行情内存映射立方体
+
+把某一复权类型的全市场日线物化为 float32 三维数组
+(symbol, trading_day, field)，以 numpy memmap 文件保存：
+
+    {HIST_CUBE_DIR}/{adjust}/CURRENT              当前版本目录名
+    {HIST_CUBE_DIR}/{adjust}/{version}/values.f32 原始数组
+    {HIST_CUBE_DIR}/{adjust}/{version}/meta.json  股票、交易日、字段与容量
+
+整体重建写入新的版本目录，写完数组与元数据后再原子替换 CURRENT，
+读取端总是看到同一版本中互相匹配的数组与元数据；保留上一个版本供
+仍在读取的进程使用，更早的版本随重建删除。交易日维度预留容量，每日同步后只需原地写入新增交易日；出现新股票或
+容量不足时整体重建。前复权价格会在除权除息后整体变化，qfq 立方体每次
+更新都整体重建。修补中间历史（如行情缺口）后以 update(since=...) 从该日期
+起重新写入；出现立方体中没有的交易日时整体重建。读取端以只读方式映射
+文件，切片即视图，单字段宽表直接包装视图，不复制、不解析，多个进程共享
+同一份页缓存。缺失值为 NaN。
+"""
+
+import datetime
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from core.path import get_project_root
+from core.logger import log
+
+# 默认物化的字段：OHLCV 与选股规则常用的成交额、涨跌幅、振幅
+CUBE_FIELDS = (
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "amount",
+    "change_percent",
+    "amplitude",
+)
+
+# 重建时交易日维度额外预留的容量（约一年）
+CAPACITY_PADDING = 256
+
+# 重建后保留的版本数（当前版本与上一个版本）
+KEEP_VERSIONS = 2
+
+
+def _adjust_key(adjust: Optional[str]) -> str:
+    return adjust if adjust else "none"
+
+
+def cube_root() -> Path:
+    return Path(
+        os.getenv("HIST_CUBE_DIR") or os.path.join(get_project_root(), "data", "hist_cube")
+    )
+
+
+def is_enabled() -> bool:
+    """是否在每日同步后增量更新立方体，由 .env 中的 HIST_CUBE_ENABLED 控制"""
+    return os.getenv("HIST_CUBE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+class CubeView:
+    """
+    只读立方体视图
+
+    values 为 (symbol, trading_day, field) 的 memmap 视图，symbols / dates /
+    fields 为各维度的标签。
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        symbols: pd.Index,
+        dates: pd.DatetimeIndex,
+        fields: List[str],
+    ):
+        self.values = values
+        self.symbols = symbols
+        self.dates = dates
+        self.fields = fields
+
+    def field(self, name: str) -> np.ndarray:
+        """单个字段的 (symbol, trading_day) 视图"""
+        return self.values[:, :, self.fields.index(name)]
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """
+        单个字段的 symbol × date 宽表，直接包装 memmap 视图，不复制数据
+
+        视图为只读，区间内没有行情的股票为全 NaN 行。
+        """
+        return pd.DataFrame(
+            self.field(name), index=self.symbols, columns=self.dates, copy=False
+        )
+
+    def to_wide(self) -> pd.DataFrame:
+        """
+        展开为 symbol × date 宽表，与 to_wide_panel 的列结构一致
+
+        单字段时为 frame 视图；多字段按 (field, date) 多级列拼接，会复制数据。
+        """
+        if len(self.fields) == 1:
+            return self.frame(self.fields[0])
+        return pd.concat(
+            {name: self.frame(name) for name in self.fields}, axis=1, names=[None, "date"]
+        )
+
+    def sel(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        start_date=None,
+        end_date=None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> "CubeView":
+        """
+        按股票、日期区间与字段切片
+
+        日期区间与连续字段切片均为视图；指定股票列表时使用花式索引，
+        会复制所选股票的数据。
+        """
+        day_start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date))
+        day_end = (
+            len(self.dates)
+            if end_date is None
+            else self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        )
+        values = self.values[:, day_start:day_end, :]
+        dates = self.dates[day_start:day_end]
+
+        selected_fields = list(fields) if fields is not None else list(self.fields)
+        field_idx = [self.fields.index(f) for f in selected_fields]
+        if field_idx == list(range(field_idx[0], field_idx[0] + len(field_idx))):
+            values = values[:, :, field_idx[0] : field_idx[0] + len(field_idx)]
+        else:
+            values = values[:, :, field_idx]
+
+        labels = self.symbols
+        if symbols is not None:
+            positions = self.symbols.get_indexer(list(symbols))
+            positions = positions[positions >= 0]
+            values = values[positions]
+            labels = self.symbols[positions]
+
+        return CubeView(values, labels, dates, selected_fields)
+
+    def to_panel(self) -> pd.DataFrame:
+        """展开为按 (symbol, date) 排序的长表，全 NaN 的交易日不输出"""
+        present = ~np.isnan(self.values).all(axis=2)
+        symbol_idx, day_idx = np.nonzero(present)
+        panel = pd.DataFrame(
+            {
+                "symbol": self.symbols.to_numpy()[symbol_idx],
+                "date": self.dates[day_idx],
+            }
+        )
+        for i, name in enumerate(self.fields):
+            panel[name] = self.values[symbol_idx, day_idx, i]
+        return panel
+
+
+class OhlcvCube:
+    """
+    某一复权类型的日线立方体，负责构建、增量更新与只读映射
+    """
+
+    def __init__(self, adjust: str = "hfq", root: Optional[str] = None):
+        self.adjust = adjust
+        self.dir = Path(root) if root else cube_root() / _adjust_key(adjust)
+        self.current_path = self.dir / "CURRENT"
+
+    def _version_dir(self) -> Path:
+        """当前版本目录；没有 CURRENT 时为旧布局，数组与元数据直接位于 self.dir"""
+        if self.current_path.exists():
+            return self.dir / self.current_path.read_text(encoding="utf-8").strip()
+        return self.dir
+
+    def exists(self) -> bool:
+        version_dir = self._version_dir()
+        return (version_dir / "meta.json").exists() and (version_dir / "values.f32").exists()
+
+    @staticmethod
+    def _read_meta(version_dir: Path) -> Dict:
+        return json.loads((version_dir / "meta.json").read_text(encoding="utf-8"))
+
+    @staticmethod
+    def _write_meta(version_dir: Path, meta: Dict):
+        # 先写临时文件再替换，读取端不会看到半写状态的元数据
+        meta_path = version_dir / "meta.json"
+        tmp = meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+    def _publish(self, version: str):
+        """原子切换 CURRENT 到新版本，并删除更早的版本"""
+        tmp = self.current_path.with_suffix(".tmp")
+        tmp.write_text(version, encoding="utf-8")
+        os.replace(tmp, self.current_path)
+
+        versions = sorted(
+            path for path in self.dir.iterdir() if path.is_dir() and path.name.startswith("v")
+        )
+        for path in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(path, ignore_errors=True)
+        # 旧布局直接位于 self.dir 的文件
+        for name in ("values.f32", "meta.json"):
+            (self.dir / name).unlink(missing_ok=True)
+
+    # ----------------------------- 构建 -----------------------------
+
+    def build(
+        self,
+        start_date=None,
+        fields: Sequence[str] = CUBE_FIELDS,
+    ) -> Dict:
+        """
+        从历史行情面板全量构建立方体
+
+        Args:
+            start_date: 物化的起始日期，None 表示全部历史
+            fields: 物化的字段
+
+        Returns:
+            Dict: 元数据
+        """
+        from core.data.history import load_hist_panel
+
+        fields = list(fields)
+        panel = load_hist_panel(
+            start_date=start_date, adjust=self.adjust, columns=fields, source="db"
+        )
+        symbols = sorted(panel["symbol"].unique()) if not panel.empty else []
+        dates = pd.DatetimeIndex(sorted(panel["date"].unique())) if not panel.empty else pd.DatetimeIndex([])
+        capacity = len(dates) + CAPACITY_PADDING
+
+        version = datetime.datetime.now().strftime("v%Y%m%d%H%M%S%f")
+        version_dir = self.dir / version
+        version_dir.mkdir(parents=True)
+        values = np.memmap(
+            version_dir / "values.f32",
+            dtype=np.float32,
+            mode="w+",
+            shape=(max(len(symbols), 1), capacity, len(fields)),
+        )
+        values[:] = np.nan
+        if not panel.empty:
+            symbol_idx = pd.Index(symbols).get_indexer(panel["symbol"])
+            day_idx = dates.get_indexer(panel["date"])
+            values[symbol_idx, day_idx, :] = panel[fields].to_numpy(dtype=np.float32)
+        values.flush()
+        del values
+
+        meta = {
+            "adjust": self.adjust,
+            "start_date": None if start_date is None else str(pd.Timestamp(start_date).date()),
+            "symbols": symbols,
+            "dates": [d.strftime("%Y-%m-%d") for d in dates],
+            "fields": fields,
+            "capacity": capacity,
+            "updated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self._write_meta(version_dir, meta)
+        self._publish(version)
+        log.info(
+            f"构建行情立方体 {self.dir}: {len(symbols)} 只股票 × {len(dates)} 个交易日 × {len(fields)} 个字段"
+        )
+        return meta
+
+    def update(self, since=None) -> Dict:
+        """
+        增量更新：重新写入最后一个交易日并追加之后的新交易日
+
+        出现新股票、交易日容量不足或缺少 CUBE_FIELDS 中的字段时整体重建。
+
+        Args:
+            since: 中间历史有变化（如修补缺口）时的最早日期，从该日期起重新写入；
+                出现立方体中没有的更早交易日时整体重建
+
+        Returns:
+            Dict: 元数据
+        """
+        from core.data.history import load_hist_panel
+
+        if not self.exists():
+            return self.build()
+
+        version_dir = self._version_dir()
+        meta = self._read_meta(version_dir)
+        fields = meta["fields"]
+        added = [field for field in CUBE_FIELDS if field not in fields]
+        if added:
+            log.info(f"行情立方体缺少字段 {added}，整体重建")
+            return self.build(meta["start_date"], [*fields, *added])
+        if self.adjust == "qfq":
+            return self.build(meta["start_date"], fields)
+
+        dates = pd.DatetimeIndex(meta["dates"])
+        if len(dates) == 0:
+            return self.build(meta["start_date"], fields)
+
+        start = dates[-1] if since is None else min(pd.Timestamp(since), dates[-1])
+        panel = load_hist_panel(
+            start_date=start, adjust=self.adjust, columns=fields, source="db"
+        )
+        if panel.empty:
+            return meta
+
+        symbols = pd.Index(meta["symbols"])
+        if not panel["symbol"].isin(symbols).all():
+            log.info("行情立方体出现新股票，整体重建")
+            return self.build(meta["start_date"], fields)
+
+        new_dates = pd.DatetimeIndex(sorted(panel["date"].unique())).difference(dates)
+        if len(new_dates) and new_dates[0] < dates[-1]:
+            log.info(f"行情立方体缺少历史交易日 {new_dates[0].date()}，整体重建")
+            return self.build(meta["start_date"], fields)
+        all_dates = dates.append(new_dates)
+        if len(all_dates) > meta["capacity"]:
+            log.info("行情立方体交易日容量不足，整体重建")
+            return self.build(meta["start_date"], fields)
+
+        values = np.memmap(
+            version_dir / "values.f32",
+            dtype=np.float32,
+            mode="r+",
+            shape=(max(len(symbols), 1), meta["capacity"], len(fields)),
+        )
+        symbol_idx = symbols.get_indexer(panel["symbol"])
+        day_idx = all_dates.get_indexer(panel["date"])
+        values[symbol_idx, day_idx, :] = panel[fields].to_numpy(dtype=np.float32)
+        values.flush()
+        del values
+
+        meta["dates"] = [d.strftime("%Y-%m-%d") for d in all_dates]
+        meta["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        self._write_meta(version_dir, meta)
+        log.info(
+            f"增量更新行情立方体 {self.dir}: 自 {start.date()} 起重写，"
+            f"新增 {len(new_dates)} 个交易日"
+        )
+        return meta
+
+    # ----------------------------- 读取 -----------------------------
+
+    def open(self) -> CubeView:
+        """以只读方式映射立方体"""
+        if not self.exists():
+            raise FileNotFoundError(f"行情立方体不存在: {self.dir}，请先执行 build-hist-cube")
+        version_dir = self._version_dir()
+        meta = self._read_meta(version_dir)
+        fields = meta["fields"]
+        symbols = pd.Index(meta["symbols"], name="symbol")
+        dates = pd.DatetimeIndex(meta["dates"], name="date")
+        values = np.memmap(
+            version_dir / "values.f32",
+            dtype=np.float32,
+            mode="r",
+            shape=(max(len(symbols), 1), meta["capacity"], len(fields)),
+        )
+        return CubeView(values[: len(symbols), : len(dates), :], symbols, dates, fields)
+
+
+def open_cube(adjust: str = "hfq") -> CubeView:
+    """以只读方式映射指定复权类型的行情立方体"""
+    return OhlcvCube(adjust).open()
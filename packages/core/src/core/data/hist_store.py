@@ -0,0 +1,299 @@
+"""
+日线历史行情列式存储
+
+按 adjust / year 分区的 Parquet 数据集（hive 目录结构）：
+
+    {HIST_STORE_DIR}/adjust=hfq/year=2025/part-*.parquet
+
+写入端先在内存中缓冲，达到阈值或进程退出时批量落盘，避免逐只股票产生
+大量小文件；读取端基于 pyarrow.dataset 做分区裁剪、谓词下推与列投影。
+同一 (symbol, date) 的重复写入以 ingested_at 较新者为准，compact() 会把
+分区合并为单个去重后的文件。
+"""
+
+import atexit
+import datetime
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from core.path import get_project_root
+from core.logger import log
+
+# 写入缓冲达到该行数时自动落盘
+FLUSH_ROWS = 200_000
+
+# 存储中的行情字段（adjust / year 为分区字段，不写入文件）
+VALUE_COLUMNS = (
+    "open",
+    "close",
+    "high",
+    "low",
+    "volume",
+    "amount",
+    "amplitude",
+    "change_percent",
+    "change_amount",
+    "turnover",
+)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    except ImportError as e:
+        raise ImportError("列式历史存储需要安装 pyarrow: pip install pyarrow") from e
+
+
+def _adjust_key(adjust: Optional[str]) -> str:
+    """空字符串 / none 统一映射为 none 分区"""
+    return adjust if adjust else "none"
+
+
+def is_enabled() -> bool:
+    """是否在同步时写入列式存储，由 .env 中的 HIST_STORE_ENABLED 控制"""
+    return os.getenv("HIST_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+class HistStore:
+    """
+    日线历史行情 Parquet 存储
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(
+            root
+            or os.getenv("HIST_STORE_DIR")
+            or os.path.join(get_project_root(), "data", "hist_store")
+        )
+        self._lock = threading.Lock()
+        self._buffer: Dict[str, List[pd.DataFrame]] = {}
+        self._buffered_rows = 0
+
+    # ----------------------------- schema -----------------------------
+
+    @staticmethod
+    def _schema():
+        import pyarrow as pa
+
+        fields = [("symbol", pa.string()), ("date", pa.date32())]
+        fields += [
+            (column, pa.int64() if column == "volume" else pa.float64())
+            for column in VALUE_COLUMNS
+        ]
+        fields.append(("ingested_at", pa.int64()))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _partitioning():
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        return ds.partitioning(
+            pa.schema([("adjust", pa.string()), ("year", pa.int32())]),
+            flavor="hive",
+        )
+
+    # ----------------------------- 写入 -----------------------------
+
+    def append(self, df: pd.DataFrame, adjust: str) -> int:
+        """
+        追加历史行情到写入缓冲，超过 FLUSH_ROWS 时自动落盘
+
+        Args:
+            df: 包含 symbol, date 及行情字段的 DataFrame
+            adjust: 复权类型
+
+        Returns:
+            int: 追加的行数
+        """
+        if df is None or df.empty:
+            return 0
+
+        frame = df.reindex(columns=["symbol", "date", *VALUE_COLUMNS]).copy()
+        frame["date"] = pd.to_datetime(frame["date"]).dt.date
+        frame["volume"] = frame["volume"].fillna(0).astype("int64")
+        frame["ingested_at"] = time.time_ns()
+
+        with self._lock:
+            self._buffer.setdefault(_adjust_key(adjust), []).append(frame)
+            self._buffered_rows += len(frame)
+            should_flush = self._buffered_rows >= FLUSH_ROWS
+
+        if should_flush:
+            self.flush()
+        return len(frame)
+
+    def flush(self) -> int:
+        """
+        将写入缓冲按 adjust / year 分区落盘
+
+        Returns:
+            int: 落盘的行数
+        """
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._buffered_rows = 0
+
+        if not buffer:
+            return 0
+
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = self._schema()
+        written = 0
+        for adjust_key, frames in buffer.items():
+            frame = pd.concat(frames, ignore_index=True)
+            years = pd.to_datetime(frame["date"]).dt.year
+            for year, part in frame.groupby(years):
+                part_dir = self.root / f"adjust={adjust_key}" / f"year={year}"
+                part_dir.mkdir(parents=True, exist_ok=True)
+                path = part_dir / f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+                table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+                pq.write_table(table, path, compression="zstd")
+                written += len(part)
+
+        log.info(f"列式历史存储落盘 {written} 条记录: {self.root}")
+        return written
+
+    def compact(self, adjust: str, years: Optional[Iterable[int]] = None) -> int:
+        """
+        合并分区内的小文件并去重，每个 (symbol, date) 仅保留最新写入
+
+        Args:
+            adjust: 复权类型
+            years: 需要合并的年份，None 表示该 adjust 下全部年份
+
+        Returns:
+            int: 合并后的总行数
+        """
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.flush()
+        adjust_dir = self.root / f"adjust={_adjust_key(adjust)}"
+        if not adjust_dir.exists():
+            return 0
+
+        if years is None:
+            year_dirs = sorted(adjust_dir.glob("year=*"))
+        else:
+            year_dirs = [adjust_dir / f"year={year}" for year in sorted(set(years))]
+
+        schema = self._schema()
+        total = 0
+        for year_dir in year_dirs:
+            files = sorted(year_dir.glob("*.parquet"))
+            if len(files) <= 1:
+                total += sum(pq.read_metadata(f).num_rows for f in files)
+                continue
+
+            frame = pa.concat_tables(
+                [pq.read_table(f, schema=schema) for f in files]
+            ).to_pandas()
+            frame = (
+                frame.sort_values(["symbol", "date", "ingested_at"])
+                .drop_duplicates(["symbol", "date"], keep="last")
+                .reset_index(drop=True)
+            )
+
+            # 先写入新文件再删除旧文件，中途失败时数据仍可读（重复由读取端去重）
+            target = year_dir / f"part-{time.time_ns()}-compact.parquet"
+            pq.write_table(
+                pa.Table.from_pandas(frame, schema=schema, preserve_index=False),
+                target,
+                compression="zstd",
+            )
+            for f in files:
+                f.unlink()
+            total += len(frame)
+            log.info(f"合并分区 {year_dir}: {len(files)} 个文件 -> {len(frame)} 条记录")
+
+        return total
+
+    # ----------------------------- 读取 -----------------------------
+
+    def scan(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        start_date: Optional[datetime.date] = None,
+        end_date: Optional[datetime.date] = None,
+        adjust: str = "hfq",
+        columns: Sequence[str] = VALUE_COLUMNS,
+    ):
+        """
+        以 Arrow Table 形式扫描历史行情，分区裁剪 + 谓词下推 + 列投影
+
+        Args:
+            symbols: 不带市场前缀的股票代码列表，None 表示全市场
+            start_date: 开始日期（含）
+            end_date: 结束日期（含）
+            adjust: 复权类型
+            columns: 需要读取的行情字段
+
+        Returns:
+            pyarrow.Table: 包含 symbol, date, ingested_at 及所选字段
+        """
+        _require_pyarrow()
+        import pyarrow.dataset as ds
+
+        self.flush()
+        if not (self.root / f"adjust={_adjust_key(adjust)}").exists():
+            return self._schema().empty_table().select(
+                ["symbol", "date", *columns, "ingested_at"]
+            )
+
+        dataset = ds.dataset(
+            str(self.root), format="parquet", partitioning=self._partitioning()
+        )
+
+        expr = ds.field("adjust") == _adjust_key(adjust)
+        if start_date is not None:
+            expr &= ds.field("year") >= start_date.year
+            expr &= ds.field("date") >= start_date
+        if end_date is not None:
+            expr &= ds.field("year") <= end_date.year
+            expr &= ds.field("date") <= end_date
+        if symbols is not None:
+            expr &= ds.field("symbol").isin(list(symbols))
+
+        return dataset.to_table(
+            columns=["symbol", "date", *columns, "ingested_at"], filter=expr
+        )
+
+    def read(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        start_date: Optional[datetime.date] = None,
+        end_date: Optional[datetime.date] = None,
+        adjust: str = "hfq",
+        columns: Sequence[str] = VALUE_COLUMNS,
+    ) -> pd.DataFrame:
+        """
+        读取历史行情长表，按 (symbol, date) 排序并去除重复写入
+
+        参数同 scan()
+        """
+        frame = self.scan(symbols, start_date, end_date, adjust, columns).to_pandas()
+        frame = (
+            frame.sort_values(["symbol", "date", "ingested_at"])
+            .drop_duplicates(["symbol", "date"], keep="last")
+            .drop(columns=["ingested_at"])
+            .reset_index(drop=True)
+        )
+        frame["date"] = pd.to_datetime(frame["date"])
+        return frame
+
+
+# 全局存储对象，进程退出前把未落盘的缓冲写出
+hist_store = HistStore()
+atexit.register(hist_store.flush)
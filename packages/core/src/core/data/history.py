@@ -0,0 +1,294 @@
+import datetime
+import os
+from typing import Iterable, List, Optional, Sequence, Union
+
+import pandas as pd
+from sqlalchemy import select
+
+from core.models import StockHistoryDB
+from core.database import get_db_session
+from core.logger import log
+from core.symbols import parse_symbol, symbol_registry
+from core.data.adjust import (
+    RAW_ADJUST,
+    apply_adjust_factors,
+    derive_adjust_enabled,
+    load_adjust_factors,
+)
+
+# 默认加载的行情字段
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# symbol IN (...) 列表分块大小，避免单条 SQL 过长
+SYMBOL_CHUNK_SIZE = 1000
+
+# 流式读取时每批返回的行数
+STREAM_CHUNK_SIZE = 200_000
+
+DateLike = Union[str, datetime.date, datetime.datetime, None]
+
+
+def _to_date(value: DateLike) -> Optional[datetime.date]:
+    """将 "20250101" / "2025-01-01" / date / datetime 统一转换为 date"""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value).replace("-", ""), "%Y%m%d").date()
+
+
+def _strip_market_prefix(symbol: str) -> str:
+    """历史行情表中的代码不带市场前缀，SH600519 -> 600519"""
+    return parse_symbol(symbol).code
+
+
+def _build_statement(
+    columns: Sequence[str],
+    adjust: str,
+    start_date: Optional[datetime.date],
+    end_date: Optional[datetime.date],
+    symbols: Optional[List[str]],
+):
+    """构造按 (symbol_id, date) 排序、只投影所需列的查询语句"""
+    selected = [StockHistoryDB.symbol, StockHistoryDB.date] + [
+        getattr(StockHistoryDB, column) for column in columns
+    ]
+    stmt = select(*selected).where(StockHistoryDB.adjust == adjust)
+    if start_date is not None:
+        stmt = stmt.where(StockHistoryDB.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(StockHistoryDB.date <= end_date)
+    if symbols is not None:
+        ids = symbol_registry.lookup(symbols)
+        stmt = stmt.where(StockHistoryDB.symbol_id.in_(list(ids.values())))
+    # 按主键顺序输出，同一股票的行连续
+    return stmt.order_by(StockHistoryDB.symbol_id, StockHistoryDB.date)
+
+
+def load_hist_panel(
+    symbols: Optional[Iterable[str]] = None,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    adjust: str = "hfq",
+    columns: Sequence[str] = OHLCV_COLUMNS,
+    layout: str = "long",
+    chunksize: int = STREAM_CHUNK_SIZE,
+    source: Optional[str] = None,
+    derive_adjust: Optional[bool] = None,
+) -> pd.DataFrame:
+    """
+    一次性加载多只（或全部）股票的历史行情面板
+
+    替代逐只股票 pd.read_sql 的读取方式：按日期区间与列投影生成一条查询，
+    以流式游标分批读取，同一股票的行连续、按日期排序。也可以从列式历史存储
+    （core.data.hist_store）或内存映射立方体（core.data.cube）读取，由 source
+    参数或 .env 中的 HIST_PANEL_SOURCE 决定。开启 derive_adjust 时读取不复权行情并按复权因子
+    推导 qfq / hfq 价格（见 core.data.adjust）。
+
+    Args:
+        symbols: 股票代码列表，带或不带市场前缀均可；None 表示全市场
+        start_date: 开始日期（含），如 "20250101"，None 表示不限
+        end_date: 结束日期（含），None 表示不限
+        adjust: 复权类型 qfq / hfq / ""
+        columns: 需要加载的行情字段，默认 OHLCV
+        layout: "long" 返回长表 [symbol, date, *columns]；
+                "wide" 返回 symbol × date 宽表（多字段时列为 (field, date) 多级索引）
+        chunksize: 流式读取的每批行数
+        source: 数据来源 "db"（数据库）、"store"（列式存储）或 "cube"（立方体，
+                已是复权后价格；单字段宽表为 memmap 的只读视图），
+                None 时读取 HIST_PANEL_SOURCE，默认 "db"
+        derive_adjust: 是否由不复权行情 + 复权因子推导复权价格，
+                None 时读取 HIST_ADJUST_MODE（factor 表示推导）
+
+    Returns:
+        pd.DataFrame: 历史行情面板
+    """
+    if layout not in ("long", "wide"):
+        raise ValueError(f"不支持的 layout: {layout}，可选值为 long / wide")
+
+    columns = [column for column in columns if column not in ("symbol", "date")]
+    unknown = [column for column in columns if not hasattr(StockHistoryDB, column)]
+    if unknown:
+        raise ValueError(f"stock_history_data 不存在字段: {unknown}")
+
+    start = _to_date(start_date)
+    end = _to_date(end_date)
+    source = source or os.getenv("HIST_PANEL_SOURCE", "db")
+    if derive_adjust is None:
+        derive_adjust = derive_adjust_enabled()
+    derive = derive_adjust and adjust in ("qfq", "hfq") and source != "cube"
+    read_adjust = RAW_ADJUST if derive else adjust
+
+    if source == "cube" and layout == "wide":
+        # 宽表直接由立方体视图构造，单字段时不复制数据
+        wide = _wide_from_cube(symbols, start, end, adjust, columns)
+        if wide is not None:
+            return wide
+
+    if source == "store":
+        panel = _load_from_store(symbols, start, end, read_adjust, columns)
+    elif source == "cube":
+        panel = _load_from_cube(symbols, start, end, adjust, columns)
+    elif source == "db":
+        panel = _load_from_db(symbols, start, end, read_adjust, columns, chunksize)
+    else:
+        raise ValueError(f"不支持的 source: {source}，可选值为 db / store / cube")
+
+    if derive and not panel.empty:
+        factors = load_adjust_factors(_normalize_symbols(symbols))
+        panel = apply_adjust_factors(panel, factors, adjust)
+
+    if panel.empty:
+        log.info(f"历史行情面板为空: adjust={adjust}, 区间 {start} ~ {end}")
+        return _empty_panel(columns, layout)
+
+    log.info(
+        f"加载历史行情面板({source}): {panel['symbol'].nunique()} 只股票, "
+        f"{len(panel)} 条记录, adjust={adjust}, 区间 {start} ~ {end}"
+    )
+
+    if layout == "wide":
+        return to_wide_panel(panel, columns)
+    return panel
+
+
+def _normalize_symbols(symbols: Optional[Iterable[str]]) -> Optional[List[str]]:
+    if symbols is None:
+        return None
+    return sorted({_strip_market_prefix(s) for s in symbols if s})
+
+
+def _load_from_store(
+    symbols: Optional[Iterable[str]],
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    adjust: str,
+    columns: Sequence[str],
+) -> pd.DataFrame:
+    from core.data.hist_store import hist_store
+
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is not None and not symbol_list:
+        return _empty_panel(columns, "long")
+    return hist_store.read(symbol_list, start, end, adjust, columns)
+
+
+def _load_from_cube(
+    symbols: Optional[Iterable[str]],
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    adjust: str,
+    columns: Sequence[str],
+) -> pd.DataFrame:
+    from core.data.cube import open_cube
+
+    view = open_cube(adjust)
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is not None and not symbol_list:
+        return _empty_panel(columns, "long")
+    cube_columns = [column for column in columns if column in view.fields]
+    missing = [column for column in columns if column not in view.fields]
+    if not cube_columns:
+        log.warning(f"行情立方体未物化字段 {missing}，改从数据库读取")
+        return load_hist_panel(symbol_list, start, end, adjust, missing, source="db")
+
+    panel = view.sel(symbol_list, start, end, cube_columns).to_panel()
+    if missing and not panel.empty:
+        # 早期构建的立方体字段较少，缺少的字段从数据库补齐
+        log.warning(f"行情立方体未物化字段 {missing}，从数据库补齐")
+        extra = load_hist_panel(symbol_list, start, end, adjust, missing, source="db")
+        panel = panel.merge(extra, on=["symbol", "date"], how="left")
+    return panel.reindex(columns=["symbol", "date", *columns])
+
+
+def _wide_from_cube(
+    symbols: Optional[Iterable[str]],
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    adjust: str,
+    columns: Sequence[str],
+) -> Optional[pd.DataFrame]:
+    """立方体已物化全部字段时返回宽表，否则返回 None 由调用方按长表读取"""
+    from core.data.cube import open_cube
+
+    view = open_cube(adjust)
+    if not columns or any(column not in view.fields for column in columns):
+        return None
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is not None and not symbol_list:
+        return _empty_panel(columns, "wide")
+    view = view.sel(symbol_list, start, end, columns)
+    log.info(
+        f"加载历史行情宽表(cube): {len(view.symbols)} 只股票 × {len(view.dates)} 个交易日, "
+        f"adjust={adjust}, 区间 {start} ~ {end}"
+    )
+    return view.to_wide()
+
+
+def _load_from_db(
+    symbols: Optional[Iterable[str]],
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    adjust: str,
+    columns: Sequence[str],
+    chunksize: int,
+) -> pd.DataFrame:
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is None:
+        symbol_chunks = [None]
+    else:
+        if not symbol_list:
+            return _empty_panel(columns, "long")
+        symbol_chunks = [
+            symbol_list[i : i + SYMBOL_CHUNK_SIZE]
+            for i in range(0, len(symbol_list), SYMBOL_CHUNK_SIZE)
+        ]
+
+    frames = []
+    db = get_db_session()
+    try:
+        # stream_results 在支持服务端游标的驱动上避免一次性拉取全部结果集
+        conn = db.connection(execution_options={"stream_results": True})
+        for chunk in symbol_chunks:
+            stmt = _build_statement(columns, adjust, start, end, chunk)
+            for frame in pd.read_sql(stmt, conn, chunksize=chunksize):
+                frames.append(frame)
+    finally:
+        db.close()
+
+    if not frames:
+        return _empty_panel(columns, "long")
+
+    panel = pd.concat(frames, ignore_index=True)
+    panel["date"] = pd.to_datetime(panel["date"])
+    return panel
+
+
+def to_wide_panel(
+    panel: pd.DataFrame, values: Union[str, Sequence[str]] = "close"
+) -> pd.DataFrame:
+    """
+    将长表面板转换为 symbol × date 宽表
+
+    Args:
+        panel: load_hist_panel 返回的长表
+        values: 单个字段名返回以日期为列的宽表；多个字段返回 (field, date) 多级列
+
+    Returns:
+        pd.DataFrame: 宽表，行索引为 symbol
+    """
+    if not isinstance(values, str):
+        values = list(values)
+        if len(values) == 1:
+            values = values[0]
+    return panel.pivot(index="symbol", columns="date", values=values)
+
+
+def _empty_panel(columns: Sequence[str], layout: str) -> pd.DataFrame:
+    if layout == "wide":
+        return pd.DataFrame(index=pd.Index([], name="symbol"))
+    empty = pd.DataFrame(columns=["symbol", "date", *columns])
+    empty["date"] = pd.to_datetime(empty["date"])
+    return empty
@@ -0,0 +1,137 @@
+"""
+每日行情快照历史
+
+stock_spot_data 每次同步都会整体替换，估值字段（pe_ratio、pb_ratio、
+market_cap、turnover、volume_ratio 等）只保留当天。每次同步同时把快照按
+trade_date 追加到 stock_spot_history_data（同日重复同步覆盖当日快照），
+这里提供按任意历史日期读取全市场截面的接口。
+
+trade_date 取自交易日历而不是同步时的日期：非交易日或开盘前同步到的是
+上一个交易日收盘后的数据，记在上一个交易日名下。
+"""
+
+import datetime
+import os
+from typing import Iterable, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from core.models import StockSpotHistoryDB
+from core.database import get_db_session
+from core.logger import log
+from core.data.calendar import get_trading_calendar
+from core.data.history import DateLike, _normalize_symbols, _to_date
+
+# 集合竞价开始时间，之前的快照仍是上一个交易日的数据
+SESSION_OPEN = datetime.time(9, 15)
+
+
+def is_enabled() -> bool:
+    """是否在同步实时行情时追加快照历史，由 .env 中的 SPOT_HISTORY_ENABLED 控制"""
+    return os.getenv("SPOT_HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def snapshot_trade_date(sync_time: datetime.datetime) -> Optional[datetime.date]:
+    """快照对应的交易日：不晚于同步时间的最近一个交易日，开盘前同步时为上一个交易日"""
+    day = sync_time.date()
+    if sync_time.time() < SESSION_OPEN:
+        day -= datetime.timedelta(days=1)
+    return get_trading_calendar().previous_trading_day(day)
+
+
+def _columns(columns: Optional[Sequence[str]]):
+    if columns is None:
+        return list(StockSpotHistoryDB.__table__.columns)
+    names = ["trade_date", "symbol", *[c for c in columns if c not in ("trade_date", "symbol")]]
+    unknown = [c for c in names if c not in StockSpotHistoryDB.__table__.columns]
+    if unknown:
+        raise ValueError(f"stock_spot_history_data 不存在字段: {unknown}")
+    return [StockSpotHistoryDB.__table__.columns[c] for c in names]
+
+
+def latest_snapshot_date(as_of: DateLike = None):
+    """不晚于 as_of 的最近一个快照日期，无快照时返回 None"""
+    stmt = select(func.max(StockSpotHistoryDB.trade_date))
+    as_of_date = _to_date(as_of)
+    if as_of_date is not None:
+        stmt = stmt.where(StockSpotHistoryDB.trade_date <= as_of_date)
+    db = get_db_session()
+    try:
+        return db.execute(stmt).scalar()
+    finally:
+        db.close()
+
+
+def load_spot_snapshot(
+    as_of: DateLike = None,
+    symbols: Optional[Iterable[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    读取某一日期的全市场快照（as-of 语义）
+
+    Args:
+        as_of: 日期，如 "20250101"；取不晚于该日期的最近一次快照，None 表示最新
+        symbols: 股票代码列表，None 表示全市场
+        columns: 需要的字段，None 表示全部
+
+    Returns:
+        pd.DataFrame: 快照截面，每只股票一行
+    """
+    trade_date = latest_snapshot_date(as_of)
+    if trade_date is None:
+        log.info(f"不存在 {as_of} 及之前的行情快照")
+        return pd.DataFrame(columns=[c.name for c in _columns(columns)])
+
+    stmt = select(*_columns(columns)).where(StockSpotHistoryDB.trade_date == trade_date)
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is not None:
+        stmt = stmt.where(StockSpotHistoryDB.symbol.in_(symbol_list))
+
+    db = get_db_session()
+    try:
+        snapshot = pd.read_sql(stmt, db.connection())
+    finally:
+        db.close()
+    log.info(f"加载 {trade_date} 行情快照: {len(snapshot)} 只股票")
+    return snapshot
+
+
+def load_spot_history(
+    symbols: Optional[Iterable[str]] = None,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    读取区间内的每日快照长表，按 (trade_date, symbol) 排序
+
+    Args:
+        symbols: 股票代码列表，None 表示全市场
+        start_date: 开始日期（含）
+        end_date: 结束日期（含）
+        columns: 需要的字段，None 表示全部
+
+    Returns:
+        pd.DataFrame: [trade_date, symbol, *columns]
+    """
+    stmt = select(*_columns(columns))
+    start = _to_date(start_date)
+    end = _to_date(end_date)
+    if start is not None:
+        stmt = stmt.where(StockSpotHistoryDB.trade_date >= start)
+    if end is not None:
+        stmt = stmt.where(StockSpotHistoryDB.trade_date <= end)
+    symbol_list = _normalize_symbols(symbols)
+    if symbol_list is not None:
+        stmt = stmt.where(StockSpotHistoryDB.symbol.in_(symbol_list))
+    stmt = stmt.order_by(StockSpotHistoryDB.trade_date, StockSpotHistoryDB.symbol)
+
+    db = get_db_session()
+    try:
+        history = pd.read_sql(stmt, db.connection())
+    finally:
+        db.close()
+    history["trade_date"] = pd.to_datetime(history["trade_date"])
+    return history
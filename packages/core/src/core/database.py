@@ -1,8 +1,10 @@
-from typing import List
+from contextlib import contextmanager
+from typing import List, Optional
 import os
+import threading
 from dotenv import load_dotenv
 
-from sqlalchemy import create_engine, or_
+from sqlalchemy import create_engine, event, or_
 from sqlalchemy.orm import sessionmaker
 
 from core.models import Base, StockSpotDB, StockHistoryDB
@@ -17,22 +19,121 @@ def get_project_root():
 load_dotenv(os.path.join(get_project_root(), ".env"))
 
 
+# 数据库后端: mysql（默认）/ sqlite / duckdb
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
 # MySQL 数据库配置 - 请根据您的实际配置修改这些参数
 MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "stock_data")
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE") or 20)
+
+# 并发同步时同时持有的数据库会话上限，默认与连接池大小一致
+DB_MAX_SESSIONS = int(os.getenv("DB_MAX_SESSIONS") or MYSQL_POOL_SIZE)
 
-SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_size=20,
-    max_overflow=0,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+# 嵌入式数据库文件路径
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join(
+    get_project_root(), "data", "stock_data.db"
 )
+DUCKDB_PATH = os.getenv("DUCKDB_PATH") or os.path.join(
+    get_project_root(), "data", "stock_data.duckdb"
+)
+
+
+def build_database_url(backend: str) -> str:
+    """根据后端类型生成 SQLAlchemy 连接串"""
+    if backend == "mysql":
+        return f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(os.path.abspath(SQLITE_PATH)), exist_ok=True)
+        return f"sqlite:///{os.path.abspath(SQLITE_PATH)}"
+    if backend == "duckdb":
+        os.makedirs(os.path.dirname(os.path.abspath(DUCKDB_PATH)), exist_ok=True)
+        return f"duckdb:///{os.path.abspath(DUCKDB_PATH)}"
+    raise ValueError(f"不支持的数据库后端: {backend}，可选值为 mysql / sqlite / duckdb")
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """SQLite 连接初始化：WAL 模式允许读写并发，NORMAL 同步级别减少 fsync"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def create_db_engine(backend: str = DB_BACKEND, url: Optional[str] = None):
+    """
+    创建数据库引擎
+
+    Args:
+        backend: mysql / sqlite / duckdb
+        url: 自定义连接串，默认根据 backend 与 .env 配置生成
+
+    Returns:
+        sqlalchemy.engine.Engine
+    """
+    url = url or build_database_url(backend)
+
+    if backend == "mysql":
+        return create_engine(
+            url,
+            pool_size=MYSQL_POOL_SIZE,
+            max_overflow=0,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+        )
+
+    if backend == "sqlite":
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(sqlite_engine, "connect", _enable_sqlite_wal)
+        return sqlite_engine
+
+    if backend == "duckdb":
+        try:
+            import duckdb_engine  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "DuckDB 后端需要安装 duckdb-engine: pip install duckdb-engine"
+            ) from e
+        return create_engine(url)
+
+    raise ValueError(f"不支持的数据库后端: {backend}，可选值为 mysql / sqlite / duckdb")
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_backend = DB_BACKEND
+
+
+def configure_database(backend: Optional[str] = None, url: Optional[str] = None):
+    """
+    运行时切换数据库后端（如基准测试指向临时 SQLite 文件）
+
+    已通过 get_db_session() 获取会话的模块无需重新导入。
+    """
+    global engine, _backend
+    _backend = (backend or _backend).lower()
+    engine.dispose()
+    engine = create_db_engine(_backend, url)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def get_engine():
+    """获取当前数据库引擎"""
+    return engine
+
+
+def get_backend() -> str:
+    """获取当前数据库后端名称: mysql / sqlite / duckdb"""
+    return _backend
 
 
 def get_db():
@@ -50,9 +151,35 @@ def get_db_session():
     return db
 
 
+_session_slots = threading.BoundedSemaphore(DB_MAX_SESSIONS)
+
+
+@contextmanager
+def session_scope():
+    """
+    获取一个受并发上限约束的会话，正常退出时提交，异常时回滚
+
+    并发同步的写入都经过这里，在途会话数不超过 DB_MAX_SESSIONS，
+    不会因为线程数超过连接池大小而排队超时。
+    """
+    with _session_slots:
+        db = SessionLocal()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
 def init_db():
     """Initialize database tables"""
+    from core.migrations import add_missing_columns
+
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
 
 
 def get_hist_db_session(symbol: str):
@@ -0,0 +1,310 @@
+"""
+数据库结构迁移
+
+create_all 只会创建缺失的表，已有表的列、索引、主键顺序与分区都需要在这里
+补齐。所有步骤都基于对当前库结构的探测，可以重复执行：
+
+1. 创建缺失的表
+2. 补齐模型中新增的可空列
+3. 主键新增 symbol_id 的表：补列并按 stock_symbol_data 回填整数ID
+4. 主键与模型不一致时重建主键（MySQL），其他后端补建同列的（唯一）索引
+5. 创建模型声明但库中缺失的索引
+6. （可选）MySQL 下按年份对大表做 RANGE 分区，并补齐新的年份分区
+"""
+
+import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, text
+
+from core.models import Base
+from core.database import get_backend, get_engine
+from core.logger import log
+from core.symbols import symbol_registry
+
+# 按年份 RANGE 分区的表及其分区日期列（仅 MySQL）
+PARTITIONED_TABLES: Dict[str, str] = {
+    "stock_history_data": "date",
+    "stock_spot_history_data": "trade_date",
+}
+
+# 无数据时分区的起始年份
+PARTITION_START_YEAR = 1990
+
+
+class Migrator:
+    """
+    探测当前库结构并生成、执行迁移语句
+
+    dry_run 模式只记录将要执行的语句，不修改数据库。
+    """
+
+    def __init__(self, dry_run: bool = False):
+        self.engine = get_engine()
+        self.backend = get_backend()
+        self.dry_run = dry_run
+        self.quote = self.engine.dialect.identifier_preparer.quote
+        self.statements: List[str] = []
+
+    def _inspector(self):
+        # 每一步重新探测，前一步的变更对后一步可见
+        return inspect(self.engine)
+
+    def _execute(self, statement: str):
+        self.statements.append(statement)
+        if self.dry_run:
+            log.info(f"[dry-run] {statement}")
+            return
+        log.info(f"执行迁移: {statement}")
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(statement)
+
+    def _columns_sql(self, columns) -> str:
+        return ", ".join(self.quote(column) for column in columns)
+
+    # ----------------------------- 表与列 -----------------------------
+
+    def create_missing_tables(self):
+        existing = set(self._inspector().get_table_names())
+        missing = [
+            table for table in Base.metadata.sorted_tables if table.name not in existing
+        ]
+        for table in missing:
+            self.statements.append(f"CREATE TABLE {self.quote(table.name)}")
+            if self.dry_run:
+                log.info(f"[dry-run] CREATE TABLE {table.name}")
+        if missing and not self.dry_run:
+            Base.metadata.create_all(bind=self.engine, tables=missing)
+
+    def add_missing_columns(self) -> Dict[str, List[str]]:
+        """为已存在的表补齐模型中新增的可空列，返回 表名 -> 新增列"""
+        inspector = self._inspector()
+        added: Dict[str, List[str]] = {}
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.primary_key or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=self.engine.dialect)
+                self._execute(
+                    f"ALTER TABLE {self.quote(table.name)} "
+                    f"ADD COLUMN {self.quote(column.name)} {column_type}"
+                )
+                added.setdefault(table.name, []).append(column.name)
+        return added
+
+    def backfill_symbol_ids(self):
+        """
+        为主键包含 symbol_id 的已有表补齐该列，并按 symbol 列回填整数ID
+
+        旧库中这些表以 String 代码作为主键前缀；先把出现过的代码写入字典表，
+        再用一条 UPDATE 回填，之后 sync_primary_keys 才能按新主键重建。
+        """
+        inspector = self._inspector()
+        for table in Base.metadata.sorted_tables:
+            if "symbol_id" not in table.primary_key.columns:
+                continue
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            if "symbol_id" in existing and not self._has_null_symbol_id(table.name):
+                continue
+
+            name = self.quote(table.name)
+            if "symbol_id" not in existing:
+                self._execute(f"ALTER TABLE {name} ADD COLUMN symbol_id INTEGER")
+            if not self.dry_run:
+                with self.engine.connect() as conn:
+                    codes = conn.exec_driver_sql(
+                        f"SELECT DISTINCT symbol FROM {name}"
+                    ).scalars().all()
+                symbol_registry.ensure(codes)
+
+            if self.backend == "mysql":
+                self._execute(
+                    f"UPDATE {name} t JOIN stock_symbol_data s ON s.code = t.symbol "
+                    f"SET t.symbol_id = s.id WHERE t.symbol_id IS NULL"
+                )
+            else:
+                self._execute(
+                    f"UPDATE {name} SET symbol_id = (SELECT s.id FROM stock_symbol_data s "
+                    f"WHERE s.code = {name}.symbol) WHERE symbol_id IS NULL"
+                )
+
+    def _has_null_symbol_id(self, table_name: str) -> bool:
+        with self.engine.connect() as conn:
+            return (
+                conn.exec_driver_sql(
+                    f"SELECT 1 FROM {self.quote(table_name)} "
+                    f"WHERE symbol_id IS NULL LIMIT 1"
+                ).first()
+                is not None
+            )
+
+    # ----------------------------- 主键与索引 -----------------------------
+
+    def sync_primary_keys(self):
+        """
+        使已有表的主键列顺序与模型一致
+
+        MySQL (InnoDB) 主键即聚簇索引，重建后同一股票的数据物理相邻；
+        SQLite / DuckDB 不支持修改主键，改为创建同顺序的二级索引。主键列集合
+        变化时（如新增 symbol_id）该索引为唯一索引，upsert 的 ON CONFLICT 依赖它。
+        """
+        inspector = self._inspector()
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            expected = [column.name for column in table.primary_key.columns]
+            current = inspector.get_pk_constraint(table.name).get(
+                "constrained_columns", []
+            )
+            if not expected or current == expected:
+                continue
+
+            if self.backend == "mysql":
+                self._execute(
+                    f"ALTER TABLE {self.quote(table.name)} DROP PRIMARY KEY, "
+                    f"ADD PRIMARY KEY ({self._columns_sql(expected)})"
+                )
+                continue
+
+            index_name = f"ix_{table.name}_{'_'.join(expected)}"
+            existing_indexes = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+            if index_name not in existing_indexes:
+                unique = "UNIQUE " if set(current) != set(expected) else ""
+                self._execute(
+                    f"CREATE {unique}INDEX {self.quote(index_name)} "
+                    f"ON {self.quote(table.name)} ({self._columns_sql(expected)})"
+                )
+
+    def create_missing_indexes(self, columns: Optional[Dict[str, List[str]]] = None):
+        """
+        创建模型声明但库中缺失的索引
+
+        Args:
+            columns: 表名 -> 列名，只创建涉及这些列的索引；None 表示全部
+        """
+        inspector = self._inspector()
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            if columns is not None and table.name not in columns:
+                continue
+            existing_indexes = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing_indexes:
+                    continue
+                if columns is not None and not any(
+                    column.name in columns[table.name] for column in index.columns
+                ):
+                    continue
+                unique = "UNIQUE " if index.unique else ""
+                self._execute(
+                    f"CREATE {unique}INDEX {self.quote(index.name)} "
+                    f"ON {self.quote(table.name)} "
+                    f"({self._columns_sql(column.name for column in index.columns)})"
+                )
+
+    # ----------------------------- 分区 -----------------------------
+
+    def _partition_years(self, table_name: str) -> List[int]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                    "AND PARTITION_NAME IS NOT NULL"
+                ),
+                {"table": table_name},
+            ).fetchall()
+        # VALUES LESS THAN (year + 1)，MAXVALUE 分区不计
+        return sorted(int(row[0]) - 1 for row in rows if row[0].isdigit())
+
+    def _min_year(self, table_name: str, column: str) -> int:
+        with self.engine.connect() as conn:
+            value = conn.exec_driver_sql(
+                f"SELECT MIN({self.quote(column)}) FROM {self.quote(table_name)}"
+            ).scalar()
+        return value.year if value else PARTITION_START_YEAR
+
+    def partition_tables(self):
+        """按年份 RANGE 分区（仅 MySQL），已分区的表只补齐到明年的年份分区"""
+        if self.backend != "mysql":
+            log.info(f"{self.backend} 不支持表分区，跳过")
+            return
+
+        inspector = self._inspector()
+        last_year = datetime.date.today().year + 1
+        for table_name, column in PARTITIONED_TABLES.items():
+            if not inspector.has_table(table_name):
+                continue
+            years = self._partition_years(table_name)
+            table = self.quote(table_name)
+
+            if not years:
+                first_year = self._min_year(table_name, column)
+                partitions = ", ".join(
+                    f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+                    for year in range(first_year, last_year + 1)
+                )
+                self._execute(
+                    f"ALTER TABLE {table} PARTITION BY RANGE (YEAR({self.quote(column)})) "
+                    f"({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                )
+                continue
+
+            new_years = range(years[-1] + 1, last_year + 1)
+            if new_years:
+                partitions = ", ".join(
+                    f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+                    for year in new_years
+                )
+                self._execute(
+                    f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO "
+                    f"({partitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                )
+
+    # ----------------------------- 入口 -----------------------------
+
+    def run(self, partition: bool = False) -> List[str]:
+        self.create_missing_tables()
+        self.add_missing_columns()
+        self.backfill_symbol_ids()
+        self.sync_primary_keys()
+        self.create_missing_indexes()
+        if partition:
+            self.partition_tables()
+        log.info(
+            f"数据库迁移完成{'（dry-run）' if self.dry_run else ''}，"
+            f"共 {len(self.statements)} 条语句"
+        )
+        return self.statements
+
+
+def migrate(dry_run: bool = False, partition: bool = False) -> List[str]:
+    """
+    将数据库结构迁移到与模型一致，可重复执行
+
+    Args:
+        dry_run: 只输出将要执行的语句
+        partition: 是否对 PARTITIONED_TABLES 中的表按年份分区（仅 MySQL）
+
+    Returns:
+        List[str]: 执行（或将要执行）的语句
+    """
+    return Migrator(dry_run).run(partition)
+
+
+def add_missing_columns():
+    """为已存在的表补齐模型中新增的可空列及其索引（init_db 使用的轻量迁移）"""
+    migrator = Migrator()
+    added = migrator.add_missing_columns()
+    if added:
+        migrator.create_missing_indexes(added)
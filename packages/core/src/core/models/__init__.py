@@ -2,7 +2,9 @@
 from .base import Base
 from ._stock import (
     StockSpotDB,
+    StockSpotHistoryDB,
     StockHistoryDB,
+    StockAdjustFactorDB,
     StockBusinessDB,
     StockBusinessCompositionDB,
     StockPledgeRatioDB,
@@ -15,12 +17,15 @@ from ._stock import (
     StockMainHolderDB,
 )
 from ._rule import StockChoseDB
-from ._task import StockSyncTaskDB
+from ._task import StockSyncTaskDB, StockSyncStateDB
+from ._symbol import StockSymbolDB
 
 __all__ = [
     "Base",
     "StockSpotDB",
+    "StockSpotHistoryDB",
     "StockHistoryDB",
+    "StockAdjustFactorDB",
     "StockBusinessDB",
     "StockBusinessCompositionDB",
     "StockPledgeRatioDB",
@@ -33,4 +38,6 @@ __all__ = [
     "StockMainHolderDB",
     "StockChoseDB",
     "StockSyncTaskDB",
+    "StockSyncStateDB",
+    "StockSymbolDB",
 ]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime, BigInteger
+from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime, BigInteger, Sequence, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 from core.models.base import Base
@@ -37,13 +37,51 @@ class StockSpotDB(Base):
     ytd_change = Column(Float)  # Year-to-date price change percentage
 
 
+class StockSpotHistoryDB(Base):
+    """SQLAlchemy model for append-only daily spot snapshots (每日行情快照)"""
+
+    __tablename__ = "stock_spot_history_data"
+
+    trade_date = Column(Date)  # 快照日期
+    symbol = Column(String(20))  # 股票代码
+    sync_time = Column(DateTime)  # 快照同步时间
+    name = Column(String(100))  # 股票简称
+    price = Column(Float)  # 最新价
+    change_percent = Column(Float)  # 涨跌幅 (%)
+    change_amount = Column(Float)  # 涨跌额
+    volume = Column(Float)  # 成交量 (手)
+    amount = Column(Float)  # 成交额 (元)
+    amplitude = Column(Float)  # 振幅 (%)
+    high = Column(Float)  # 最高
+    low = Column(Float)  # 最低
+    open = Column(Float)  # 今开
+    pre_close = Column(Float)  # 昨收
+    volume_ratio = Column(Float)  # 量比
+    turnover = Column(Float)  # 换手率 (%)
+    pe_ratio = Column(Float)  # 市盈率-动态
+    pb_ratio = Column(Float)  # 市净率
+    market_cap = Column(Float)  # 总市值
+    circulating_cap = Column(Float)  # 流通市值
+    day60_change = Column(Float)  # 60日涨跌幅 (%)
+    ytd_change = Column(Float)  # 年初至今涨跌幅 (%)
+
+    __table_args__ = (
+        # 主键以日期开头：按日期读取全市场截面只扫描一个连续区间
+        PrimaryKeyConstraint("trade_date", "symbol"),
+        Index("ix_stock_spot_history_symbol_trade_date", "symbol", "trade_date"),
+    )
+
+
 class StockHistoryDB(Base):
     """SQLAlchemy model for historical stock data"""
 
     __tablename__ = "stock_history_data"
 
     date = Column(Date, primary_key=True)  # 交易日
-    symbol = Column(String(20), primary_key=True)  # 股票代码 (不带市场标识)
+    symbol_id = Column(
+        Integer, primary_key=True, autoincrement=False
+    )  # 股票整数ID (stock_symbol_data.id)
+    symbol = Column(String(20), nullable=False)  # 股票代码 (不带市场标识)
     adjust = Column(
         String(10), primary_key=True
     )  # 数据复权 qfq: 返回前复权后的数据; hfq: 返回后复权后的数据; none: 返回不复权的数据
@@ -58,6 +96,26 @@ class StockHistoryDB(Base):
     change_amount = Column(Float)  # 涨跌额 (元)
     turnover = Column(Float)  # 换手率 (%)
 
+    __table_args__ = (
+        # 主键以整数ID开头：按股票读取历史与最新日期探测只扫描该股票的连续区间，
+        # 主键索引（以及 InnoDB 各二级索引中携带的主键）比字符串代码小
+        PrimaryKeyConstraint("symbol_id", "adjust", "date"),
+    )
+
+
+class StockAdjustFactorDB(Base):
+    """SQLAlchemy model for stock adjustment factor data (复权因子，来自新浪)"""
+
+    __tablename__ = "stock_adjust_factor_data"
+
+    symbol_id = Column(
+        Integer, primary_key=True, autoincrement=False
+    )  # 股票整数ID (stock_symbol_data.id)
+    date = Column(Date, primary_key=True)  # 因子生效日期
+    symbol = Column(String(20), nullable=False)  # 股票代码 (不带市场标识)
+    hfq_factor = Column(Float)  # 后复权因子: 后复权价 = 不复权价 × hfq_factor
+    qfq_factor = Column(Float)  # 前复权因子: 前复权价 = 不复权价 ÷ qfq_factor
+
 
 class StockBusinessDB(Base):
     """SQLAlchemy model for stock business information"""
@@ -76,8 +134,13 @@ class StockBusinessCompositionDB(Base):
 
     __tablename__ = "stock_business_composition"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20))  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_business_composition_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), index=True)  # 股票代码
     report_date = Column(Date)  # 报告日期
     category_type = Column(String(50))  # 分类类型
     main_composition = Column(String(500))  # 主营构成
@@ -114,15 +177,25 @@ class StockNewsDB(Base):
     """SQLAlchemy model for stock news data"""
 
     __tablename__ = "stock_news_data"
-
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    __table_args__ = (
+        # 同一股票的同一篇新闻只保存一次；早期数据 content_hash 为 NULL，不参与约束
+        Index("ux_stock_news_symbol_content_hash", "symbol", "content_hash", unique=True),
+    )
+
+    id = Column(
+        Integer,
+        Sequence("stock_news_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     keyword = Column(String(100))  # 关键词
     title = Column(String(200), nullable=False)  # 新闻标题
     content = Column(Text)  # 新闻内容
     publish_time = Column(DateTime, nullable=False)  # 发布时间
     source = Column(String(100))  # 新闻来源
     link = Column(String(300))  # 新闻链接
+    content_hash = Column(String(40), nullable=True)  # 标题与正文的 SHA-1
 
 
 class StockFinancialDebtDB(Base):
@@ -130,8 +203,13 @@ class StockFinancialDebtDB(Base):
 
     __tablename__ = "stock_financial_debt_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_financial_debt_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     report_date = Column(String(20), nullable=False)  # 报告期
     indicator_name = Column(String(100), nullable=False)  # 指标名称
     indicator_value = Column(String(50))  # 指标值
@@ -142,8 +220,13 @@ class StockResearchReportDB(Base):
 
     __tablename__ = "stock_research_report_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_research_report_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     short_name = Column(String(50))  # 股票简称
     report_name = Column(String(200))  # 报告名称
     rating = Column(String(20))  # 东财评级
@@ -165,8 +248,13 @@ class StockFinancialAbstractDB(Base):
 
     __tablename__ = "stock_financial_abstract_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_financial_abstract_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     report_date = Column(String(20))  # 报告期
     net_profit = Column(String(50))  # 净利润
     net_profit_growth_rate = Column(String(50))  # 净利润同比增长率
@@ -199,8 +287,13 @@ class StockFinancialAnalysisDB(Base):
 
     __tablename__ = "stock_financial_analysis_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_financial_analysis_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     date = Column(String(20))  # 日期
     diluted_earnings_per_share = Column(Float)  # 摊薄每股收益(元)
     weighted_earnings_per_share = Column(Float)  # 加权每股收益(元)
@@ -298,8 +391,13 @@ class StockGdhsDB(Base):
 
     __tablename__ = "stock_gdhs_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_gdhs_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     end_date = Column(String(20))  # 股东户数统计截止日
     change_range = Column(Float)  # 区间涨跌幅，单位:%
     current_gdhs = Column(Integer)  # 股东户数-本次
@@ -322,8 +420,13 @@ class StockMainHolderDB(Base):
 
     __tablename__ = "stock_main_holder_data"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)  # 自增ID
-    symbol = Column(String(20), nullable=False)  # 股票代码
+    id = Column(
+        Integer,
+        Sequence("stock_main_holder_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 自增ID
+    symbol = Column(String(20), nullable=False, index=True)  # 股票代码
     number = Column(String(20))  # 编号
     holder_name = Column(String(100))  # 股东名称
     hold_amount = Column(Float)  # 持股数量，单位: 股
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Sequence
+
+from core.models.base import Base
+
+
+class StockSymbolDB(Base):
+    """SQLAlchemy model for stock symbol dictionary (代码字典表)"""
+
+    __tablename__ = "stock_symbol_data"
+
+    id = Column(
+        Integer,
+        Sequence("stock_symbol_data_id_seq"),
+        primary_key=True,
+        autoincrement=True,
+    )  # 股票整数ID
+    code = Column(String(10), nullable=False, unique=True)  # 股票代码 (不带市场标识)
+    exchange = Column(String(4), nullable=False)  # 交易所 SH / SZ / BJ
+    board = Column(String(10))  # 板块 main / chinext / star / bse
+    name = Column(String(100))  # 股票简称
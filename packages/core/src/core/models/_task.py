@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
-from sqlalchemy import Column, Float, String, Integer, Date
+from sqlalchemy import Column, Float, String, Integer, Date, DateTime, Index
 
 from core.models.base import Base
 
@@ -9,10 +9,36 @@ class StockSyncTaskDB(Base):
     """SQLAlchemy model for stock sync task data"""
 
     __tablename__ = "stock_sync_task_data"
+    __table_args__ = (
+        # 领取任务时按 (date, status, next_run_at) 过滤
+        Index("ix_stock_sync_task_claim", "date", "status", "next_run_at"),
+    )
     date = Column(Date, primary_key=True)  # 同步日期
     symbol = Column(String(20), primary_key=True)  # 股票代码
-    status = Column(String(20))  # 同步状态 start,  completed, failed
+    status = Column(String(20))  # 同步状态 pending, running, completed, failed
     message = Column(String(500), nullable=True)  # 同步消息
     duration = Column(Float, nullable=True)  # 同步耗时（秒）
     start_time = Column(Date, nullable=True)  # 同步开始时间
     end_time = Column(Date, nullable=True)  # 同步结束时间
+    priority = Column(Integer, nullable=True)  # 优先级，越大越先领取
+    attempts = Column(Integer, nullable=True)  # 已领取（尝试）次数
+    lease_owner = Column(String(64), nullable=True)  # 当前持有租约的 worker
+    lease_expires_at = Column(DateTime, nullable=True)  # 租约过期时间，过期后可被其他 worker 领取
+    next_run_at = Column(DateTime, nullable=True)  # 失败重试的最早时间
+
+
+class StockSyncStateDB(Base):
+    """SQLAlchemy model for per-symbol incremental sync state"""
+
+    __tablename__ = "stock_sync_state_data"
+
+    dataset = Column(String(50), primary_key=True)  # 数据集，如 financial_abstract
+    symbol = Column(String(20), primary_key=True)  # 股票代码
+    checked_at = Column(DateTime, nullable=True)  # 最近一次成功抓取的时间
+    latest_period = Column(String(20), nullable=True)  # 已抓取到的最新报告期
+    watermark = Column(DateTime, nullable=True)  # 增量水位，如已保存新闻的最新发布时间
+    digest = Column(String(40), nullable=True)  # 最新一条数据的哈希，如最新新闻的 content_hash
+    changed_at = Column(DateTime, nullable=True)  # 最近一次数据有变化的时间
+    inserted = Column(Integer, nullable=True)  # 最近一次同步新增的行数
+    updated = Column(Integer, nullable=True)  # 最近一次同步更新的行数
+    deleted = Column(Integer, nullable=True)  # 最近一次同步删除的行数
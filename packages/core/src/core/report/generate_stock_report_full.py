@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 完整增强版：
-- 从 stock_data.db + 每个 stock_hist_{symbol}.db 读取数据
+- 通过 core.database 配置的后端读取实时数据，历史行情通过 core.data 一次性批量加载
 - 计算所有股票的回撤率
 - 输出 HTML 报告（交互式图表 + K线 + sparkline + DataTables）
 - 同时导出 CSV 和 Excel
@@ -11,28 +11,26 @@
 from __future__ import annotations
 import os
 import sys
-import sqlite3
 import json
 from pathlib import Path
 from typing import Any, Dict, List, Tuple, Optional
 from datetime import datetime
 from core.path import get_project_root
 import pandas as pd
+from core.data import load_hist_panel
+from core.database import get_backend, get_engine
 from core.logger import log
 
 # ----------------------------- 配置 -----------------------------
-DB_DIR = Path(get_project_root()) / "data"
-HIST_DIR = DB_DIR / "hist_db"
 OUTPUT_DIR = Path(get_project_root()) / "reports"
 
 # ----------------------------- 数据读取 -----------------------------
 
 
-def read_spot_db(db_path: Path) -> pd.DataFrame:
+def read_spot_db() -> pd.DataFrame:
     """读取实时股票数据"""
     try:
-        with sqlite3.connect(db_path) as conn:
-            df = pd.read_sql("SELECT * FROM stock_spot_data", conn)
+        df = pd.read_sql("SELECT * FROM stock_spot_data", get_engine())
         log.info(f"成功读取实时数据，共 {len(df)} 条记录")
         return df
     except Exception as e:
@@ -40,29 +38,36 @@ def read_spot_db(db_path: Path) -> pd.DataFrame:
         raise
 
 
-def read_hist_db(symbol: str, adjust: str = "qfq") -> pd.DataFrame:
-    """读取历史数据"""
-    db_file = HIST_DIR / f"stock_hist_{symbol}.db"
-    if not db_file.exists():
-        raise FileNotFoundError(f"历史数据库不存在: {symbol}")
+# adjust="any" 时按顺序取每只股票第一个有数据的复权类型
+ANY_ADJUST_ORDER = ("qfq", "hfq", "")
 
+
+def read_hist_panel(symbols: List[str], adjust: str = "qfq") -> Dict[str, pd.DataFrame]:
+    """
+    一次性读取所有股票的历史数据，按股票代码分组
+
+    adjust 为 "any" 时不限定复权类型：每只股票按 ANY_ADJUST_ORDER 取第一个
+    有数据的复权类型，不会混用多种复权类型的行情。
+    """
     try:
-        with sqlite3.connect(db_file) as conn:
-            if adjust == "any":
-                df = pd.read_sql(
-                    "SELECT date, open, high, low, close FROM stock_history_data", conn
-                )
-            else:
-                df = pd.read_sql(
-                    "SELECT date, open, high, low, close FROM stock_history_data WHERE adjust=?",
-                    conn,
-                    params=(adjust,),
-                )
-        df["date"] = pd.to_datetime(df["date"])
-        log.debug(f"成功读取股票 {symbol} 的历史数据，共 {len(df)} 条记录")
-        return df.sort_values("date")
+        groups: Dict[str, pd.DataFrame] = {}
+        rows = 0
+        for read_adjust in ANY_ADJUST_ORDER if adjust == "any" else (adjust,):
+            pending = [symbol for symbol in symbols if symbol not in groups]
+            if not pending:
+                break
+            panel = load_hist_panel(
+                symbols=pending,
+                adjust=read_adjust,
+                columns=("open", "high", "low", "close"),
+            )
+            for symbol, frame in panel.groupby("symbol", sort=False):
+                groups[symbol] = frame.reset_index(drop=True)
+            rows += len(panel)
+        log.info(f"成功读取历史数据，共 {len(groups)} 只股票 {rows} 条记录")
+        return groups
     except Exception as e:
-        log.error(f"读取股票 {symbol} 的历史数据失败: {e}")
+        log.error(f"读取历史数据失败: {e}")
         raise
 
 
@@ -102,6 +107,7 @@ def process_stock_data(
     stats = {"total": len(spot_df), "success": 0, "fail": 0}
 
     log.info(f"开始处理 {stats['total']} 只股票数据...")
+    hist_groups = read_hist_panel(spot_df["symbol"].tolist(), adjust)
 
     for idx, (_, stock) in enumerate(spot_df.iterrows(), 1):
         symbol = stock["symbol"]
@@ -114,8 +120,8 @@ def process_stock_data(
         log.debug(f"正在处理第 {idx} 只股票: {symbol}({name})")
 
         try:
-            hist_df = read_hist_db(symbol, adjust)
-            if hist_df.empty:
+            hist_df = hist_groups.get(symbol)
+            if hist_df is None or hist_df.empty:
                 raise ValueError("历史数据为空")
 
             # 使用历史数据中的最新收盘价作为当前价格
@@ -261,9 +267,8 @@ def generate_report(
 
     try:
         # 读取数据
-        spot_db_path = DB_DIR / "stock_data.db"
-        log.info(f"从数据库读取实时数据: {spot_db_path}")
-        spot_df = read_spot_db(spot_db_path)
+        log.info(f"从数据库读取实时数据，后端: {get_backend()}")
+        spot_df = read_spot_db()
 
         # 处理数据
         all_stocks, failures, stats = process_stock_data(spot_df, adjust)
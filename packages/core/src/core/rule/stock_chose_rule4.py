@@ -7,10 +7,8 @@ import os
 import akshare as ak
 from core.logger import log
 from sqlalchemy.orm import Session
-from core.models._stock import StockHistoryDB
-from core.database import get_db_session, get_hist_db_session
-from core.logger import log
-import concurrent.futures
+from core.database import get_db_session
+from core.data import load_hist_panel
 
 
 def stock_chose_rule4():
@@ -64,6 +62,22 @@ def stock_chose_rule4():
 
 
 class Rule4(Rule):
+    # 复权类型
+    ADJUST = "hfq"
+    # 面板回看天数：覆盖最近三个月窗口，长期停牌的股票视为无近期数据
+    LOOKBACK_DAYS = 120
+    # 选股与日志输出用到的行情字段
+    PANEL_COLUMNS = (
+        "open",
+        "close",
+        "high",
+        "low",
+        "volume",
+        "amount",
+        "change_percent",
+        "amplitude",
+    )
+
     def __init__(self) -> None:
         super().__init__("rule4")
 
@@ -81,27 +95,12 @@ class Rule4(Rule):
         return 0.3 <= retrace_ratio <= 0.4
 
     @staticmethod
-    def _chose(row):
+    def _chose(symbol, daily_price_df):
         try:
-            symbol = row.symbol
-            adjust = "hfq"
-
-            session: Session = get_hist_db_session(symbol)
-            daily_price_df = pd.read_sql(
-                session.query(StockHistoryDB)
-                .filter(
-                    StockHistoryDB.symbol == symbol,
-                    StockHistoryDB.adjust == adjust,
-                )
-                .statement,
-                session.bind,
-            )
-            if daily_price_df.empty:
+            if daily_price_df is None or daily_price_df.empty:
                 log.info(f"没有找到 {symbol} 的历史数据")
-                session.close()
                 return False
-            daily_price_df["datetime"] = pd.to_datetime(daily_price_df["date"])
-            daily_price_df.set_index("datetime", inplace=True)
+            daily_price_df = daily_price_df.set_index("date", drop=False)
 
             end_date = daily_price_df.index.max()
             start_date = end_date - pd.DateOffset(months=3)
@@ -133,7 +132,7 @@ class Rule4(Rule):
             log.info(f"  收盘价: {last_row['close']:.2f}")
             log.info(
                 "  详细信息: "
-                f"在{last_row['date']}，{last_row['symbol']}开盘价为{last_row['open']}元，收盘价为{last_row['close']}元，"
+                f"在{last_row['date'].date()}，{last_row['symbol']}开盘价为{last_row['open']}元，收盘价为{last_row['close']}元，"
                 f"最高价为{last_row['high']}元，最低价为{last_row['low']}元，成交量{last_row['volume']}手，"
                 f"成交额{last_row['amount']}元，涨跌幅{last_row['change_percent']}%，振幅{last_row['amplitude']}%。"
             )
@@ -141,7 +140,6 @@ class Rule4(Rule):
             retracement_ratio = (highest_price - last_row["close"]) / highest_price
             log.info(f"【回调比例计算】")
             log.info(f"  回调比例: {retracement_ratio:.2%}（收盘价较最高价的回撤幅度）")
-            session.close()
             return 0.3 <= retracement_ratio <= 0.4
         except Exception as e:
             log.info(f"异常:{e}")
@@ -155,16 +153,21 @@ class Rule4(Rule):
         stock_info_df = pd.read_sql(session.query(StockSpotDB).statement, session.bind)
         session.close()
 
-        # 多线程应用选股规则，指定线程数
-        THREAD_NUM = 200  # 可根据实际情况调整
-
-        def apply_rule(row):
-            return Rule4._chose(row)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_NUM) as executor:
-            results = list(
-                executor.map(apply_rule, [row for _, row in stock_info_df.iterrows()])
-            )
+        # 一次性加载全市场近期日线面板，替代逐只股票查询历史数据
+        start_date = datetime.date.today() - datetime.timedelta(
+            days=self.LOOKBACK_DAYS
+        )
+        panel = load_hist_panel(
+            start_date=start_date,
+            adjust=self.ADJUST,
+            columns=self.PANEL_COLUMNS,
+        )
+        groups = {symbol: frame for symbol, frame in panel.groupby("symbol", sort=False)}
+
+        results = [
+            Rule4._chose(symbol, groups.get(symbol))
+            for symbol in stock_info_df["symbol"]
+        ]
 
         stock_info_df["rule4_sinal"] = results
         filter_stock_info = stock_info_df[stock_info_df["rule4_sinal"]]
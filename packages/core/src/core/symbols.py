@@ -0,0 +1,235 @@
+"""
+股票代码字典
+
+统一解析 "600519" / "SH600519" / "sh600519" 等不同格式的股票代码，
+并把规范代码映射为 stock_symbol_data 中的整数ID。历史行情与复权因子两张
+最大的表以整数ID作为主键前缀，主键索引比 String(20) 代码小得多，不同数据集
+之间也可以按整数ID关联。
+"""
+
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from core.models import StockSymbolDB
+from core.database import get_db_session
+from core.logger import log
+
+EXCHANGES = ("SH", "SZ", "BJ")
+
+
+class SymbolInfo(NamedTuple):
+    """规范化后的股票代码信息"""
+
+    code: str  # 不带市场标识的代码，如 600519
+    exchange: str  # 交易所 SH / SZ / BJ
+    board: str  # 板块 main / chinext / star / bse
+
+    @property
+    def prefixed(self) -> str:
+        """带市场前缀的代码，如 SH600519"""
+        return f"{self.exchange}{self.code}"
+
+
+def _board_of(code: str, exchange: str) -> str:
+    if exchange == "BJ":
+        return "bse"
+    if code.startswith(("688", "689")):
+        return "star"
+    if code.startswith(("300", "301")):
+        return "chinext"
+    return "main"
+
+
+@lru_cache(maxsize=None)
+def parse_symbol(symbol: str) -> SymbolInfo:
+    """
+    解析股票代码，结果按输入缓存，避免每次调用重复做前缀判断
+
+    Args:
+        symbol: 股票代码，可能是纯数字或已带有 SH / SZ / BJ 前缀
+
+    Returns:
+        SymbolInfo: 代码、交易所与板块
+    """
+    text = symbol.strip().upper()
+    exchange = None
+    if text.startswith(EXCHANGES):
+        exchange, text = text[:2], text[2:]
+
+    if exchange is None:
+        # 6开头的为上海股票；0、3开头的为深圳股票；4、8、9开头的为北京股票
+        if text.startswith("6"):
+            exchange = "SH"
+        elif text.startswith(("0", "3")):
+            exchange = "SZ"
+        elif text.startswith(("4", "8", "9")):
+            exchange = "BJ"
+        else:
+            log.warning(f"无法确定股票代码 {symbol} 的市场类型，默认使用SH前缀")
+            exchange = "SH"
+
+    return SymbolInfo(text, exchange, _board_of(text, exchange))
+
+
+class SymbolRegistry:
+    """
+    代码字典的进程内缓存：code <-> 整数ID
+
+    首次使用时整表加载，未知代码按需写入字典表。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._codes: Dict[int, str] = {}
+        self._loaded = False
+
+    def load(self) -> int:
+        """从数据库整表加载代码字典"""
+        db = get_db_session()
+        try:
+            rows = db.query(StockSymbolDB.id, StockSymbolDB.code).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._ids = {code: symbol_id for symbol_id, code in rows}
+            self._codes = {symbol_id: code for symbol_id, code in rows}
+            self._loaded = True
+        return len(rows)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def ensure(
+        self, symbols: Iterable[str], names: Optional[Dict[str, str]] = None
+    ) -> Dict[str, int]:
+        """
+        确保代码存在于字典表中，返回 code -> ID 映射
+
+        Args:
+            symbols: 任意格式的股票代码
+            names: 可选的 code -> 股票简称，用于新增或更新简称
+
+        Returns:
+            Dict[str, int]: 不带市场标识的代码到整数ID的映射
+
+        Raises:
+            RuntimeError: 部分代码未能写入字典表
+        """
+        self._ensure_loaded()
+        infos = {parse_symbol(s).code: parse_symbol(s) for s in symbols if s}
+        names = {parse_symbol(k).code: v for k, v in (names or {}).items()}
+        missing = [info for code, info in infos.items() if code not in self._ids]
+
+        if missing:
+            rows = [
+                {
+                    "code": info.code,
+                    "exchange": info.exchange,
+                    "board": info.board,
+                    "name": names.get(info.code),
+                }
+                for info in missing
+            ]
+            if not self._insert(rows):
+                # 其他进程已写入其中部分代码，整批回滚；重新加载后逐个补写仍缺失的代码
+                self.load()
+                for row in rows:
+                    if row["code"] not in self._ids:
+                        self._insert([row])
+            self.load()
+
+        mapping = {code: self._ids[code] for code in infos if code in self._ids}
+        if len(mapping) < len(infos):
+            lost = sorted(set(infos) - set(mapping))
+            raise RuntimeError(f"代码字典写入失败: {lost[:10]}")
+        return mapping
+
+    @staticmethod
+    def _insert(rows: List[Dict]) -> bool:
+        """写入字典表，违反唯一约束时回滚并返回 False"""
+        db = get_db_session()
+        try:
+            db.bulk_insert_mappings(StockSymbolDB, rows)
+            db.commit()
+            log.info(f"代码字典新增 {len(rows)} 个股票代码")
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+
+    def lookup(self, symbols: Iterable[str]) -> Dict[str, int]:
+        """
+        只读查询代码对应的整数ID，不写入字典表
+
+        字典中没有的代码不会有行情数据，结果中直接略去；缓存之后新增的代码
+        会触发一次重新加载。
+
+        Returns:
+            Dict[str, int]: 不带市场标识的代码到整数ID的映射
+        """
+        self._ensure_loaded()
+        codes = {parse_symbol(s).code for s in symbols if s}
+        if any(code not in self._ids for code in codes):
+            self.load()
+        return {code: self._ids[code] for code in codes if code in self._ids}
+
+    def id_of(self, symbol: str) -> int:
+        """获取股票代码对应的整数ID，不存在时自动写入字典表"""
+        self._ensure_loaded()
+        code = parse_symbol(symbol).code
+        symbol_id = self._ids.get(code)
+        if symbol_id is None:
+            symbol_id = self.ensure([code])[code]
+        return symbol_id
+
+    def code_of(self, symbol_id: int) -> Optional[str]:
+        """根据整数ID获取不带市场标识的代码"""
+        self._ensure_loaded()
+        code = self._codes.get(symbol_id)
+        if code is None:
+            self.load()
+            code = self._codes.get(symbol_id)
+        return code
+
+
+# 全局代码字典
+symbol_registry = SymbolRegistry()
+
+
+def sync_symbol_master(symbols: Iterable[str], names: Optional[Dict[str, str]] = None):
+    """
+    根据全市场代码列表维护代码字典表，并更新股票简称
+
+    Args:
+        symbols: 全市场股票代码
+        names: code -> 股票简称
+    """
+    mapping = symbol_registry.ensure(symbols, names)
+    if names:
+        db = get_db_session()
+        try:
+            db.bulk_update_mappings(
+                StockSymbolDB,
+                [
+                    {"id": mapping[parse_symbol(code).code], "name": name}
+                    for code, name in names.items()
+                    if parse_symbol(code).code in mapping
+                ],
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.error(f"更新代码字典简称失败: {e}")
+            raise
+        finally:
+            db.close()
+    log.info(f"代码字典共 {len(mapping)} 个股票代码")
+    return mapping
@@ -0,0 +1,262 @@
+"""
+akshare 调用的本地缓存
+
+同步模块通过 `from .ak_client import ak` 调用 akshare，接口与
+`import akshare as ak` 相同。开启缓存后，返回的 DataFrame 按
+“函数名 + 参数”写入本地磁盘（Parquet，无法转换的按 pickle 保存），
+重跑失败批次、调试转换逻辑或重建表时直接读取缓存，不再请求数据源。
+
+由 .env 配置：
+
+- AK_CACHE_MODE：off（默认，不缓存）/ on（读缓存，未命中或过期时请求并写入）
+  / replay（只读缓存，未命中抛出 CacheMiss，不发任何请求）/ refresh（总是
+  请求并覆盖缓存）
+- AK_CACHE_DIR：缓存目录，默认 packages/data/ak_cache
+- AK_CACHE_MAX_MB：缓存总大小上限，超出后按最近使用时间淘汰（LRU）
+- AK_PROVIDER：akshare（默认）/ fake（本地替身，见 core.bench，用于离线压测）
+
+各接口的有效期见 CACHE_TTL，实时行情按分钟、历史行情与财务数据按天。
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import akshare
+import pandas as pd
+
+from core.path import get_project_root
+from core.logger import log
+
+MODES = ("off", "on", "replay", "refresh")
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# 各接口缓存有效期（秒），未列出的使用 DEFAULT_TTL
+CACHE_TTL: Dict[str, int] = {
+    "stock_zh_a_spot_em": 5 * MINUTE,  # 实时行情
+    "stock_zh_a_hist": 12 * HOUR,  # 日线行情，收盘后更新
+    "stock_zh_a_daily": 12 * HOUR,  # 复权因子
+    "stock_news_em": HOUR,  # 个股新闻
+    "stock_research_report_em": DAY,  # 研究报告
+    "stock_zh_a_gdhs_detail_em": 7 * DAY,  # 股东户数
+    "stock_zh_a_gdhs": DAY,  # 全市场股东户数
+    "stock_gpzy_pledge_ratio_em": DAY,  # 全市场质押比例
+    "stock_main_stock_holder": 7 * DAY,  # 主要股东
+    "stock_zygc_em": 90 * DAY,  # 主营构成
+    # 财务数据何时重新请求由披露期调度决定（见 report_schedule），缓存只用于当天重跑
+    "stock_financial_debt_ths": DAY,  # 资产负债表
+    "stock_financial_abstract_ths": DAY,  # 财务摘要
+    "stock_financial_analysis_indicator": DAY,  # 财务分析指标
+    "stock_yysj_em": DAY,  # 预约披露时间
+}
+DEFAULT_TTL = DAY
+
+# 默认缓存上限（MB）
+DEFAULT_MAX_MB = 2048
+
+
+class CacheMiss(LookupError):
+    """replay 模式下缓存未命中"""
+
+
+def cache_mode() -> str:
+    mode = os.getenv("AK_CACHE_MODE", "off").lower()
+    if mode not in MODES:
+        raise ValueError(f"AK_CACHE_MODE 只支持 {MODES}，当前为 {mode}")
+    return mode
+
+
+def cache_root() -> Path:
+    return Path(
+        os.getenv("AK_CACHE_DIR") or os.path.join(get_project_root(), "data", "ak_cache")
+    )
+
+
+def cache_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """函数名 + 参数的稳定哈希"""
+    payload = json.dumps(
+        {"args": list(args), "kwargs": kwargs}, sort_keys=True, default=str
+    )
+    return hashlib.sha1(f"{name}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+class ResponseCache:
+    """
+    按接口分目录保存的 DataFrame 缓存：{root}/{name}/{key}.parquet|.pkl
+
+    文件 mtime 为写入时间（判断过期），atime 为最近使用时间（命中时刷新）；
+    总大小超过上限时从最久未使用的文件开始删除。
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root) if root else cache_root()
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(float(os.getenv("AK_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        )
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _files(self, name: str, key: str):
+        directory = self.root / name
+        return directory / f"{key}.parquet", directory / f"{key}.pkl"
+
+    def get(self, name: str, key: str, ttl: Optional[int]) -> Optional[pd.DataFrame]:
+        """读取未过期的缓存，ttl 为 None 时忽略有效期"""
+        for path in self._files(name, key):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # mtime 为写入时间，用于判断是否过期
+            if ttl is not None and time.time() - stat.st_mtime > ttl:
+                return None
+            try:
+                if path.suffix == ".parquet":
+                    data = pd.read_parquet(path)
+                else:
+                    with open(path, "rb") as f:
+                        data = pickle.load(f)
+            except Exception as e:
+                log.warning(f"读取缓存 {path} 失败，忽略: {e}")
+                return None
+            # atime 记录最近使用时间，用于 LRU 淘汰，保留 mtime
+            os.utime(path, (time.time(), stat.st_mtime))
+            return data
+        return None
+
+    def put(self, name: str, key: str, data: Any):
+        parquet_path, pickle_path = self._files(name, key)
+        parquet_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = parquet_path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        path = parquet_path
+        try:
+            if not isinstance(data, pd.DataFrame):
+                raise TypeError(type(data))
+            data.to_parquet(tmp, index=False)
+        except Exception:
+            # 混合类型列等无法写成 Parquet 的结果按 pickle 保存
+            path = pickle_path
+            with open(tmp, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # 覆盖同一个 key 时，被替换的旧文件不再计入总大小
+        replaced = _file_size(parquet_path) + _file_size(pickle_path)
+        stale = pickle_path if path is parquet_path else parquet_path
+        stale.unlink(missing_ok=True)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += path.stat().st_size - replaced
+            self._evict()
+
+    def _cache_files(self):
+        """已写入的缓存文件，不含其他线程正在写入的 .tmp 文件"""
+        return [p for p in self.root.glob("*/*") if p.suffix != ".tmp" and p.is_file()]
+
+    def _evict(self):
+        if self._size is None:
+            self._size = sum(_file_size(p) for p in self._cache_files())
+        if self._size <= self.max_bytes:
+            return
+        files = sorted(self._cache_files(), key=lambda p: p.stat().st_atime)
+        # 淘汰到上限的 90%，避免每次写入都触发扫描
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path in files:
+            if self._size <= target:
+                break
+            size = _file_size(path)
+            path.unlink(missing_ok=True)
+            self._size -= size
+            removed += 1
+        log.info(f"akshare 缓存超过上限，淘汰 {removed} 个文件")
+
+
+def default_provider():
+    """由 AK_PROVIDER 选择数据源：真实的 akshare 或本地替身"""
+    provider = os.getenv("AK_PROVIDER", "akshare").lower()
+    if provider == "fake":
+        from core.bench import FakeAkshare
+
+        log.warning("AK_PROVIDER=fake，同步模块使用本地替身数据源")
+        return FakeAkshare.from_env()
+    return akshare
+
+
+class CachedAkshare:
+    """akshare 模块的缓存代理，按 AK_CACHE_MODE 决定是否经过缓存"""
+
+    def __init__(self, module=None, cache: Optional[ResponseCache] = None):
+        self._module = module if module is not None else default_provider()
+        self._cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def use(self, module):
+        """切换底层数据源，如基准测试中换成 FakeAkshare"""
+        self._module = module
+
+    @property
+    def cache(self) -> ResponseCache:
+        if self._cache is None:
+            self._cache = ResponseCache()
+        return self._cache
+
+    def call(self, name: str, *args, **kwargs):
+        func = getattr(self._module, name)
+        mode = cache_mode()
+        if mode == "off":
+            return func(*args, **kwargs)
+
+        key = cache_key(name, args, kwargs)
+        if mode != "refresh":
+            # replay 模式下忽略有效期，只要有缓存就使用
+            ttl = None if mode == "replay" else CACHE_TTL.get(name, DEFAULT_TTL)
+            data = self.cache.get(name, key, ttl)
+            if data is not None:
+                self.hits += 1
+                return data
+            if mode == "replay":
+                raise CacheMiss(f"replay 模式下缓存未命中: {name} {args} {kwargs}")
+
+        self.misses += 1
+        data = func(*args, **kwargs)
+        try:
+            self.cache.put(name, key, data)
+        except Exception as e:
+            log.warning(f"写入 akshare 缓存失败: {name}: {e}")
+        return data
+
+    def __getattr__(self, name: str):
+        target = getattr(self._module, name)
+        if not callable(target):
+            return target
+
+        def cached(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        cached.__name__ = name
+        cached.__doc__ = target.__doc__
+        return cached
+
+
+# 同步模块共用的 akshare 入口
+ak = CachedAkshare()
@@ -0,0 +1,105 @@
+"""
+DataFrame 到数据库的列式转换
+
+sync_* 整理数据和 writer 写库都经过这里，所有处理按列向量化完成，
+不再逐行、逐字段做 isinstance 判断：
+
+- prepare_frame: 重命名列、补充常量列（symbol 等）、填充缺失值
+- to_columns: 按目标列类型转换每一列（数值列统一为数值、日期时间列转换为
+  date / datetime / 字符串），整列转换为 Python 原生对象，缺失值为 None
+- to_rows: 把各列拼成行元组，由 writer 直接交给驱动的 executemany
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, Float, Integer, Numeric, String, Table, Text
+
+from core.logger import log
+
+
+def fill_missing(df: pd.DataFrame) -> pd.DataFrame:
+    """数值列 NaN 填 0，字符串列 NaN 填空字符串，只处理存在缺失值的列"""
+    missing = df.isna().any()
+    for name in missing[missing].index:
+        series = df[name]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[name] = series.fillna(0)
+        elif series.dtype == object:
+            df[name] = series.fillna("")
+    return df
+
+
+def prepare_frame(
+    df: pd.DataFrame,
+    column_map: Optional[Dict[str, str]] = None,
+    fill: bool = True,
+    **constants: Any,
+) -> pd.DataFrame:
+    """
+    整理 akshare 返回的数据
+
+    Args:
+        df: 原始数据，原地修改
+        column_map: 中文列名 -> 数据库字段
+        fill: 是否填充缺失值（见 fill_missing）
+        constants: 需要补充的常量列，如 symbol="SH600000"
+
+    Returns:
+        pd.DataFrame: 整理后的数据
+    """
+    if column_map:
+        df.rename(columns=column_map, inplace=True)
+    for name, value in constants.items():
+        df[name] = value
+    if fill:
+        fill_missing(df)
+    return df
+
+
+def _native_column(series: pd.Series, column_type) -> np.ndarray:
+    """按目标列类型转换整列，返回 Python 原生对象数组，缺失值为 None"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if isinstance(column_type, Date):
+            values = series.dt.date.to_numpy(dtype=object)
+        elif isinstance(column_type, (String, Text)):
+            values = series.astype(str).to_numpy(dtype=object)
+        else:
+            if series.dt.tz is not None:
+                # 数据库 DateTime 列不带时区，保留当地时间
+                series = series.dt.tz_localize(None)
+            # datetime64[us] 整列转换为 datetime.datetime，NaT 转换为 None
+            values = series.to_numpy(dtype="datetime64[us]").astype(object)
+    else:
+        if series.dtype == object and isinstance(column_type, (Float, Integer, Numeric)):
+            # akshare 部分接口以字符串返回数值，无法解析的值写为 NULL
+            series = pd.to_numeric(series, errors="coerce")
+        # astype(object) 把 numpy 标量整列转换为 Python int / float / bool
+        values = series.to_numpy(dtype=object)
+
+    missing = series.isna().to_numpy()
+    if missing.any():
+        values[missing] = None
+    return values
+
+
+def to_columns(df: pd.DataFrame, table: Table) -> Tuple[List[str], List[np.ndarray]]:
+    """
+    将 DataFrame 转换为可直接写库的列
+
+    只保留表中存在的列，返回 (列名, 各列的原生对象数组)。
+    """
+    names = [c for c in df.columns if c in table.columns]
+    dropped = [c for c in df.columns if c not in table.columns]
+    if dropped:
+        log.debug(f"{table.name} 不存在字段，写入时忽略: {dropped}")
+    return names, [_native_column(df[name], table.columns[name].type) for name in names]
+
+
+def to_rows(df: pd.DataFrame, table: Table) -> Tuple[List[str], List[tuple]]:
+    """将 DataFrame 转换为 (列名, 行元组列表)，行内顺序与列名一致"""
+    names, columns = to_columns(df, table)
+    if not names:
+        return names, []
+    return names, list(zip(*columns))
@@ -0,0 +1,303 @@
+"""
+asyncio 抓取引擎
+
+akshare 接口都是阻塞调用，这里用事件循环统一调度：每个数据源（东方财富、
+新浪、同花顺）一个令牌桶限制请求速率，默认按请求结果自适应调整（见
+throttle）；阻塞调用在有界线程池中执行，抓取结果通过队列交给写库协程，
+写库同样在独立的有界线程池中执行。抓取与写库互不阻塞，线程数固定为
+max_workers + write_workers。
+
+各数据源的请求速率（次/秒）可以在 .env 中通过 FETCH_RATE_EM、
+FETCH_RATE_SINA、FETCH_RATE_THS 调整。
+"""
+
+import asyncio
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from core.logger import log
+from .runner import RunResult
+from .throttle import AdaptiveRateController
+
+# 默认的各数据源请求速率（次/秒）
+DEFAULT_PROVIDER_RATES = {
+    "em": 4.0,  # 东方财富
+    "sina": 2.0,  # 新浪财经
+    "ths": 2.0,  # 同花顺
+}
+
+# 每完成多少个任务输出一次引擎状态
+STATS_EVERY = 100
+
+
+def provider_rate(provider: str) -> float:
+    """读取数据源的请求速率，.env 中的 FETCH_RATE_<PROVIDER> 优先"""
+    value = os.getenv(f"FETCH_RATE_{provider.upper()}")
+    if value:
+        return float(value)
+    return DEFAULT_PROVIDER_RATES.get(provider, 2.0)
+
+
+class TokenBucket:
+    """异步令牌桶：平均速率 rate 次/秒，允许 capacity 次突发"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _loop_lock(self) -> asyncio.Lock:
+        # 每次 FetchEngine.run 都在新的事件循环中执行，锁需绑定当前循环；
+        # 速率与令牌数跨批次保留
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def set_rate(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+    async def acquire(self, tokens: float = 1):
+        """取出 tokens 个令牌；超过桶容量的部分记为欠账，由后续请求等待偿还"""
+        needed = min(tokens, self.capacity)
+        async with self._loop_lock():
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+@dataclass
+class FetchJob:
+    """
+    一个抓取任务：在 provider 的限速下调用 func(*args, **kwargs)
+
+    cost 为 func 实际发出的请求数（如一次抓取多种复权），按此数量消耗令牌。
+    """
+
+    key: str
+    provider: str
+    func: Callable[..., Any]
+    args: tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    cost: int = 1
+
+
+class FetchEngine:
+    """
+    抓取 → 写库流水线
+
+    Args:
+        max_workers: 同时在途的抓取请求数（抓取线程数）
+        write_workers: 写库线程数
+        rates: 覆盖各数据源的请求速率
+        adaptive: 按请求结果自适应调整各数据源的速率与并发（AIMD），
+                  关闭时按固定速率请求
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        write_workers: int = 2,
+        rates: Optional[Dict[str, float]] = None,
+        adaptive: bool = True,
+    ):
+        self.max_workers = max(1, max_workers)
+        self.write_workers = max(1, write_workers)
+        self.rates = rates or {}
+        self.adaptive = adaptive
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.controllers: Dict[str, AdaptiveRateController] = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    def bucket(self, provider: str) -> TokenBucket:
+        if provider not in self.buckets:
+            rate = self.rates.get(provider) or provider_rate(provider)
+            self.buckets[provider] = TokenBucket(rate)
+            if self.adaptive:
+                self.controllers[provider] = AdaptiveRateController(
+                    rate=rate,
+                    concurrency=max(1, self.max_workers // 2),
+                    max_concurrency=self.max_workers,
+                    label=f"抓取引擎:{provider}",
+                )
+        return self.buckets[provider]
+
+    def stats(self) -> Dict[str, int]:
+        """当前排队、在途与已完成的任务数"""
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    async def fetch(
+        self, provider: str, func: Callable[..., Any], *args, cost: int = 1, **kwargs
+    ):
+        """在 provider 限速与抓取并发上限内执行一次阻塞调用，cost 为其中的请求数"""
+        bucket = self.bucket(provider)
+        controller = self.controllers.get(provider)
+        self.queued += 1
+        try:
+            await bucket.acquire(cost)
+            await self._fetch_slots.acquire()
+            # 自适应并发：超过控制器当前允许的在途数时等待
+            while controller is not None and not controller.try_acquire():
+                await asyncio.sleep(0.05)
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        started = time.time()
+        ok = False
+        data = None
+        try:
+            data = await self._loop.run_in_executor(
+                self._fetch_executor, partial(func, *args, **kwargs)
+            )
+            ok = True
+            return data
+        finally:
+            self.in_flight -= 1
+            self._fetch_slots.release()
+            if controller is not None:
+                if ok and data is None:
+                    # 任务无需请求（如数据已是最新），不计入速率调整
+                    controller.cancel()
+                else:
+                    parts = data.values() if isinstance(data, dict) else [data]
+                    empty = all(bool(getattr(part, "empty", False)) for part in parts)
+                    controller.release(ok, time.time() - started, empty=empty)
+                    bucket.set_rate(controller.rate)
+
+    def run(
+        self,
+        jobs: Iterable[FetchJob],
+        write: Callable[[FetchJob, Any], int],
+        on_done: Optional[Callable[[str, bool, Optional[str], float, int], None]] = None,
+        label: str = "数据",
+    ) -> RunResult:
+        """
+        执行全部抓取任务，并把结果交给 write 写库
+
+        Args:
+            jobs: 抓取任务
+            write: write(job, data) -> 写入行数，在写库线程中执行
+            on_done: on_done(key, ok, error, elapsed, rows)，在写库线程中执行
+            label: 日志中的数据名称
+
+        Returns:
+            RunResult: 成功 / 失败统计
+        """
+        jobs = list(jobs)
+        result = RunResult(total=len(jobs))
+        started = time.time()
+        if jobs:
+            asyncio.run(self._run(jobs, write, on_done, result, label))
+        result.elapsed = time.time() - started
+        rate = result.total / result.elapsed if result.elapsed > 0 else 0.0
+        log.info(
+            f"{label}同步完成，总计: {result.total}, 成功: {result.success}, "
+            f"失败: {result.failed}, 耗时: {result.elapsed:.2f}s, {rate:.2f} 个/秒"
+        )
+        return result
+
+    async def _run(self, jobs, write, on_done, result: RunResult, label: str):
+        self._loop = asyncio.get_running_loop()
+        self._fetch_slots = asyncio.Semaphore(self.max_workers)
+        self._fetch_executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="fetch"
+        )
+        self._write_executor = ThreadPoolExecutor(
+            max_workers=self.write_workers, thread_name_prefix="write"
+        )
+        # 有界队列：写库跟不上时反压抓取，避免结果在内存中堆积
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_workers * 2)
+
+        def finish(job: FetchJob, ok: bool, error, job_started: float, rows: int):
+            elapsed = time.time() - job_started
+            if ok:
+                result.success += 1
+            else:
+                result.failed += 1
+                result.failures[job.key] = error
+            if on_done is not None:
+                on_done(job.key, ok, error, elapsed, rows)
+
+        def write_and_finish(job: FetchJob, data, job_started: float):
+            try:
+                rows = write(job, data)
+            except Exception as e:
+                log.error(f"[{job.key}] 写库失败: {e}")
+                log.error(f"[{job.key}] 详细错误信息:\n{traceback.format_exc()}")
+                finish(job, False, str(e), job_started, 0)
+                return
+            finish(job, True, None, job_started, rows or 0)
+
+        async def fetch_one(job: FetchJob):
+            job_started = time.time()
+            try:
+                data = await self.fetch(
+                    job.provider, job.func, *job.args, cost=job.cost, **job.kwargs
+                )
+            except Exception as e:
+                self.failed += 1
+                log.error(f"[{job.key}] 抓取失败: {e}")
+                log.error(f"[{job.key}] 详细错误信息:\n{traceback.format_exc()}")
+                await self._loop.run_in_executor(
+                    self._write_executor, finish, job, False, str(e), job_started, 0
+                )
+                return
+            await queue.put((job, data, job_started))
+
+        async def writer():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                await self._loop.run_in_executor(
+                    self._write_executor, write_and_finish, *item
+                )
+                self.completed += 1
+                if self.completed % STATS_EVERY == 0:
+                    self.log_stats(label, len(jobs))
+
+        writers = [asyncio.create_task(writer()) for _ in range(self.write_workers)]
+        try:
+            await asyncio.gather(*(fetch_one(job) for job in jobs))
+        finally:
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+            self._fetch_executor.shutdown(wait=True)
+            self._write_executor.shutdown(wait=True)
+        self.log_stats(label, len(jobs))
+
+    def log_stats(self, label: str, total: int):
+        rates = ", ".join(
+            f"{provider}:{bucket.rate:.1f}/s" for provider, bucket in self.buckets.items()
+        )
+        log.info(
+            f"{label}抓取引擎: 排队 {self.queued}, 在途 {self.in_flight}, "
+            f"完成 {self.completed + self.failed}/{total}, 抓取失败 {self.failed} | 速率 {rates}"
+        )
@@ -0,0 +1,87 @@
+"""
+按股票整体同步的基本面数据表的写入
+
+股东户数、主要股东、财务数据、研报、主营构成等表每次同步都会拿到该股票的
+全部数据。默认按自然键与已有数据比较（见 writer.diff_dataframe），只写入
+变化的行，避免每次删除并重新插入全部数据带来的页分裂、binlog 膨胀与缓存失效；
+每只股票最近一次的新增 / 更新 / 删除行数记录在 stock_sync_state_data 中。
+
+由 .env 的 FUNDAMENTALS_WRITE_MODE 配置：diff（默认）/ replace（整体替换）。
+"""
+
+import datetime
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import pandas as pd
+
+from core.models import StockSyncStateDB
+from core.logger import log
+from .writer import (
+    DiffResult,
+    diff_dataframe,
+    replace_dataframe,
+    staging_active,
+    upsert_dataframe,
+)
+
+WRITE_MODES = ("diff", "replace")
+
+
+def write_mode() -> str:
+    mode = os.getenv("FUNDAMENTALS_WRITE_MODE", "diff").lower()
+    if mode not in WRITE_MODES:
+        raise ValueError(f"FUNDAMENTALS_WRITE_MODE 只支持 {WRITE_MODES}，当前为 {mode}")
+    return mode
+
+
+def record_changes(dataset: str, symbol: str, result: DiffResult):
+    """记录一只股票本次同步的变更行数"""
+    now = datetime.datetime.now()
+    state = {
+        "dataset": dataset,
+        "symbol": symbol,
+        "checked_at": now,
+        "inserted": result.inserted,
+        "updated": result.updated,
+        "deleted": result.deleted,
+    }
+    if result.changed:
+        state["changed_at"] = now
+    upsert_dataframe(pd.DataFrame([state]), StockSyncStateDB, label=symbol)
+
+
+def write_symbol_frame(
+    df: pd.DataFrame,
+    model,
+    symbol: str,
+    key_columns: Sequence[str],
+    dataset: str,
+    where: Optional[Dict[str, Any]] = None,
+) -> DiffResult:
+    """
+    写入一只股票的全部数据
+
+    Args:
+        df: 该股票的全部数据
+        model: 目标 ORM 模型
+        symbol: 带前缀的股票代码，用于日志与变更记录
+        key_columns: 自然键（不含 symbol），如 ["report_date"]
+        dataset: 变更记录中的数据集名称
+        where: 同步范围，默认 {"symbol": symbol}
+
+    Returns:
+        DiffResult: 变更统计；replace 模式或写入暂存表时只有插入行数
+    """
+    where = where or {"symbol": symbol}
+    # 全量刷新写入的暂存表起始为空，逐行比较没有意义，直接替换
+    if write_mode() == "replace" or staging_active(model):
+        return DiffResult(inserted=replace_dataframe(df, model, where, label=symbol))
+
+    result = diff_dataframe(df, model, key_columns, where, label=symbol)
+    try:
+        record_changes(dataset, symbol, result)
+    except Exception as e:
+        # 变更记录只用于观察，失败不影响已提交的数据
+        log.warning(f"[{symbol}] 记录 {dataset} 变更行数失败: {e}")
+    return result
@@ -0,0 +1,207 @@
+"""
+历史行情缺口检测与修补
+
+增量同步只从最新日期向后抓取，中间缺失的行情（某次同步失败、数据源
+临时返回不完整等）不会被发现。这里按交易日历比较每只股票应有与实有的
+行情：把日期映射为交易日序号后，同一股票相邻两条行情的序号差大于 1 即为
+缺口，全部计算按列向量化完成。
+
+每段连续缺失的交易日生成一个抓取任务，只请求缺失的区间；间隔不超过
+merge_within 个交易日的缺口合并为一个任务，减少请求次数（重复抓取的少量
+已有行情按主键 upsert，不会重复写入）。
+
+只在交易日历的已知范围内比较：范围之外的交易日只能按工作日推断，节假日
+会被误判为缺口。需要检查最近的行情时，用 TRADE_CALENDAR_FILE 补全交易日历。
+
+停牌期间同样没有行情，也会被识别为缺口，修补时数据源返回空数据；修补
+适合按需执行，不放在每日增量同步中。
+"""
+
+import datetime
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.data.adjust import RAW_ADJUST, derive_adjust_enabled
+from core.data.calendar import TradingCalendar, get_trading_calendar
+from core.data.cube import OhlcvCube
+from core.data.cube import is_enabled as hist_cube_enabled
+from core.data.history import DateLike, _to_date, load_hist_panel
+from core.logger import log
+from .engine import FetchEngine, FetchJob
+from .runner import RunResult
+from .sync_hist import request_stock_zh_a_hist, write_stock_zh_a_hist
+
+# 默认合并间隔（交易日）
+MERGE_WITHIN = 5
+
+GAP_COLUMNS = ["symbol", "start_date", "end_date", "missing"]
+
+
+def find_gaps(
+    bars: pd.DataFrame,
+    calendar: TradingCalendar,
+    merge_within: int = MERGE_WITHIN,
+) -> pd.DataFrame:
+    """
+    找出每只股票在首尾日期之间缺失的交易日区间
+
+    只使用交易日历中的已知交易日，不在其中的日期（含已知范围之外的日期）
+    不参与比较。
+
+    Args:
+        bars: 已有行情，至少包含 [symbol, date]
+        calendar: 交易日历
+        merge_within: 间隔不超过该交易日数的缺口合并为一个区间
+
+    Returns:
+        pd.DataFrame: [symbol, start_date, end_date, missing]，
+        missing 为区间内实际缺失的交易日数
+    """
+    if bars.empty or not len(calendar):
+        return pd.DataFrame(columns=GAP_COLUMNS)
+
+    dates = pd.to_datetime(bars["date"]).to_numpy().astype("datetime64[D]")
+    beyond = int((dates > calendar.dates[-1]).sum())
+    if beyond:
+        log.warning(
+            f"{beyond} 条行情晚于交易日历的最后一天 {calendar.last}，不参与缺口检测，"
+            f"可通过 TRADE_CALENDAR_FILE 补全交易日历"
+        )
+    pos, known = calendar.positions(dates)
+    # 不在交易日历中的日期不参与比较
+    frame = pd.DataFrame({"symbol": bars["symbol"].to_numpy()[known], "pos": pos[known]})
+    frame = frame.drop_duplicates().sort_values(["symbol", "pos"], kind="mergesort")
+
+    next_pos = frame.groupby("symbol", sort=False)["pos"].shift(-1)
+    gap = (next_pos - frame["pos"]) > 1
+    gaps = pd.DataFrame(
+        {
+            "symbol": frame["symbol"][gap].to_numpy(),
+            "start": frame["pos"][gap].to_numpy() + 1,
+            "end": next_pos[gap].to_numpy().astype(np.int64) - 1,
+        }
+    )
+    if gaps.empty:
+        return pd.DataFrame(columns=GAP_COLUMNS)
+    gaps["missing"] = gaps["end"] - gaps["start"] + 1
+
+    # 同一股票相邻缺口之间的已有行情不超过 merge_within 个交易日时合并
+    previous_end = gaps.groupby("symbol", sort=False)["end"].shift(1)
+    new_range = previous_end.isna() | (gaps["start"] - previous_end - 1 > merge_within)
+    gaps["range"] = new_range.cumsum()
+    merged = gaps.groupby("range", sort=False).agg(
+        symbol=("symbol", "first"),
+        start=("start", "min"),
+        end=("end", "max"),
+        missing=("missing", "sum"),
+    )
+
+    dates = calendar.dates
+    return pd.DataFrame(
+        {
+            "symbol": merged["symbol"].to_numpy(),
+            "start_date": dates[merged["start"].to_numpy()].astype("datetime64[D]").astype(object),
+            "end_date": dates[merged["end"].to_numpy()].astype("datetime64[D]").astype(object),
+            "missing": merged["missing"].to_numpy(),
+        }
+    )
+
+
+def detect_history_gaps(
+    adjust: str = "hfq",
+    symbols: Optional[Iterable[str]] = None,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    merge_within: int = MERGE_WITHIN,
+    calendar: Optional[TradingCalendar] = None,
+) -> pd.DataFrame:
+    """
+    读取已有行情的日期并检测缺口
+
+    Args:
+        adjust: 复权类型，与 stock_history_data.adjust 一致
+        symbols: 股票代码，None 表示全市场
+        start_date / end_date: 只检查该区间内的行情，end_date 不晚于交易日历的最后一天
+        merge_within: 见 find_gaps
+        calendar: 交易日历，默认使用缓存的交易日历
+
+    Returns:
+        pd.DataFrame: [symbol, start_date, end_date, missing]
+    """
+    calendar = calendar or get_trading_calendar()
+    if not len(calendar):
+        log.warning("交易日历为空，跳过缺口检测")
+        return pd.DataFrame(columns=GAP_COLUMNS)
+    # 已知范围之后的行情无法判断是否缺失，不读取
+    end_date = min(_to_date(end_date) or calendar.last, calendar.last)
+    bars = load_hist_panel(
+        symbols,
+        start_date,
+        end_date,
+        adjust=adjust,
+        columns=(),
+        source="db",
+        derive_adjust=False,
+    )
+    gaps = find_gaps(bars, calendar, merge_within)
+    log.info(
+        f"行情缺口检测: {bars['symbol'].nunique() if not bars.empty else 0} 只股票，"
+        f"{gaps['symbol'].nunique() if not gaps.empty else 0} 只存在缺口，"
+        f"{len(gaps)} 个区间，缺失 {int(gaps['missing'].sum()) if not gaps.empty else 0} 个交易日"
+    )
+    return gaps
+
+
+def repair_history_gaps(
+    adjust: str = "hfq",
+    symbols: Optional[Iterable[str]] = None,
+    start_date: DateLike = None,
+    end_date: DateLike = None,
+    period: str = "daily",
+    max_workers: int = 5,
+    merge_within: int = MERGE_WITHIN,
+) -> RunResult:
+    """
+    检测缺口并只抓取缺失的区间
+
+    开启 HIST_CUBE_ENABLED 时，修补后从最早的缺口起重新写入内存映射立方体。
+
+    Returns:
+        RunResult: 以缺口区间为单位的成功 / 失败统计
+    """
+    gaps = detect_history_gaps(adjust, symbols, start_date, end_date, merge_within)
+    if gaps.empty:
+        log.info("没有需要修补的行情缺口")
+        return RunResult()
+
+    def fmt(day: datetime.date) -> str:
+        return day.strftime("%Y%m%d")
+
+    jobs = [
+        FetchJob(
+            key=f"{gap.symbol}:{fmt(gap.start_date)}-{fmt(gap.end_date)}",
+            provider="em",
+            func=request_stock_zh_a_hist,
+            kwargs=dict(
+                symbol=gap.symbol,
+                period=period,
+                start_date=fmt(gap.start_date),
+                end_date=fmt(gap.end_date),
+                adjust=adjust,
+            ),
+        )
+        for gap in gaps.itertuples(index=False)
+    ]
+
+    def write(job: FetchJob, stock_hist_df: pd.DataFrame) -> int:
+        return len(write_stock_zh_a_hist(stock_hist_df, job.kwargs["symbol"], adjust))
+
+    result = FetchEngine(max_workers=max_workers).run(jobs, write, label="行情缺口")
+
+    if hist_cube_enabled() and result.success:
+        # factor 模式下立方体物化由不复权行情推导的后复权价格
+        cube_adjust = "hfq" if adjust == RAW_ADJUST and derive_adjust_enabled() else adjust
+        OhlcvCube(cube_adjust).update(since=gaps["start_date"].min())
+    return result
@@ -0,0 +1,280 @@
+"""
+财务数据的披露期调度
+
+财务报表只在定期报告披露后才会变化，每晚逐只重新下载全市场的完整历史
+没有必要。这里按每只股票已存储的最新报告期推算下一个报告期，结合法定
+披露期限与东方财富的预约披露时间，只挑出需要重新抓取的股票：
+
+- new: 表中没有该股票的数据，且从未检查过
+- published: 下一个报告期已实际披露（或预约日期已到），披露后
+  PUBLISH_LAG_DAYS 天内每次都抓取，覆盖数据源的更新延迟
+- pending / overdue: 下一个报告期已结束但没有披露信息，或已超过披露期限
+  仍未取到（延期披露、数据源缺失等），每只股票每 RECHECK_DAYS 天检查一次，
+  按股票代码分散到不同的日期
+
+法定披露期限：一季报 4 月 30 日、半年报 8 月 31 日、三季报 10 月 31 日、
+年报次年 4 月 30 日。每只股票最近一次成功抓取的时间按数据集记录在
+stock_sync_state_data 中。
+"""
+
+import datetime
+import functools
+import os
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from core.models import StockSyncStateDB
+from core.database import get_db_session
+from core.logger import log
+from core.symbols import parse_symbol
+from .ak_client import ak
+from .writer import upsert_dataframe
+
+# 报告期季末月份 -> (相对年份, 披露截止月, 披露截止日)
+DISCLOSURE_DEADLINES = {
+    3: (0, 4, 30),
+    6: (0, 8, 31),
+    9: (0, 10, 31),
+    12: (1, 4, 30),
+}
+
+# 没有披露信息时，同一只股票两次检查的间隔天数
+RECHECK_DAYS = max(1, int(os.getenv("FINANCIAL_RECHECK_DAYS", 7)))
+
+# 实际披露后继续抓取的天数
+PUBLISH_LAG_DAYS = 3
+
+# 只为截止日期之后不超过该天数的报告期查询预约披露时间
+DISCLOSURE_LOOKUP_DAYS = 90
+
+# 预约披露时间各列，按优先级排列：已披露取实际日期，否则取最近一次变更
+DISCLOSURE_COLUMNS = (
+    "实际披露时间",
+    "三次变更日期",
+    "二次变更日期",
+    "一次变更日期",
+    "首次预约时间",
+)
+
+
+def to_period(value) -> Optional[datetime.date]:
+    """报告期（如 "2024-03-31"、"20240331"）转换为所在季度的季末日期，无法解析时返回 None"""
+    timestamp = pd.to_datetime(value, errors="coerce")
+    if pd.isna(timestamp):
+        return None
+    return (timestamp + pd.offsets.QuarterEnd(0)).date()
+
+
+def next_period(period: datetime.date) -> datetime.date:
+    """下一个报告期"""
+    return (pd.Timestamp(period) + pd.offsets.QuarterEnd(1)).date()
+
+
+def disclosure_deadline(period: datetime.date) -> datetime.date:
+    """报告期的法定披露截止日期"""
+    years, month, day = DISCLOSURE_DEADLINES[period.month]
+    return datetime.date(period.year + years, month, day)
+
+
+def latest_report_periods(model, column: str) -> Dict[str, datetime.date]:
+    """
+    每只股票已存储的最新报告期
+
+    一次 GROUP BY 查询；报告期以字符串存储，同一张表的格式一致，max 即最新。
+    """
+    date_column = getattr(model, column)
+    db = get_db_session()
+    try:
+        rows = db.execute(
+            select(model.symbol, func.max(date_column)).group_by(model.symbol)
+        ).all()
+    finally:
+        db.close()
+    periods = {}
+    for symbol, value in rows:
+        period = to_period(value)
+        if period is not None:
+            periods[symbol] = period
+    return periods
+
+
+def load_check_times(dataset: str) -> Dict[str, datetime.datetime]:
+    """每只股票最近一次成功抓取的时间"""
+    db = get_db_session()
+    try:
+        rows = db.execute(
+            select(StockSyncStateDB.symbol, StockSyncStateDB.checked_at).where(
+                StockSyncStateDB.dataset == dataset
+            )
+        ).all()
+    finally:
+        db.close()
+    return {symbol: checked_at for symbol, checked_at in rows if checked_at}
+
+
+@functools.lru_cache(maxsize=16)
+def load_disclosure_dates(period: datetime.date, today: datetime.date) -> Dict[str, datetime.date]:
+    """
+    东方财富预约披露时间：6 位代码 -> 披露日期
+
+    已披露的取实际披露时间，否则取最近一次变更后的预约日期。接口不可用时
+    返回空字典，调度退回按 RECHECK_DAYS 轮询。结果按 (报告期, 当天) 缓存，
+    同一进程中多个财务数据集共用。
+    """
+    try:
+        df = ak.stock_yysj_em(symbol="沪深A股", date=period.strftime("%Y%m%d"))
+    except Exception as e:
+        log.warning(f"获取 {period} 预约披露时间失败，按固定间隔检查: {e}")
+        return {}
+    columns = [c for c in DISCLOSURE_COLUMNS if c in df.columns]
+    if df.empty or "股票代码" not in df.columns or not columns:
+        return {}
+
+    dates = pd.to_datetime(df[columns[0]], errors="coerce")
+    for column in columns[1:]:
+        dates = dates.fillna(pd.to_datetime(df[column], errors="coerce"))
+    codes = df["股票代码"].astype(str).str.zfill(6)
+    known = dates.notna()
+    log.info(f"{period} 预约披露时间: {int(known.sum())} 只股票")
+    return dict(zip(codes[known], dates[known].dt.date))
+
+
+def _recheck_slot(symbol: str, today: datetime.date) -> bool:
+    """按股票代码把轮询分散到每 RECHECK_DAYS 天中固定的一天"""
+    return (today.toordinal() + zlib.crc32(symbol.encode("utf-8"))) % RECHECK_DAYS == 0
+
+
+def due_reason(
+    symbol: str,
+    period: Optional[datetime.date],
+    checked_at: Optional[datetime.datetime],
+    disclosed: Optional[datetime.date],
+    today: datetime.date,
+) -> Optional[str]:
+    """
+    判断一只股票是否需要重新抓取
+
+    Args:
+        symbol: 股票代码
+        period: 已存储的最新报告期，None 表示没有数据
+        checked_at: 最近一次成功抓取的时间，None 表示从未记录
+        disclosed: 下一个报告期的实际 / 预约披露日期，None 表示未知
+        today: 当天日期
+
+    Returns:
+        需要抓取的原因（new / published / pending / overdue / stale），不需要时返回 None
+    """
+    last_check = checked_at.date() if checked_at else None
+    if last_check is not None and last_check >= today:
+        return None
+    # 连续多个周期没有轮到（如不是每天运行）时直接检查
+    stale = last_check is not None and (today - last_check).days >= 2 * RECHECK_DAYS
+
+    if period is None:
+        if last_check is None:
+            return "new"
+        return "stale" if stale or _recheck_slot(symbol, today) else None
+
+    pending = next_period(period)
+    if pending >= today:
+        # 下一个报告期尚未结束
+        return None
+    if disclosed is not None:
+        if disclosed > today:
+            return None
+        if last_check is None or last_check < disclosed + datetime.timedelta(days=PUBLISH_LAG_DAYS):
+            return "published"
+    if stale:
+        return "stale"
+    if not _recheck_slot(symbol, today):
+        return None
+    return "overdue" if today > disclosure_deadline(pending) else "pending"
+
+
+def select_due_symbols(
+    dataset: str,
+    model,
+    column: str,
+    symbols: Iterable[str],
+    today: Optional[datetime.date] = None,
+) -> List[str]:
+    """
+    从全市场股票中挑出需要重新抓取财务数据的股票
+
+    Args:
+        dataset: 数据集名称，对应 stock_sync_state_data.dataset
+        model: 财务数据表模型
+        column: 报告期字段名
+        symbols: 候选股票代码（纯数字或带前缀）
+        today: 当天日期，默认今天
+
+    Returns:
+        List[str]: 需要抓取的股票代码，保持输入顺序
+    """
+    today = today or datetime.date.today()
+    periods = latest_report_periods(model, column)
+    check_times = load_check_times(dataset)
+
+    def disclosed(code: str, period: Optional[datetime.date]) -> Optional[datetime.date]:
+        if period is None:
+            return None
+        pending = next_period(period)
+        if pending >= today:
+            return None
+        if (today - disclosure_deadline(pending)).days > DISCLOSURE_LOOKUP_DAYS:
+            return None
+        return load_disclosure_dates(pending, today).get(code)
+
+    due, reasons = [], Counter()
+    symbols = list(symbols)
+    for symbol in symbols:
+        parsed = parse_symbol(symbol)
+        period = periods.get(parsed.prefixed)
+        reason = due_reason(
+            parsed.prefixed,
+            period,
+            check_times.get(parsed.prefixed),
+            disclosed(parsed.code, period),
+            today,
+        )
+        if reason:
+            due.append(symbol)
+            reasons[reason] += 1
+
+    log.info(
+        f"{dataset} 披露期调度: {len(symbols)} 只股票中 {len(due)} 只需要抓取 "
+        f"{dict(reasons)}"
+    )
+    return due
+
+
+def record_check(dataset: str, symbol: str, records: List[Dict], column: str):
+    """记录一只股票成功抓取的时间与抓取到的最新报告期"""
+    periods = [to_period(record.get(column)) for record in records or []]
+    periods = [period for period in periods if period is not None]
+    state = pd.DataFrame(
+        [
+            {
+                "dataset": dataset,
+                "symbol": symbol,
+                "checked_at": datetime.datetime.now(),
+                "latest_period": max(periods).isoformat() if periods else None,
+            }
+        ]
+    )
+    upsert_dataframe(state, StockSyncStateDB, label=symbol)
+
+
+def track_checks(dataset: str, column: str, sync_func: Callable[[str], List[Dict]]):
+    """包装单只股票的同步函数，成功后记录检查时间，供 select_due_symbols 使用"""
+
+    def run(symbol: str) -> List[Dict]:
+        records = sync_func(symbol)
+        record_check(dataset, parse_symbol(symbol).prefixed, records, column)
+        return records
+
+    return run
@@ -0,0 +1,110 @@
+"""
+全市场同步的并发执行
+
+sync_all_* 共用：按 max_workers 并发执行单只股票的同步函数，汇总成功 /
+失败数并定期输出进度。写库经 core.database.session_scope 限制在途会话数。
+以分片 worker 运行时（见 shard）只处理本分片的股票，并向协调进程上报进度。
+"""
+
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from core.models import StockSpotDB
+from core.database import get_db_session
+from core.logger import log
+from .shard import current_shard, report_progress, shard_symbols
+
+
+@dataclass
+class RunResult:
+    """一次全市场同步的汇总结果"""
+
+    total: int = 0
+    success: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    failures: Dict[str, str] = field(default_factory=dict)
+
+
+def load_spot_symbols(sharded: bool = True) -> List[str]:
+    """
+    从实时行情表获取全市场股票代码
+
+    Args:
+        sharded: 以分片 worker 运行时只返回本分片的股票
+    """
+    db = get_db_session()
+    try:
+        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
+        log.info(f"获取到 {len(symbols)} 个股票代码")
+        shard = current_shard() if sharded else None
+        if shard is not None:
+            symbols = shard_symbols(symbols, shard)
+            log.info(f"分片 {shard[0]}/{shard[1]}: {len(symbols)} 个股票代码")
+        return symbols
+    except Exception as e:
+        log.error(f"获取股票代码失败: {e}")
+        log.error(f"详细错误信息:\n{traceback.format_exc()}")
+        raise
+    finally:
+        db.close()
+
+
+def run_symbols(
+    func: Callable[[str], object],
+    symbols: List[str],
+    max_workers: int = 5,
+    label: str = "数据",
+    progress_every: int = 100,
+) -> RunResult:
+    """
+    并发执行单只股票的同步函数
+
+    Args:
+        func: 单只股票的同步函数，抛出异常视为失败
+        symbols: 股票代码列表
+        max_workers: 最大并发数
+        label: 日志中的数据名称，如 "股东户数详情数据"
+        progress_every: 每完成多少只股票输出一次汇总进度
+
+    Returns:
+        RunResult: 成功 / 失败统计与失败原因
+    """
+    result = RunResult(total=len(symbols))
+    started = time.time()
+    if not symbols:
+        log.info(f"{label}同步完成，无待同步股票")
+        report_progress(0, 0, 0, 0, force=True)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(func, symbol): symbol for symbol in symbols}
+
+        for i, future in enumerate(as_completed(futures), 1):
+            symbol = futures[future]
+            try:
+                future.result()
+                result.success += 1
+                log.info(f"进度: {i}/{len(symbols)} - [{symbol}] 同步成功")
+            except Exception as e:
+                result.failed += 1
+                result.failures[symbol] = str(e)
+                log.error(f"进度: {i}/{len(symbols)} - [{symbol}] 同步失败: {e}")
+                log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
+
+            report_progress(i, len(symbols), result.success, result.failed)
+            if i % progress_every == 0 or i == len(symbols):
+                log.info(
+                    f"{label}同步进度: {i}/{len(symbols)}, "
+                    f"成功: {result.success}, 失败: {result.failed}"
+                )
+
+    result.elapsed = time.time() - started
+    log.info(
+        f"{label}同步完成，总计: {result.total}, 成功: {result.success}, "
+        f"失败: {result.failed}, 耗时: {result.elapsed:.2f}s"
+    )
+    return result
@@ -0,0 +1,257 @@
+"""
+多节点分片同步
+
+单个出口 IP 的请求速率有上限，分片后每个 worker（不同机器或不同代理）
+只处理一部分股票，总吞吐随节点数增长：
+
+- 基本面等 sync_all_* 按一致性哈希把股票分给各分片，worker 通过环境变量
+  SYNC_SHARD_INDEX / SYNC_SHARD_COUNT 得知自己的分片，load_spot_symbols
+  只返回本分片的股票。分片数变化时只有少量股票换分片。
+- 历史行情使用任务表的租约队列（见 task_queue），各 worker 从同一队列
+  领取任务，天然按处理速度分担（work stealing），不需要哈希分片。
+
+run_shards 在本机启动 N 个 worker 子进程（可为每个分片指定代理），汇总
+各分片进度并合并结果。多台机器部署时，在每台机器上设置好上述两个环境
+变量后执行同一条同步命令即可。全量刷新的 --swap 不能与分片同时使用。
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.logger import log
+from core.symbols import parse_symbol
+
+# 每个分片在哈希环上的虚拟节点数
+VIRTUAL_NODES = 64
+# 进度文件的最短写入间隔（秒）
+PROGRESS_INTERVAL = 2.0
+
+
+class HashRing:
+    """股票代码到分片的一致性哈希环"""
+
+    def __init__(self, shards: int, vnodes: int = VIRTUAL_NODES):
+        if shards < 1:
+            raise ValueError("分片数必须大于 0")
+        self.shards = shards
+        points = sorted(
+            (self._hash(f"shard-{shard}#{i}"), shard)
+            for shard in range(shards)
+            for i in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+    def shard_of(self, symbol: str) -> int:
+        # 按纯数字代码哈希，SH600000 与 600000 落在同一分片
+        point = self._hash(parse_symbol(symbol).code)
+        index = bisect.bisect(self._keys, point) % len(self._keys)
+        return self._shards[index]
+
+
+def current_shard() -> Optional[Tuple[int, int]]:
+    """从环境变量读取当前 worker 的 (分片序号, 分片数)，未分片时返回 None"""
+    count = int(os.getenv("SYNC_SHARD_COUNT", "0") or 0)
+    if count <= 1:
+        return None
+    index = int(os.getenv("SYNC_SHARD_INDEX", "0") or 0)
+    if not 0 <= index < count:
+        raise ValueError(f"SYNC_SHARD_INDEX={index} 超出分片数 {count}")
+    return index, count
+
+
+def shard_symbols(
+    symbols: Iterable[str], shard: Optional[Tuple[int, int]] = None
+) -> List[str]:
+    """只保留属于 shard 的股票，shard 默认取当前 worker 的分片"""
+    symbols = list(symbols)
+    shard = shard or current_shard()
+    if shard is None:
+        return symbols
+    index, count = shard
+    ring = HashRing(count)
+    return [symbol for symbol in symbols if ring.shard_of(symbol) == index]
+
+
+# ----------------------------- 进度上报 -----------------------------
+
+_last_report = 0.0
+
+
+def report_progress(
+    done: int, total: int, success: int, failed: int, force: bool = False
+):
+    """
+    worker 把当前进度写入 SYNC_SHARD_PROGRESS 指定的文件，供协调进程汇总
+
+    未由协调进程启动（没有设置该环境变量）时不做任何事。
+    """
+    global _last_report
+    path = os.getenv("SYNC_SHARD_PROGRESS")
+    if not path:
+        return
+    now = time.time()
+    if not force and done < total and now - _last_report < PROGRESS_INTERVAL:
+        return
+    _last_report = now
+    progress = {
+        "done": done,
+        "total": total,
+        "success": success,
+        "failed": failed,
+        "updated": now,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(tmp, path)
+
+
+def _read_progress(path: str) -> Dict[str, float]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ----------------------------- 协调进程 -----------------------------
+
+
+@dataclass
+class ShardResult:
+    """单个分片 worker 的结果"""
+
+    shard: int
+    returncode: Optional[int] = None
+    proxy: Optional[str] = None
+    progress: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ShardSummary:
+    """所有分片合并后的结果"""
+
+    shards: List[ShardResult]
+    total: int = 0
+    success: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(shard.returncode == 0 for shard in self.shards)
+
+
+def load_proxies(path: Optional[str]) -> List[str]:
+    """读取代理列表（JSON 数组），分片 i 使用第 i % len 个代理"""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        proxies = json.load(f)
+    if not isinstance(proxies, list):
+        raise ValueError(f"{path} 应为代理地址的 JSON 数组")
+    return [str(proxy) for proxy in proxies]
+
+
+def _log_progress(results: List[ShardResult], started: float):
+    parts = []
+    for result in results:
+        progress = result.progress
+        state = "运行中" if result.returncode is None else f"退出({result.returncode})"
+        parts.append(
+            f"分片{result.shard}: {progress.get('done', 0)}/{progress.get('total', '?')} "
+            f"失败 {progress.get('failed', 0)} {state}"
+        )
+    log.info(f"分片进度 [{time.time() - started:.0f}s] " + " | ".join(parts))
+
+
+def run_shards(
+    command: Sequence[str],
+    shards: int,
+    proxies: Sequence[str] = (),
+    poll_interval: float = 10.0,
+) -> ShardSummary:
+    """
+    在本机启动 shards 个 worker 执行同一条 CLI 命令，等待全部结束并合并结果
+
+    Args:
+        command: core.cli 的命令及参数，如 ["sync-all-gdhs", "-w", "5"]
+        shards: 分片数
+        proxies: 代理地址，分片 i 通过 HTTP(S)_PROXY 使用第 i % len 个
+        poll_interval: 汇总进度的间隔（秒）
+
+    Returns:
+        ShardSummary: 各分片与合并后的结果
+
+    Raises:
+        ValueError: 命令带有 --swap（各分片共用同一张暂存表）
+    """
+    if "--swap" in command:
+        raise ValueError("分片同步不支持 --swap：各分片共用同一张暂存表，会互相覆盖")
+    started = time.time()
+    progress_dir = tempfile.mkdtemp(prefix="sync-shards-")
+    results: List[ShardResult] = []
+    processes = []
+    for shard in range(shards):
+        env = dict(os.environ)
+        env["SYNC_SHARD_INDEX"] = str(shard)
+        env["SYNC_SHARD_COUNT"] = str(shards)
+        env["SYNC_SHARD_PROGRESS"] = os.path.join(progress_dir, f"shard-{shard}.json")
+        proxy = proxies[shard % len(proxies)] if proxies else None
+        if proxy:
+            env["HTTP_PROXY"] = env["HTTPS_PROXY"] = proxy
+            env["http_proxy"] = env["https_proxy"] = proxy
+        process = subprocess.Popen(
+            [sys.executable, "-m", "core.cli", *command], env=env
+        )
+        processes.append(process)
+        results.append(ShardResult(shard=shard, proxy=proxy))
+        log.info(
+            f"启动分片 {shard}/{shards}，pid {process.pid}"
+            + (f"，代理 {proxy}" if proxy else "")
+        )
+
+    try:
+        while any(result.returncode is None for result in results):
+            time.sleep(poll_interval)
+            for process, result in zip(processes, results):
+                if result.returncode is None:
+                    result.returncode = process.poll()
+                result.progress = _read_progress(
+                    os.path.join(progress_dir, f"shard-{result.shard}.json")
+                )
+            _log_progress(results, started)
+    except KeyboardInterrupt:
+        log.warning("收到中断，停止所有分片")
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        shutil.rmtree(progress_dir, ignore_errors=True)
+
+    summary = ShardSummary(shards=results, elapsed=time.time() - started)
+    for result in results:
+        summary.total += int(result.progress.get("total", 0))
+        summary.success += int(result.progress.get("success", 0))
+        summary.failed += int(result.progress.get("failed", 0))
+        if result.returncode != 0:
+            log.error(f"分片 {result.shard} 异常退出，返回码 {result.returncode}")
+    log.info(
+        f"分片同步完成，分片: {shards}, 总计: {summary.total}, 成功: {summary.success}, "
+        f"失败: {summary.failed}, 耗时: {summary.elapsed:.2f}s"
+    )
+    return summary
@@ -0,0 +1,177 @@
+"""
+全量刷新的暂存表切换
+
+全量刷新先写入与线上表结构相同的暂存表（CREATE TABLE ... LIKE），
+完成后通过一条 RENAME TABLE 原子地与线上表互换，读取方不会看到清空中或
+写了一半的表，写入也不需要在大表上逐行删除。
+
+RENAME TABLE 的多表原子互换只有 MySQL 支持；SQLite（WAL）与 DuckDB 下
+单个事务内的删除 + 插入对读取方同样不可见中间状态，直接退化为事务内替换。
+
+暂存表按表名共用，多个分片 worker 各自创建、切换会互相覆盖，分片同步时
+不支持暂存表切换（见 shard）。
+"""
+
+from contextlib import contextmanager
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import Column, MetaData, Table
+
+from core.database import get_backend, get_engine
+from core.logger import log
+from .shard import current_shard
+from .writer import register_staging, replace_dataframe, unregister_staging
+
+STAGING_SUFFIX = "__staging"
+RETIRED_SUFFIX = "__retired"
+
+
+def swap_supported() -> bool:
+    """当前后端是否支持暂存表原子切换"""
+    return get_backend() == "mysql"
+
+
+def _staging_table(table: Table) -> Table:
+    """与线上表同列、同主键的暂存表对象，用于生成写入语句（表本身由 CREATE TABLE ... LIKE 创建）"""
+    return Table(
+        f"{table.name}{STAGING_SUFFIX}",
+        MetaData(),
+        *[
+            Column(
+                column.name,
+                column.type,
+                primary_key=column.primary_key,
+                autoincrement=column.autoincrement,
+            )
+            for column in table.columns
+        ],
+    )
+
+
+class StagingSwap:
+    """
+    一次暂存表切换：create → 写入暂存表 → carry_over → swap
+
+    未在暂存表中出现的 key（同步失败或接口无数据的股票）会在切换前从线上表
+    复制过来，避免一次失败导致该股票数据丢失。
+    """
+
+    def __init__(self, model, key: Optional[str] = None):
+        self.table = model.__table__ if hasattr(model, "__table__") else model
+        self.staging = _staging_table(self.table)
+        self.key = key
+        self.engine = get_engine()
+        self.quote = self.engine.dialect.identifier_preparer.quote
+
+    def _execute(self, *statements: str):
+        with self.engine.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+
+    def create(self):
+        live = self.quote(self.table.name)
+        staging = self.quote(self.staging.name)
+        self._execute(
+            f"DROP TABLE IF EXISTS {staging}",
+            f"CREATE TABLE {staging} LIKE {live}",
+        )
+        log.info(f"创建暂存表 {self.staging.name}")
+
+    def carry_over(self) -> int:
+        """把暂存表中缺失 key 的线上数据复制到暂存表"""
+        if self.key is None:
+            return 0
+        live = self.quote(self.table.name)
+        staging = self.quote(self.staging.name)
+        key = self.quote(self.key)
+        # 自增ID不复制，由暂存表重新分配，避免与已写入的新数据冲突
+        autoincrement = self.table.autoincrement_column
+        columns = ", ".join(
+            self.quote(column.name)
+            for column in self.table.columns
+            if column is not autoincrement
+        )
+        with self.engine.begin() as conn:
+            result = conn.exec_driver_sql(
+                f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {live} "
+                f"WHERE {key} NOT IN (SELECT DISTINCT {key} FROM {staging})"
+            )
+            rows = result.rowcount
+        if rows:
+            log.info(f"从 {self.table.name} 保留 {rows} 条未刷新的数据")
+        return rows
+
+    def swap(self):
+        live = self.quote(self.table.name)
+        staging = self.quote(self.staging.name)
+        retired = self.quote(f"{self.table.name}{RETIRED_SUFFIX}")
+        # 多表 RENAME TABLE 是原子操作，读取方要么看到旧表，要么看到新表
+        self._execute(
+            f"DROP TABLE IF EXISTS {retired}",
+            f"RENAME TABLE {live} TO {retired}, {staging} TO {live}",
+            f"DROP TABLE {retired}",
+        )
+        log.info(f"暂存表已切换为 {self.table.name}")
+
+    def abort(self):
+        self._execute(f"DROP TABLE IF EXISTS {self.quote(self.staging.name)}")
+        log.warning(f"放弃暂存表 {self.staging.name}")
+
+
+@contextmanager
+def staging_swap(model, key: Optional[str] = "symbol", enabled: bool = True):
+    """
+    在 with 块内把对 model 的写入重定向到暂存表，正常退出时切换为线上表
+
+    Args:
+        model: 全量刷新的目标 ORM 模型
+        key: 按该列保留暂存表中缺失的线上数据，None 表示不保留
+        enabled: False 或后端不支持时直接写线上表
+
+    Raises:
+        ValueError: 分片 worker 中启用暂存表切换
+    """
+    if enabled and current_shard() is not None:
+        raise ValueError("分片同步不支持 --swap：各分片共用同一张暂存表，会互相覆盖")
+    if not enabled or not swap_supported():
+        if enabled:
+            log.info(f"{get_backend()} 不支持暂存表切换，按股票在事务内替换")
+        yield None
+        return
+
+    swap = StagingSwap(model, key)
+    swap.create()
+    register_staging(swap.table.name, swap.staging)
+    try:
+        yield swap
+    except BaseException:
+        unregister_staging(swap.table.name)
+        swap.abort()
+        raise
+    unregister_staging(swap.table.name)
+    swap.carry_over()
+    swap.swap()
+
+
+def swap_dataframe(df: pd.DataFrame, model, label: str = "writer") -> int:
+    """
+    用 df 全量替换 model 对应的表：写入暂存表后原子切换
+
+    Args:
+        df: 完整的新数据
+        model: 目标 ORM 模型
+        label: 日志前缀
+
+    Returns:
+        int: 写入行数，df 为空时不切换并返回 0
+    """
+    if df.empty:
+        log.warning(f"[{label}] 新数据为空，保留 {model.__tablename__} 现有数据")
+        return 0
+    if not swap_supported():
+        return replace_dataframe(df, model, label=label)
+
+    # 暂存期间对 model 的写入会被重定向到暂存表
+    with staging_swap(model, key=None):
+        return replace_dataframe(df, model, label=label)
@@ -0,0 +1,172 @@
+import traceback
+from typing import Dict, Iterable, List, Optional
+
+from .ak_client import ak
+import pandas as pd
+
+from core.models import StockAdjustFactorDB, StockHistoryDB
+from core.database import get_db_session
+from core.data.adjust import RAW_ADJUST
+from core.logger import log
+from core.symbols import parse_symbol, symbol_registry
+from .writer import replace_dataframe
+
+# sync_stock_zh_a_hist_all 的 adjust 取值：同步不复权行情 + 复权因子
+FACTOR_ADJUST = "factor"
+
+# 判断除权除息的相对误差阈值：交易所昨收（close - change_amount）与实际昨收的偏差
+EX_RIGHTS_TOLERANCE = 0.005
+
+
+def sync_stock_adjust_factor(symbol: str) -> List[Dict]:
+    """
+    同步单个股票的复权因子序列（新浪），整体替换该股票已有的因子
+
+    因子序列只在除权除息日变化，数据量远小于复权后的完整行情。
+
+    Args:
+        symbol: 股票代码，如 "SH600519" 或 "600519"
+
+    Returns:
+        List of adjust factor records
+    """
+    info = parse_symbol(symbol)
+    sina_symbol = info.prefixed.lower()
+
+    try:
+        hfq_df = ak.stock_zh_a_daily(symbol=sina_symbol, adjust="hfq-factor")
+        qfq_df = ak.stock_zh_a_daily(symbol=sina_symbol, adjust="qfq-factor")
+    except Exception as e:
+        log.error(f"[{info.code}] 获取复权因子失败: {e}")
+        log.error(f"[{info.code}] 详细错误信息:\n{traceback.format_exc()}")
+        raise
+
+    if hfq_df.empty and qfq_df.empty:
+        log.info(f"[{info.code}] 未获取到复权因子")
+        return []
+
+    # 两个因子序列的变动日期不一定相同，合并后各自向前填充
+    factors = pd.merge(
+        _normalize_factor(hfq_df, "hfq_factor"),
+        _normalize_factor(qfq_df, "qfq_factor"),
+        on="date",
+        how="outer",
+    ).sort_values("date")
+    factors[["hfq_factor", "qfq_factor"]] = (
+        factors[["hfq_factor", "qfq_factor"]].ffill().bfill().fillna(1.0)
+    )
+    factors["symbol"] = info.code
+    factors["symbol_id"] = symbol_id = symbol_registry.id_of(info.code)
+
+    try:
+        replace_dataframe(
+            factors, StockAdjustFactorDB, {"symbol_id": symbol_id}, label=info.code
+        )
+        log.info(f"[{info.code}] 成功同步 {len(factors)} 条复权因子")
+    except Exception as e:
+        log.error(f"[{info.code}] 数据库操作失败: {e}")
+        raise
+
+    return factors.to_dict("records")
+
+
+def _normalize_factor(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=["date", column])
+    result = df[["date", column]].copy()
+    result["date"] = pd.to_datetime(result["date"]).dt.date
+    result[column] = pd.to_numeric(result[column], errors="coerce")
+    return result
+
+
+def has_ex_rights(bars: pd.DataFrame, prev_close: Optional[float] = None) -> bool:
+    """
+    根据不复权行情判断区间内是否发生除权除息（向量化）
+
+    除权除息日交易所公布的昨收价（close - change_amount）会低于实际前一日收盘价，
+    区间内任意一天偏差超过阈值即认为复权因子需要刷新。
+
+    Args:
+        bars: 按日期排序的不复权行情，需包含 close, change_amount
+        prev_close: 区间首日之前一个交易日的收盘价，未知时为 None
+
+    Returns:
+        bool: 是否发生除权除息
+    """
+    if bars.empty:
+        return False
+    close = bars["close"].astype("float64")
+    reference = close - bars["change_amount"].astype("float64")
+    actual = close.shift(1)
+    actual.iloc[0] = prev_close if prev_close is not None else float("nan")
+    deviation = (reference - actual).abs() / actual
+    return bool((deviation > EX_RIGHTS_TOLERANCE).any())
+
+
+def symbols_without_factor(symbols: Iterable[str]) -> List[str]:
+    """尚无复权因子的股票，一次 DISTINCT 查询"""
+    db = get_db_session()
+    try:
+        stored = {
+            row[0] for row in db.query(StockAdjustFactorDB.symbol_id).distinct().all()
+        }
+    finally:
+        db.close()
+    symbols = list(symbols)
+    ids = symbol_registry.lookup(symbols)
+    return [
+        symbol for symbol in symbols if ids.get(parse_symbol(symbol).code) not in stored
+    ]
+
+
+def refresh_adjust_factor_if_needed(
+    symbol: str, bars: pd.DataFrame, force: bool = False
+) -> bool:
+    """
+    增量同步不复权行情后按需刷新复权因子
+
+    仅在该股票尚无因子、或新增行情中出现除权除息时重新下载因子序列，
+    无需因为一次分红重新下载整段前复权行情。
+
+    Args:
+        symbol: 股票代码
+        bars: 本次新增的不复权行情 [date, close, change_amount]
+        force: 是否强制刷新
+
+    Returns:
+        bool: 是否刷新了复权因子
+    """
+    code = parse_symbol(symbol).code
+    symbol_id = symbol_registry.id_of(code)
+    bars = bars.sort_values("date") if not bars.empty else bars
+
+    db = get_db_session()
+    try:
+        has_factor = (
+            db.query(StockAdjustFactorDB.date)
+            .filter(StockAdjustFactorDB.symbol_id == symbol_id)
+            .first()
+            is not None
+        )
+        prev_close = None
+        if not bars.empty:
+            first_date = pd.to_datetime(bars["date"].iloc[0]).date()
+            prev = (
+                db.query(StockHistoryDB.close)
+                .filter(
+                    StockHistoryDB.symbol_id == symbol_id,
+                    StockHistoryDB.adjust == RAW_ADJUST,
+                    StockHistoryDB.date < first_date,
+                )
+                .order_by(StockHistoryDB.date.desc())
+                .first()
+            )
+            prev_close = prev[0] if prev else None
+    finally:
+        db.close()
+
+    if force or not has_factor or has_ex_rights(bars, prev_close):
+        log.info(f"[{code}] 复权因子需要刷新")
+        sync_stock_adjust_factor(code)
+        return True
+    return False
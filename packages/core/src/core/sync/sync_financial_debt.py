@@ -1,12 +1,20 @@
-import akshare as ak
-import pandas as pd
-import numpy as np
+from .ak_client import ak
 import traceback
 from typing import List, Dict
-from core.models import StockFinancialDebtDB, StockSpotDB
-from core.database import get_db_session
+from core.models import StockFinancialDebtDB
 from core.logger import log
+from core.symbols import parse_symbol
 from .sync_business_composition import format_a_stock_symbol
+from .fundamentals import write_symbol_frame
+from .runner import load_spot_symbols, run_symbols
+from .staging import staging_swap
+from .report_schedule import select_due_symbols, track_checks
+
+# 披露期调度与变更记录中的数据集名称
+DATASET = "financial_debt"
+
+# 与已有数据比较时的自然键（同一股票内唯一）
+KEY_COLUMNS = ["report_date", "indicator_name"]
 
 
 def sync_stock_financial_debt(symbol: str) -> List[Dict]:
@@ -27,7 +35,7 @@ def sync_stock_financial_debt(symbol: str) -> List[Dict]:
     try:
         # 获取同花顺资产负债表数据 - 按报告期
         financial_debt_df = ak.stock_financial_debt_ths(
-            symbol=formatted_symbol.split("SH")[-1].split("SZ")[-1].split("BJ")[-1],
+            symbol=parse_symbol(formatted_symbol).code,
             indicator="按报告期",
         )
         log.info(
@@ -38,46 +46,36 @@ def sync_stock_financial_debt(symbol: str) -> List[Dict]:
             log.info(f"[{formatted_symbol}] 未获取到资产负债表数据")
             return []
 
-        # 添加股票代码列
-        financial_debt_df["symbol"] = formatted_symbol
-
-        # 转换为长格式数据
-        financial_debt_records = []
-        for _, row in financial_debt_df.iterrows():
-            report_date = row["报告期"]
-            for column in financial_debt_df.columns:
-                if column not in ["报告期", "报表核心指标", "报表全部指标", "symbol"]:
-                    financial_debt_records.append(
-                        {
-                            "symbol": formatted_symbol,
-                            "report_date": report_date,
-                            "indicator_name": column,
-                            "indicator_value": row[column],
-                        }
-                    )
-
-        # 保存到数据库
-        db = get_db_session()
+        # 宽表转换为长格式：每个报告期的每个指标一行
+        value_columns = [
+            column
+            for column in financial_debt_df.columns
+            if column not in ["报告期", "报表核心指标", "报表全部指标"]
+        ]
+        long_df = financial_debt_df.melt(
+            id_vars=["报告期"],
+            value_vars=value_columns,
+            var_name="indicator_name",
+            value_name="indicator_value",
+        ).rename(columns={"报告期": "report_date"})
+        long_df["symbol"] = formatted_symbol
+        financial_debt_records = long_df.to_dict("records")
+
+        # 按自然键与已有数据比较，只写入变化的行
         try:
-            # 删除该股票已有的资产负债表数据
-            db.query(StockFinancialDebtDB).filter(
-                StockFinancialDebtDB.symbol == formatted_symbol
-            ).delete()
-
-            # 批量插入新数据
-            if financial_debt_records:
-                db.bulk_insert_mappings(StockFinancialDebtDB, financial_debt_records)
-                db.commit()
-                log.info(
-                    f"[{formatted_symbol}] 成功同步 {len(financial_debt_records)} 条资产负债表数据"
-                )
-
+            write_symbol_frame(
+                long_df,
+                StockFinancialDebtDB,
+                formatted_symbol,
+                KEY_COLUMNS,
+                DATASET,
+            )
+            log.info(
+                f"[{formatted_symbol}] 成功同步 {len(financial_debt_records)} 条资产负债表数据"
+            )
         except Exception as e:
-            db.rollback()
             log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
             raise
-        finally:
-            db.close()
 
         return financial_debt_records
 
@@ -87,47 +85,25 @@ def sync_stock_financial_debt(symbol: str) -> List[Dict]:
         raise
 
 
-def sync_all_stock_financial_debts(max_workers: int = 5):
+def sync_all_stock_financial_debts(
+    max_workers: int = 5,
+    swap: bool = False,
+    scheduled: bool = True,
+):
     """
     同步所有股票的资产负债表数据
 
     Args:
         max_workers: 最大并发数
+        swap: 写入暂存表，全部完成后原子切换为线上表（总是全量同步）
+        scheduled: 只同步披露期调度选出的股票（见 report_schedule），False 时全量同步
     """
     log.info("开始同步所有股票的资产负债表数据")
 
-    # 获取所有股票代码
-    db = get_db_session()
-    try:
-        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
-        log.info(f"获取到 {len(symbols)} 个股票代码")
-    except Exception as e:
-        log.error(f"获取股票代码失败: {e}")
-        log.error(f"详细错误信息:\n{traceback.format_exc()}")
-        raise
-    finally:
-        db.close()
-
-    # 逐个同步资产负债表数据
-    success_count = 0
-    fail_count = 0
-
-    for i, symbol in enumerate(symbols, 1):
-        try:
-            sync_stock_financial_debt(symbol)
-            success_count += 1
-            log.info(f"进度: {i}/{len(symbols)} - [{symbol}] 同步成功")
-        except Exception as e:
-            fail_count += 1
-            log.error(f"进度: {i}/{len(symbols)} - [{symbol}] 同步失败: {e}")
-            log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-
-        # 显示进度
-        if i % 100 == 0 or i == len(symbols):
-            log.info(
-                f"资产负债表数据同步进度: {i}/{len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-            )
+    symbols = load_spot_symbols()
+    if scheduled and not swap:
+        symbols = select_due_symbols(DATASET, StockFinancialDebtDB, "report_date", symbols)
 
-    log.info(
-        f"资产负债表数据同步完成，总计: {len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-    )
+    sync_one = track_checks(DATASET, "report_date", sync_stock_financial_debt)
+    with staging_swap(StockFinancialDebtDB, enabled=swap):
+        return run_symbols(sync_one, symbols, max_workers, "资产负债表数据")
@@ -1,12 +1,66 @@
-import akshare as ak
+from .ak_client import ak
 import pandas as pd
-import numpy as np
 import traceback
-from typing import List, Dict
-from core.models import StockGdhsDB, StockSpotDB
-from core.database import get_db_session
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import func, select
+from core.models import StockGdhsDB
+from core.database import session_scope
 from core.logger import log
+from core.symbols import parse_symbol
 from .sync_business_composition import format_a_stock_symbol
+from .convert import prepare_frame
+from .writer import DiffResult, diff_dataframe, replace_dataframe
+from .fundamentals import record_changes, write_mode, write_symbol_frame
+from .runner import load_spot_symbols, run_symbols
+from .staging import staging_swap
+
+
+# 变更记录中的数据集名称
+DATASET = "gdhs"
+
+# 与已有数据比较时的自然键（同一股票内唯一）
+KEY_COLUMNS = ["end_date"]
+
+# 全市场接口一次写入多只股票，变更行数合并记录在这个代码下
+BULK_SYMBOL = "ALL"
+
+# akshare 返回的中文列名 -> 数据库字段
+COLUMN_MAP = {
+    "股东户数统计截止日": "end_date",
+    "区间涨跌幅": "change_range",
+    "股东户数-本次": "current_gdhs",
+    "股东户数-上次": "previous_gdhs",
+    "股东户数-增减": "gdhs_change",
+    "股东户数-增减比例": "gdhs_change_rate",
+    "户均持股市值": "average_hold_value",
+    "户均持股数量": "average_hold_amount",
+    "总市值": "total_market_value",
+    "总股本": "total_equity",
+    "股本变动": "equity_change",
+    "股本变动原因": "equity_change_reason",
+    "股东户数公告日期": "announcement_date",
+    "代码": "stock_code",
+    "名称": "stock_name",
+}
+
+# 全市场接口 stock_zh_a_gdhs 的列名 -> 数据库字段，最新价、涨跌幅等不入库
+BULK_COLUMN_MAP = {
+    "代码": "stock_code",
+    "名称": "stock_name",
+    "股东户数-本次": "current_gdhs",
+    "股东户数-上次": "previous_gdhs",
+    "股东户数-增减": "gdhs_change",
+    "股东户数-增减比例": "gdhs_change_rate",
+    "区间涨跌幅": "change_range",
+    "股东户数统计截止日-本次": "end_date",
+    # 不写入数据表，用于判断已有历史是否与本期衔接
+    "股东户数统计截止日-上次": "previous_end_date",
+    "户均持股市值": "average_hold_value",
+    "户均持股数量": "average_hold_amount",
+    "总市值": "total_market_value",
+    "总股本": "total_equity",
+    "公告日期": "announcement_date",
+}
 
 
 def sync_stock_gdhs(symbol: str) -> List[Dict]:
@@ -27,7 +81,7 @@ def sync_stock_gdhs(symbol: str) -> List[Dict]:
     try:
         # 获取股东户数详情数据
         gdhs_df = ak.stock_zh_a_gdhs_detail_em(
-            symbol=formatted_symbol.split("SH")[-1].split("SZ")[-1].split("BJ")[-1]
+            symbol=parse_symbol(formatted_symbol).code
         )
         log.info(f"[{formatted_symbol}] 获取到 {len(gdhs_df)} 条股东户数详情数据")
 
@@ -35,74 +89,28 @@ def sync_stock_gdhs(symbol: str) -> List[Dict]:
             log.info(f"[{formatted_symbol}] 未获取到股东户数详情数据")
             return []
 
-        # 重命名列以匹配数据库模型
-        gdhs_df.rename(
-            columns={
-                "股东户数统计截止日": "end_date",
-                "区间涨跌幅": "change_range",
-                "股东户数-本次": "current_gdhs",
-                "股东户数-上次": "previous_gdhs",
-                "股东户数-增减": "gdhs_change",
-                "股东户数-增减比例": "gdhs_change_rate",
-                "户均持股市值": "average_hold_value",
-                "户均持股数量": "average_hold_amount",
-                "总市值": "total_market_value",
-                "总股本": "total_equity",
-                "股本变动": "equity_change",
-                "股本变动原因": "equity_change_reason",
-                "股东户数公告日期": "announcement_date",
-                "代码": "stock_code",
-                "名称": "stock_name",
-            },
-            inplace=True,
+        # 重命名列、添加股票代码列并按列填充缺失值
+        gdhs_df = prepare_frame(
+            gdhs_df,
+            COLUMN_MAP,
+            symbol=formatted_symbol,
         )
 
-        # 添加股票代码列
-        gdhs_df["symbol"] = formatted_symbol
-
-        # 处理数值列中的 NaN 值
-        numeric_columns = gdhs_df.select_dtypes(include=[np.number]).columns
-        gdhs_df[numeric_columns] = gdhs_df[numeric_columns].fillna(0)
-
-        # 处理字符串列中的 NaN 值
-        string_columns = gdhs_df.select_dtypes(include=["object"]).columns
-        gdhs_df[string_columns] = gdhs_df[string_columns].fillna("")
-
-        # 转换为记录列表
-        gdhs_records = gdhs_df.to_dict("records")
-
-        # 转换 numpy 类型为 Python 原生类型
-        for record in gdhs_records:
-            for key, value in record.items():
-                if isinstance(value, np.integer):
-                    record[key] = int(value)
-                elif isinstance(value, np.floating):
-                    record[key] = float(value)
-                elif isinstance(value, pd.Timestamp):
-                    record[key] = str(value)
-
-        # 保存到数据库
-        db = get_db_session()
+        # 按自然键与已有数据比较，只写入变化的行
         try:
-            # 删除该股票已有的股东户数详情数据
-            db.query(StockGdhsDB).filter(
-                StockGdhsDB.symbol == formatted_symbol
-            ).delete()
-            
-            # 批量插入新数据
-            if gdhs_records:
-                db.bulk_insert_mappings(StockGdhsDB, gdhs_records)
-                db.commit()
-                log.info(f"[{formatted_symbol}] 成功同步 {len(gdhs_records)} 条股东户数详情数据")
-            
+            write_symbol_frame(
+                gdhs_df,
+                StockGdhsDB,
+                formatted_symbol,
+                KEY_COLUMNS,
+                DATASET,
+            )
+            log.info(f"[{formatted_symbol}] 成功同步 {len(gdhs_df)} 条股东户数详情数据")
         except Exception as e:
-            db.rollback()
             log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
             raise
-        finally:
-            db.close()
 
-        return gdhs_records
+        return gdhs_df.to_dict("records")
 
     except Exception as e:
         log.error(f"[{formatted_symbol}] 获取股东户数详情数据失败: {e}")
@@ -110,47 +118,127 @@ def sync_stock_gdhs(symbol: str) -> List[Dict]:
         raise
 
 
-def sync_all_stock_gdhs(max_workers: int = 5):
+def fetch_gdhs_bulk(date: str = "最新") -> pd.DataFrame:
     """
-    同步所有股票的股东户数详情数据
+    一次请求获取全市场某个统计截止日的股东户数
 
     Args:
-        max_workers: 最大并发数
+        date: "最新" 或季度末日期，如 "20240930"
+
+    Returns:
+        pd.DataFrame: StockGdhsDB 字段的全市场数据，每只股票一行
     """
-    log.info("开始同步所有股票的股东户数详情数据")
+    bulk_df = ak.stock_zh_a_gdhs(symbol=date)
+    log.info(f"获取到全市场股东户数数据 {len(bulk_df)} 条（{date}）")
+    if bulk_df.empty:
+        return bulk_df
+
+    bulk_df = prepare_frame(bulk_df, BULK_COLUMN_MAP)
+    # 与详情接口保持一致，日期按 YYYY-MM-DD 字符串存储
+    for column in ("end_date", "previous_end_date", "announcement_date"):
+        bulk_df[column] = pd.to_datetime(bulk_df[column], errors="coerce").dt.strftime(
+            "%Y-%m-%d"
+        )
+    bulk_df["symbol"] = bulk_df["stock_code"].map(format_a_stock_symbol)
+    return bulk_df[bulk_df["end_date"].notna()]
+
+
+def sync_stock_gdhs_bulk(
+    symbols: Optional[Iterable[str]] = None, date: str = "最新"
+) -> Set[str]:
+    """
+    用全市场接口增量更新股东户数
+
+    按 (股票, 统计截止日) 与已有记录比较，只写入变化的行，其余历史记录保留；
+    合并后的变更行数记录在 BULK_SYMBOL 下。全市场接口只返回
+    最新一期，只有已存储的最新统计截止日不早于本期的上一期（历史与本期衔接）
+    的股票在这里写入；尚无历史或中间缺了若干期的股票由调用方逐只调用详情
+    接口补全。
+
+    Args:
+        symbols: 只处理这些股票，None 表示全市场
+        date: 见 fetch_gdhs_bulk
 
-    # 获取所有股票代码
-    db = get_db_session()
+    Returns:
+        Set[str]: 已更新的股票代码（带市场前缀）
+    """
+    bulk_df = fetch_gdhs_bulk(date)
+    if bulk_df.empty:
+        return set()
+    if symbols is not None:
+        wanted = {format_a_stock_symbol(symbol) for symbol in symbols}
+        bulk_df = bulk_df[bulk_df["symbol"].isin(wanted)]
+
+    with session_scope() as db:
+        latest = dict(
+            db.execute(
+                select(StockGdhsDB.symbol, func.max(StockGdhsDB.end_date)).group_by(
+                    StockGdhsDB.symbol
+                )
+            ).all()
+        )
+        stored = bulk_df["symbol"].map(latest)
+        # 没有上一期日期（如新上市）时要求已存储本期
+        previous = bulk_df["previous_end_date"].fillna(bulk_df["end_date"])
+        bulk_df = bulk_df[stored.notna() & (stored >= previous)]
+        total = DiffResult()
+        # 同一截止日的记录一起比较，范围限定为这些股票该截止日的记录
+        for end_date, group in bulk_df.groupby("end_date"):
+            where = {"end_date": end_date, "symbol": group["symbol"].tolist()}
+            if write_mode() == "replace":
+                total.inserted += replace_dataframe(
+                    group, StockGdhsDB, where, db=db, label="gdhs_bulk"
+                )
+                continue
+            result = diff_dataframe(
+                group,
+                StockGdhsDB,
+                ["symbol", *KEY_COLUMNS],
+                where,
+                db=db,
+                label="gdhs_bulk",
+            )
+            total.inserted += result.inserted
+            total.updated += result.updated
+            total.deleted += result.deleted
+            total.unchanged += result.unchanged
     try:
-        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
-        log.info(f"获取到 {len(symbols)} 个股票代码")
+        record_changes(DATASET, BULK_SYMBOL, total)
     except Exception as e:
-        log.error(f"获取股票代码失败: {e}")
-        log.error(f"详细错误信息:\n{traceback.format_exc()}")
-        raise
-    finally:
-        db.close()
+        # 变更记录只用于观察，失败不影响已提交的数据
+        log.warning(f"记录全市场 {DATASET} 变更行数失败: {e}")
+    log.info(
+        f"全市场接口更新股东户数 {len(bulk_df)} 只股票：新增 {total.inserted}，"
+        f"更新 {total.updated}，删除 {total.deleted}"
+    )
+    return set(bulk_df["symbol"])
+
+
+def sync_all_stock_gdhs(max_workers: int = 5, swap: bool = False, bulk: bool = True):
+    """
+    同步所有股票的股东户数详情数据
 
-    # 逐个同步股东户数详情数据
-    success_count = 0
-    fail_count = 0
+    优先使用全市场接口（一次请求覆盖全部股票的最新一期），只有尚无历史
+    记录、历史与最新一期之间缺了若干期或不在全市场结果中的股票才逐只调用
+    详情接口。
 
-    for i, symbol in enumerate(symbols, 1):
+    Args:
+        max_workers: 最大并发数
+        swap: 写入暂存表，全部完成后原子切换为线上表（整表重建，逐只同步）
+        bulk: 是否优先使用全市场接口
+    """
+    log.info("开始同步所有股票的股东户数详情数据")
+
+    symbols = load_spot_symbols()
+
+    if bulk and not swap:
         try:
-            sync_stock_gdhs(symbol)
-            success_count += 1
-            log.info(f"进度: {i}/{len(symbols)} - [{symbol}] 同步成功")
+            updated = sync_stock_gdhs_bulk(symbols)
         except Exception as e:
-            fail_count += 1
-            log.error(f"进度: {i}/{len(symbols)} - [{symbol}] 同步失败: {e}")
-            log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-
-        # 显示进度
-        if i % 100 == 0 or i == len(symbols):
-            log.info(
-                f"股东户数详情数据同步进度: {i}/{len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-            )
+            log.error(f"全市场股东户数接口失败，改为逐只同步: {e}")
+            updated = set()
+        symbols = [s for s in symbols if format_a_stock_symbol(s) not in updated]
+        log.info(f"全市场接口已更新 {len(updated)} 只，逐只补全 {len(symbols)} 只")
 
-    log.info(
-        f"股东户数详情数据同步完成，总计: {len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-    )
\ No newline at end of file
+    with staging_swap(StockGdhsDB, enabled=swap):
+        return run_symbols(sync_stock_gdhs, symbols, max_workers, "股东户数详情数据")
@@ -1,10 +1,17 @@
-from typing import Dict, List
-import akshare as ak
-import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .ak_client import ak
+import pandas as pd
 import datetime
+from sqlalchemy import func, select
 from core.models import StockHistoryDB
-from core.database import get_db_session, get_hist_db_session
+from core.database import get_hist_db_session, session_scope
+from core.data import hist_store
+from core.data.calendar import TradingCalendar
+from core.data.hist_store import is_enabled as hist_store_enabled
 from core.logger import log
+from core.symbols import parse_symbol, symbol_registry
+from .convert import fill_missing
+from .writer import upsert_dataframe
 
 
 def format_stock_symbol(symbol: str) -> str:
@@ -17,62 +24,212 @@ def format_stock_symbol(symbol: str) -> str:
     Returns:
         Stock symbol without exchange prefix (e.g., 600004)
     """
-    if symbol.startswith(("SH", "SZ", "BJ")):
-        return symbol[2:]
-    return symbol
+    return parse_symbol(symbol).code
 
 
-def sync_stock_zh_a_hist(
-    symbol: str = "000001",
-    period: str = "daily",
-    start_date: str = "19700101",
-    end_date: str = "20500101",
-    adjust: str = "none",
-) -> List[Dict]:
-    # Remove exchange prefix from symbol for akshare API
-    formatted_symbol = format_stock_symbol(symbol)
-    
-    # Convert date strings to datetime objects for comparison
+def latest_history_dates(
+    adjusts: Optional[Sequence[str]] = None,
+) -> Dict[Tuple[str, str], datetime.date]:
+    """
+    Latest stored bar date of every (symbol, adjust) pair in one grouped query.
+
+    The primary key starts with (symbol_id, adjust, date), so MAX(date) per
+    group is answered from the index without scanning the bars.
+
+    Args:
+        adjusts: Only look at these adjust types, default all
+
+    Returns:
+        {(symbol, adjust): latest date}, symbols without bars are absent
+    """
+    stmt = select(
+        StockHistoryDB.symbol_id, StockHistoryDB.adjust, func.max(StockHistoryDB.date)
+    ).group_by(StockHistoryDB.symbol_id, StockHistoryDB.adjust)
+    if adjusts is not None:
+        stmt = stmt.where(StockHistoryDB.adjust.in_(list(adjusts)))
+    with session_scope() as db:
+        rows = db.execute(stmt).all()
+    return {
+        (symbol_registry.code_of(symbol_id), adjust): latest
+        for symbol_id, adjust, latest in rows
+    }
+
+
+def _fetch_window(
+    formatted_symbol: str,
+    start_date: str,
+    end_date: str,
+    latest_date: Optional[datetime.date],
+    verbose: bool = True,
+) -> Optional[str]:
+    """Effective start date given the latest stored bar, None if up to date"""
     start_date_dt = datetime.datetime.strptime(start_date, "%Y%m%d").date()
     end_date_dt = datetime.datetime.strptime(end_date, "%Y%m%d").date()
 
-    # Check the latest date in database for this symbol and adjust type
-    db = get_hist_db_session(formatted_symbol)
-    try:
-        latest_record = (
-            db.query(StockHistoryDB.date)
-            .filter(StockHistoryDB.symbol == formatted_symbol, StockHistoryDB.adjust == adjust)
-            .order_by(StockHistoryDB.date.desc())
-            .first()
-        )
-
-        if latest_record:
-            latest_date = latest_record[0]
-            # If latest date is already beyond end_date, skip sync
-            if latest_date >= end_date_dt:
+    if latest_date:
+        # If latest date is already beyond end_date, skip sync
+        if latest_date >= end_date_dt:
+            if verbose:
                 log.info(
                     f"[{formatted_symbol}] 最新数据日期 {latest_date} 已超过或等于结束日期 {end_date_dt}，跳过同步"
                 )
-                return []
+            return None
 
-            # If latest date is newer than provided start_date, use latest date + 1 day
-            if latest_date > start_date_dt:
-                new_start_date = latest_date + datetime.timedelta(days=1)
-                start_date = new_start_date.strftime("%Y%m%d")
-                start_date_dt = new_start_date
+        # If latest date is newer than provided start_date, use latest date + 1 day
+        if latest_date > start_date_dt:
+            start_date_dt = latest_date + datetime.timedelta(days=1)
+            start_date = start_date_dt.strftime("%Y%m%d")
+            if verbose:
                 log.info(
                     f"[{formatted_symbol}] 使用数据库最新日期后一天作为开始日期: {start_date}"
                 )
 
-    finally:
-        db.close()
-
     # If start_date is after end_date, skip sync
     if start_date_dt > end_date_dt:
-        log.info(
-            f"[{formatted_symbol}] 开始日期 {start_date_dt} 已超过结束日期 {end_date_dt}，跳过同步"
-        )
-        return []
+        if verbose:
+            log.info(
+                f"[{formatted_symbol}] 开始日期 {start_date_dt} 已超过结束日期 {end_date_dt}，跳过同步"
+            )
+        return None
+
+    return start_date
+
+
+def plan_stock_zh_a_hist(
+    symbol: str,
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "none",
+    latest_dates: Optional[Dict[Tuple[str, str], datetime.date]] = None,
+) -> Optional[str]:
+    """
+    Work out the incremental fetch window for a symbol.
+
+    Args:
+        latest_dates: Result of latest_history_dates; when given the symbol's
+                      latest date is looked up there instead of probing the database
+
+    Returns:
+        The effective start date (YYYYMMDD), or None if the symbol is up to date
+    """
+    formatted_symbol = format_stock_symbol(symbol)
+
+    if latest_dates is not None:
+        latest_date = latest_dates.get((formatted_symbol, adjust))
+    else:
+        # Check the latest date in database for this symbol and adjust type
+        symbol_id = symbol_registry.lookup([formatted_symbol]).get(formatted_symbol)
+        latest_record = None
+        if symbol_id is not None:
+            db = get_hist_db_session(formatted_symbol)
+            try:
+                latest_record = (
+                    db.query(StockHistoryDB.date)
+                    .filter(
+                        StockHistoryDB.symbol_id == symbol_id,
+                        StockHistoryDB.adjust == adjust,
+                    )
+                    .order_by(StockHistoryDB.date.desc())
+                    .first()
+                )
+            finally:
+                db.close()
+        latest_date = latest_record[0] if latest_record else None
+
+    return _fetch_window(formatted_symbol, start_date, end_date, latest_date)
+
+
+def plan_adjust_windows(
+    symbols: Iterable[str],
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjusts: Sequence[str] = ("none",),
+    calendar: Optional[TradingCalendar] = None,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Plan the fetch window of every symbol and adjust type up front with a single query.
+
+    Args:
+        adjusts: Adjust types to plan, e.g. ("qfq", "hfq", "")
+        calendar: Trading calendar; windows with no trading day up to today
+                  (weekends, holidays) are skipped without a request
+
+    Returns:
+        {symbol: {adjust: effective start date}} for the symbols that need
+        fetching; up-to-date symbols and adjust types are left out
+    """
+    latest_dates = latest_history_dates(adjusts)
+    windows: Dict[str, Dict[str, str]] = {}
+    for symbol in symbols:
+        formatted_symbol = format_stock_symbol(symbol)
+        for adjust in adjusts:
+            window = _fetch_window(
+                formatted_symbol,
+                start_date,
+                end_date,
+                latest_dates.get((formatted_symbol, adjust)),
+                verbose=False,
+            )
+            if window is None:
+                continue
+            if calendar is not None and not calendar.has_trading_day(window, end_date):
+                continue
+            windows.setdefault(symbol, {})[adjust] = window
+    return windows
+
+
+def plan_history_windows(
+    symbols: Iterable[str],
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "none",
+    calendar: Optional[TradingCalendar] = None,
+) -> Dict[str, str]:
+    """
+    Single adjust type version of plan_adjust_windows.
+
+    Returns:
+        {symbol: effective start date} for the symbols that need fetching
+    """
+    windows = plan_adjust_windows(symbols, start_date, end_date, [adjust], calendar)
+    return {symbol: plan[adjust] for symbol, plan in windows.items()}
+
+
+def fetch_stock_zh_a_hist(
+    symbol: str = "000001",
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "none",
+    latest_dates: Optional[Dict[Tuple[str, str], datetime.date]] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Fetch the missing bars of a symbol from akshare, ready to be written.
+
+    Returns:
+        DataFrame with the StockHistoryDB column names, or None if the symbol
+        is already up to date and no request was made
+    """
+    start_date = plan_stock_zh_a_hist(symbol, start_date, end_date, adjust, latest_dates)
+    if start_date is None:
+        return None
+    return request_stock_zh_a_hist(symbol, period, start_date, end_date, adjust)
+
+
+def request_stock_zh_a_hist(
+    symbol: str,
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "none",
+) -> pd.DataFrame:
+    """
+    Request bars for an already planned window from akshare.
+
+    Returns:
+        DataFrame with the StockHistoryDB column names (empty if akshare returned nothing)
+    """
+    formatted_symbol = format_stock_symbol(symbol)
 
     # Get historical stock data using akshare
     stock_hist_df = ak.stock_zh_a_hist(
@@ -86,7 +243,7 @@ def sync_stock_zh_a_hist(
     # If no data returned, skip database operations
     if stock_hist_df.empty:
         log.info(f"[{formatted_symbol}] 未获取到 {start_date} 至 {end_date} 的历史数据")
-        return []
+        return pd.DataFrame()
 
     # Rename columns to English
     stock_hist_df.columns = [
@@ -104,47 +261,131 @@ def sync_stock_zh_a_hist(
         "turnover",
     ]
 
-    # Replace NaN values with 0 for numeric columns
-    numeric_columns = stock_hist_df.select_dtypes(include=[np.number]).columns
-    stock_hist_df[numeric_columns] = stock_hist_df[numeric_columns].fillna(0)
-
-    # Replace NaN values with empty string for string columns
-    string_columns = stock_hist_df.select_dtypes(include=["object"]).columns
-    stock_hist_df[string_columns] = stock_hist_df[string_columns].fillna("")
+    # Fill NaN per column: 0 for numeric, empty string for text
+    fill_missing(stock_hist_df)
     stock_hist_df["adjust"] = adjust  # Add adjust column
+    stock_hist_df["symbol_id"] = symbol_registry.id_of(formatted_symbol)
 
-    stock_hist = stock_hist_df.to_dict("records")
+    return stock_hist_df
 
-    # Convert numpy types to Python native types
-    for stock_item in stock_hist:
-        for key, value in stock_item.items():
-            if isinstance(value, np.integer):
-                stock_item[key] = int(value)
-            elif isinstance(value, np.floating):
-                stock_item[key] = float(value)
-            elif isinstance(value, np.bool_):
-                stock_item[key] = bool(value)
 
-    # Save to database
-    db = get_hist_db_session(formatted_symbol)
+def write_stock_zh_a_hist(
+    stock_hist_df: Optional[pd.DataFrame], symbol: str, adjust: str = "none"
+) -> List[Dict]:
+    """
+    Upsert fetched bars and mirror them into the columnar history store.
+
+    Returns:
+        List of written history records
+    """
+    formatted_symbol = format_stock_symbol(symbol)
+    if stock_hist_df is None or stock_hist_df.empty:
+        return []
+
+    # 按主键 upsert，重复同步同一区间不会主键冲突
     try:
-        # Batch insert data
-        batch_size = 500
-        for i in range(0, len(stock_hist), batch_size):
-            batch = stock_hist[i : i + batch_size]
-            db.bulk_insert_mappings(StockHistoryDB, batch)
-            db.commit()
-            log.info(
-                f"[{formatted_symbol}] 批量插入第 {i//batch_size + 1} 批数据，记录数: {len(batch)}"
-            )
+        upsert_dataframe(stock_hist_df, StockHistoryDB, label=formatted_symbol)
+    except Exception as e:
+        log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
+        raise
+
+    log.info(f"[{formatted_symbol}] 成功同步 {len(stock_hist_df)} 条历史数据")
+
+    # 同步追加到列式历史存储
+    if hist_store_enabled():
+        hist_store.append(stock_hist_df, adjust)
+
+    return stock_hist_df.to_dict("records")
+
+
+def request_stock_zh_a_hist_adjusts(
+    symbol: str,
+    period: str = "daily",
+    windows: Optional[Dict[str, str]] = None,
+    end_date: str = "20500101",
+) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Request several adjust types of a symbol back to back.
+
+    Args:
+        windows: {adjust: start date (YYYYMMDD)} from plan_adjust_windows
+
+    Returns:
+        {adjust: DataFrame}, or None if there is nothing to request
+    """
+    if not windows:
+        return None
+    return {
+        adjust: request_stock_zh_a_hist(symbol, period, start, end_date, adjust)
+        for adjust, start in windows.items()
+    }
+
+
+def fetch_stock_zh_a_hist_adjusts(
+    symbol: str,
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjusts: Sequence[str] = ("none",),
+) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Probe and fetch several adjust types of a symbol.
 
-        log.info(f"[{formatted_symbol}] 成功同步 {len(stock_hist)} 条历史数据")
-        return stock_hist
+    Returns:
+        {adjust: DataFrame} for the adjust types that were not up to date,
+        or None if all of them are
+    """
+    windows = {}
+    for adjust in adjusts:
+        start = plan_stock_zh_a_hist(symbol, start_date, end_date, adjust)
+        if start is not None:
+            windows[adjust] = start
+    return request_stock_zh_a_hist_adjusts(symbol, period, windows, end_date)
+
+
+def write_stock_zh_a_hist_adjusts(
+    frames: Optional[Dict[str, pd.DataFrame]], symbol: str
+) -> Dict[str, int]:
+    """
+    Upsert the bars of several adjust types of a symbol in one transaction.
 
+    Returns:
+        {adjust: rows written}
+    """
+    formatted_symbol = format_stock_symbol(symbol)
+    frames = {
+        adjust: df for adjust, df in (frames or {}).items() if df is not None and not df.empty
+    }
+    if not frames:
+        return {}
+
+    try:
+        upsert_dataframe(
+            pd.concat(frames.values(), ignore_index=True),
+            StockHistoryDB,
+            label=formatted_symbol,
+        )
     except Exception as e:
-        db.rollback()
         log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
         raise
 
-    finally:
-        db.close()
\ No newline at end of file
+    counts = {adjust: len(df) for adjust, df in frames.items()}
+    log.info(f"[{formatted_symbol}] 成功同步历史数据: {counts}")
+
+    # 同步追加到列式历史存储
+    if hist_store_enabled():
+        for adjust, df in frames.items():
+            hist_store.append(df, adjust)
+
+    return counts
+
+
+def sync_stock_zh_a_hist(
+    symbol: str = "000001",
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "none",
+) -> List[Dict]:
+    stock_hist_df = fetch_stock_zh_a_hist(symbol, period, start_date, end_date, adjust)
+    return write_stock_zh_a_hist(stock_hist_df, symbol, adjust)
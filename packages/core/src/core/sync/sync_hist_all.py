@@ -1,20 +1,76 @@
 import datetime
+import threading
 import time
-import random
 import traceback
+import pandas as pd
+from typing import List
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from core.models import (
-    StockSpotDB,
-    StockSyncTaskDB,
-)
-from core.database import get_db_session, init_db
+from core.database import init_db
+from core.data import hist_store
+from core.data.hist_store import is_enabled as hist_store_enabled
+from core.data.calendar import get_trading_calendar
+from core.data.cube import OhlcvCube
+from core.data.cube import is_enabled as hist_cube_enabled
 from core.logger import log
-from .sync_hist import sync_stock_zh_a_hist
+from core.data.adjust import RAW_ADJUST
+from .sync_hist import (
+    fetch_stock_zh_a_hist_adjusts,
+    plan_adjust_windows,
+    plan_stock_zh_a_hist,
+    request_stock_zh_a_hist,
+    request_stock_zh_a_hist_adjusts,
+    write_stock_zh_a_hist_adjusts,
+)
+from .engine import FetchEngine, FetchJob, provider_rate
+from .runner import RunResult, load_spot_symbols
+from .shard import report_progress
+from .task_queue import COMPLETED, TaskQueue
+from .throttle import AdaptiveRateController
+from .sync_adjust_factor import (
+    FACTOR_ADJUST,
+    refresh_adjust_factor_if_needed,
+    symbols_without_factor,
+)
 from .sync_business_composition import sync_stock_business_composition
 
 # Initialize database on first run
 init_db()
 
+# 每次从任务队列领取的任务数，需在租约时间内处理完
+CLAIM_BATCH_SIZE = 100
+
+# adjust="all" 时同步的复权类型
+ALL_ADJUSTS = ("qfq", "hfq", RAW_ADJUST)
+
+
+def parse_adjusts(adjust: str) -> List[str]:
+    """
+    解析 adjust 参数为存储的复权类型列表
+
+    支持单个取值（qfq / hfq / "" / factor）、逗号分隔的多个取值（raw 或 none
+    表示不复权，如 "qfq,hfq,raw"）以及 all（qfq、hfq、不复权）。
+    """
+    if adjust == FACTOR_ADJUST:
+        # factor 模式下行情按不复权存储
+        return [RAW_ADJUST]
+    if adjust.lower() == "all":
+        return list(ALL_ADJUSTS)
+    if "," not in adjust:
+        return [adjust]
+    adjusts = []
+    for item in adjust.split(","):
+        item = item.strip().lower()
+        if item == FACTOR_ADJUST:
+            raise ValueError("factor 模式不能与其他复权类型同时同步")
+        item = RAW_ADJUST if item in ("raw", "none") else item
+        if item not in adjusts:
+            adjusts.append(item)
+    return adjusts
+
+
+def _adjust_label(adjust: str) -> str:
+    return adjust or "不复权"
+
 
 def sync_stock_zh_a_hist_all(
     period: str = "daily",
@@ -22,191 +78,241 @@ def sync_stock_zh_a_hist_all(
     end_date: str = "20500101",
     adjust: str = "hfq",
     max_workers: int = 5,
+    engine: str = "thread",
 ):
+    """
+    同步全市场历史行情
+
+    任务记录在 stock_sync_task_data 中，按批领取直到没有可领取的任务；
+    多个进程或节点可以同时执行，同一只股票只会被一个 worker 处理。
+
+    Args:
+        adjust: qfq / hfq / "" 直接存储对应复权行情；
+                factor 存储不复权行情 + 复权因子，读取时再推导 qfq / hfq；
+                多个复权类型用逗号分隔（如 qfq,hfq,raw）或 all，每只股票只处理
+                一次：依次请求各复权类型，在同一事务中写入，只记录一条任务结果
+        engine: thread 线程池逐只同步；async 使用异步抓取引擎，
+                按数据源令牌桶限速，抓取与写库流水线并行
+
+    Returns:
+        RunResult: 本次处理的任务数与成功 / 失败统计
+    """
+    if engine not in ("thread", "async"):
+        raise ValueError(f"不支持的同步引擎: {engine}")
+    store_adjusts = parse_adjusts(adjust)
     end_date_obj = datetime.datetime.strptime(end_date, "%Y%m%d").date()
     log.info(
-        f"开始同步历史数据，结束日期: {end_date_obj}, 复权: {adjust}, 并发: {max_workers}"
+        f"开始同步历史数据，结束日期: {end_date_obj}, "
+        f"复权: {[_adjust_label(a) for a in store_adjusts]}, "
+        f"并发: {max_workers}, 引擎: {engine}"
     )
 
-    # Step 1: Initialize tasks
-    db = get_db_session()
+    # Step 1: 一次分组查询算出每只股票的抓取区间，只为需要更新的股票创建当日任务
+    queue = TaskQueue(end_date_obj)
     try:
-        # 获取所有symbol和现有任务
-        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
-        existing_symbols = {
-            t[0]
-            for t in db.query(StockSyncTaskDB.symbol)
-            .filter(StockSyncTaskDB.date == end_date_obj)
-            .all()
-        }
-
-        log.info(f"股票代码: {len(symbols)}, 已有任务: {len(existing_symbols)}")
-
-        # 批量创建新任务
-        new_tasks = [
-            StockSyncTaskDB(
-                date=end_date_obj,
-                symbol=symbol,
-                status="pending",
-                message="等待同步",
-                start_time=datetime.datetime.now(),
-            )
-            for symbol in symbols
-            if symbol not in existing_symbols
-        ]
-
-        db.bulk_save_objects(new_tasks)
-        db.commit()
-        log.info(f"新增任务: {len(new_tasks)}")
-
+        # 任务覆盖全市场，分片 worker 之间通过领取任务分担
+        symbols = load_spot_symbols(sharded=False)
+        windows = plan_adjust_windows(
+            symbols, start_date, end_date, store_adjusts, get_trading_calendar()
+        )
+        log.info(f"股票代码: {len(symbols)}, 已是最新: {len(symbols) - len(windows)}, 需要更新: {len(windows)}")
+        if adjust == FACTOR_ADJUST:
+            # 行情已是最新但还没有复权因子的股票同样创建任务，空的抓取计划只补齐因子，
+            # 否则读取时推导的 qfq / hfq 会退化为不复权行情
+            missing = symbols_without_factor(s for s in symbols if s not in windows)
+            for symbol in missing:
+                windows[symbol] = {}
+            if missing:
+                log.info(f"尚无复权因子: {len(missing)}")
+        queue.enqueue(list(windows))
     except Exception as e:
-        db.rollback()
         log.error(f"初始化任务失败: {e}")
         log.error(f"详细错误信息:\n{traceback.format_exc()}")
         raise
-    finally:
-        db.close()
 
-    # Step 2: 获取待处理任务
-    db = get_db_session()
-    try:
-        tasks = (
-            db.query(StockSyncTaskDB)
-            .filter(
-                StockSyncTaskDB.date == end_date_obj,
-                StockSyncTaskDB.status.in_(["pending", "failed"]),
-            )
-            .limit(500)
-            .all()
-        )
-
-        if not tasks:
-            log.info("无待处理任务")
-            return
-
-        symbols = [task.symbol for task in tasks]
-        log.info(f"待处理任务: {len(tasks)}")
-
-    except Exception as e:
-        log.error(f"获取任务失败: {e}")
-        log.error(f"详细错误信息:\n{traceback.format_exc()}")
-        raise
-    finally:
-        db.close()
+    pending = {
+        status: count
+        for status, count in queue.summary().items()
+        if status != COMPLETED
+    }
+    log.info(f"待处理任务: {pending}")
 
-    # Step 3: 并行执行任务
-    success = fail = 0
+    # Step 2: 循环领取任务并执行，直到队列中没有可领取的任务
+    success = fail = done = 0
+    total = sum(pending.values())
     start_time_total = time.time()
 
+    # 东方财富行情接口的自适应限速，替代每只股票后的固定随机休眠
+    controller = AdaptiveRateController(
+        rate=provider_rate("em"),
+        concurrency=max(1, max_workers // 2),
+        max_concurrency=max_workers,
+        label="历史行情",
+    )
+
     def process_symbol(symbol):
         start_time = time.time()
         log.info(f"[{symbol}] 开始同步")
 
         try:
-            # 执行历史行情同步
-            hist = sync_stock_zh_a_hist(
-                symbol=symbol,
-                period=period,
-                start_date=start_date,
-                end_date=end_date,
-                adjust=adjust,
-            )
+            # 已是最新的复权类型不发请求，也不占用限速名额；
+            # 其他 worker 创建的任务不在本次规划结果中，退回逐只查询
+            plan = windows.get(symbol)
+            if plan is None:
+                plan = {}
+                for store_adjust in store_adjusts:
+                    fetch_start = plan_stock_zh_a_hist(
+                        symbol, start_date, end_date, store_adjust
+                    )
+                    if fetch_start is not None:
+                        plan[store_adjust] = fetch_start
+            frames = {}
+            for store_adjust, fetch_start in plan.items():
+                controller.acquire()
+                request_started = time.time()
+                try:
+                    stock_hist_df = request_stock_zh_a_hist(
+                        symbol, period, fetch_start, end_date, store_adjust
+                    )
+                except Exception:
+                    controller.release(False, time.time() - request_started)
+                    raise
+                controller.release(
+                    True, time.time() - request_started, empty=stock_hist_df.empty
+                )
+                frames[store_adjust] = stock_hist_df
 
+            rows = write_frames(symbol, frames)
             elapsed = time.time() - start_time
-            log.info(f"[{symbol}] 完成，耗时: {elapsed:.2f}s，历史行情: {len(hist)}条")
-            time.sleep(random.uniform(1, 3))
+            log.info(f"[{symbol}] 完成，耗时: {elapsed:.2f}s，历史行情: {rows}条")
 
-            return (symbol, True, None, elapsed, len(hist), 0)
+            return (symbol, True, None, elapsed, rows)
 
         except Exception as e:
             elapsed = time.time() - start_time
             log.error(f"[{symbol}] 失败，耗时: {elapsed:.2f}s，错误: {str(e)}")
             log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-            time.sleep(random.uniform(1, 3))
-            return (symbol, False, str(e), elapsed, 0, 0)
-
-    # 更新任务状态
-    def update_task_status(
-        symbol, success, message, elapsed, hist_records_count, composition_records_count
-    ):
-        with get_db_session() as db:
-            task = (
-                db.query(StockSyncTaskDB)
-                .filter(
-                    StockSyncTaskDB.date == end_date_obj,
-                    StockSyncTaskDB.symbol == symbol,
-                )
-                .first()
-            )
+            return (symbol, False, str(e), elapsed, 0)
 
-            if task:
-                task.status = "completed" if success else "failed"
-                task.message = message
-                task.start_time = (
-                    datetime.datetime.now() if success else task.start_time
-                )
-                task.end_time = datetime.datetime.now()
-                task.duration = elapsed
-                db.commit()
-
-    # 执行并行任务
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_symbol, symbol): symbol for symbol in symbols
-        }
-
-        for idx, future in enumerate(as_completed(futures), 1):
-            symbol = futures[future]
-            try:
-                (
-                    symbol,
-                    ok,
-                    err,
-                    elapsed,
-                    hist_records_count,
-                    composition_records_count,
-                ) = future.result()
-                if ok:
-                    success += 1
-                else:
-                    fail += 1
-
-                # 更新任务状态
-                message = (
-                    f"成功，历史行情:{hist_records_count}条"
-                    if ok
-                    else f"失败: {err[:100]}"
-                )
-                update_task_status(
-                    symbol,
-                    ok,
-                    message,
-                    elapsed,
-                    hist_records_count,
-                    composition_records_count,
-                )
+    counter_lock = threading.Lock()
+
+    def record_task(symbol, ok, err, elapsed, hist_records_count):
+        nonlocal success, fail, done
+        if ok:
+            queue.complete(symbol, f"成功，历史行情:{hist_records_count}条", elapsed)
+        else:
+            queue.fail(symbol, f"失败: {err[:100]}", elapsed)
 
-            except Exception as e:
+        # 异步引擎下由多个写库线程回调
+        with counter_lock:
+            if ok:
+                success += 1
+            else:
                 fail += 1
-                log.error(f"[{symbol}] 执行异常: {e}")
-                log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-                update_task_status(symbol, False, f"执行异常: {e}", 0, 0, 0)
-
-            # 进度日志
-            progress = (idx / len(symbols)) * 100
-            elapsed_total = time.time() - start_time_total
-            avg_time = elapsed_total / idx
-            remaining = avg_time * (len(symbols) - idx)
-
-            log.info(
-                f"进度 {idx}/{len(symbols)} ({progress:.1f}%) | "
-                f"成功:{success} 失败:{fail} | "
-                f"耗时:{elapsed_total:.0f}s 剩余:{remaining:.0f}s"
+            done += 1
+            report_progress(done, total, success, fail)
+
+        # 进度日志
+        elapsed_total = time.time() - start_time_total
+        remaining = elapsed_total / done * max(0, total - done)
+        log.info(
+            f"进度 {done}/{total} | 成功:{success} 失败:{fail} | "
+            f"耗时:{elapsed_total:.0f}s 剩余:{remaining:.0f}s"
+        )
+
+    def write_frames(symbol, frames) -> int:
+        # 各复权类型在同一事务中写入
+        counts = write_stock_zh_a_hist_adjusts(frames, symbol)
+
+        # 仅在首次同步或出现除权除息时刷新复权因子
+        if adjust == FACTOR_ADJUST:
+            bars = frames.get(RAW_ADJUST)
+            refresh_adjust_factor_if_needed(
+                symbol, bars if bars is not None else pd.DataFrame()
+            )
+        return sum(counts.values())
+
+    def write_symbol(job: FetchJob, frames) -> int:
+        return write_frames(job.key, frames or {})
+
+    def run_async_batch(symbols):
+        # 东方财富行情接口，令牌桶从 FETCH_RATE_EM 起按 AIMD 自适应调整，
+        # 每个任务按实际请求的复权类型数消耗令牌
+        jobs = [
+            FetchJob(
+                key=symbol,
+                provider="em",
+                func=request_stock_zh_a_hist_adjusts,
+                kwargs=dict(
+                    symbol=symbol,
+                    period=period,
+                    windows=windows[symbol],
+                    end_date=end_date,
+                ),
+                cost=len(windows[symbol]),
             )
+            if symbol in windows
+            else FetchJob(
+                key=symbol,
+                provider="em",
+                func=fetch_stock_zh_a_hist_adjusts,
+                kwargs=dict(
+                    symbol=symbol,
+                    period=period,
+                    start_date=start_date,
+                    end_date=end_date,
+                    adjusts=store_adjusts,
+                ),
+                cost=len(store_adjusts),
+            )
+            for symbol in symbols
+        ]
+        fetch_engine.run(jobs, write_symbol, record_task, label="历史行情")
+
+    def run_thread_batch(symbols):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_symbol, symbol): symbol for symbol in symbols
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    record_task(*future.result())
+                except Exception as e:
+                    log.error(f"[{symbol}] 执行异常: {e}")
+                    log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
+
+    if engine == "async":
+        # 引擎跨批次复用，令牌桶与自适应速率不会每批重置
+        fetch_engine = FetchEngine(max_workers=max_workers)
+        queue.drain(run_async_batch, batch_size=CLAIM_BATCH_SIZE)
+    else:
+        queue.drain(run_thread_batch, batch_size=CLAIM_BATCH_SIZE)
+
+    if not done:
+        log.info("无待处理任务")
+        report_progress(0, 0, 0, 0, force=True)
+        return RunResult()
+
+    # 合并列式存储中本轮产生的小文件
+    if hist_store_enabled():
+        for store_adjust in store_adjusts:
+            hist_store.compact(store_adjust)
+
+    # 增量更新内存映射立方体，factor 模式下物化后复权价格
+    if hist_cube_enabled():
+        for store_adjust in ["hfq"] if adjust == FACTOR_ADJUST else store_adjusts:
+            OhlcvCube(store_adjust).update()
 
     # 完成统计
+    if engine == "thread":
+        controller.log_state()
+    report_progress(done, done, success, fail, force=True)
     total_elapsed = time.time() - start_time_total
     log.info(
-        f"同步完成! 总计: {len(symbols)}, 成功: {success}, 失败: {fail}, "
+        f"同步完成! 总计: {done}, 成功: {success}, 失败: {fail}, "
         f"总耗时: {total_elapsed:.2f}s"
     )
+    return RunResult(
+        total=done, success=success, failed=fail, elapsed=total_elapsed
+    )
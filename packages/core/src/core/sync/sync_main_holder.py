@@ -1,12 +1,35 @@
-import akshare as ak
-import pandas as pd
-import numpy as np
+from .ak_client import ak
 import traceback
 from typing import List, Dict
-from core.models import StockMainHolderDB, StockSpotDB
-from core.database import get_db_session
+from core.models import StockMainHolderDB
 from core.logger import log
+from core.symbols import parse_symbol
 from .sync_business_composition import format_a_stock_symbol
+from .convert import prepare_frame
+from .fundamentals import write_symbol_frame
+from .runner import load_spot_symbols, run_symbols
+from .staging import staging_swap
+
+
+# 变更记录中的数据集名称
+DATASET = "main_holder"
+
+# 与已有数据比较时的自然键（同一股票内唯一）
+KEY_COLUMNS = ["end_date", "number"]
+
+# akshare 返回的中文列名 -> 数据库字段
+COLUMN_MAP = {
+    "编号": "number",
+    "股东名称": "holder_name",
+    "持股数量": "hold_amount",
+    "持股比例": "hold_ratio",
+    "股本性质": "stock_type",
+    "截至日期": "end_date",
+    "公告日期": "announcement_date",
+    "股东说明": "holder_explain",
+    "股东总数": "holder_total_num",
+    "平均持股数": "average_hold_num",
+}
 
 
 def sync_stock_main_holder(symbol: str) -> List[Dict]:
@@ -27,7 +50,7 @@ def sync_stock_main_holder(symbol: str) -> List[Dict]:
     try:
         # 获取主要股东数据
         main_holder_df = ak.stock_main_stock_holder(
-            stock=formatted_symbol.split("SH")[-1].split("SZ")[-1].split("BJ")[-1]
+            stock=parse_symbol(formatted_symbol).code
         )
         log.info(f"[{formatted_symbol}] 获取到 {len(main_holder_df)} 条主要股东数据")
 
@@ -35,69 +58,28 @@ def sync_stock_main_holder(symbol: str) -> List[Dict]:
             log.info(f"[{formatted_symbol}] 未获取到主要股东数据")
             return []
 
-        # 重命名列以匹配数据库模型
-        main_holder_df.rename(
-            columns={
-                "编号": "number",
-                "股东名称": "holder_name",
-                "持股数量": "hold_amount",
-                "持股比例": "hold_ratio",
-                "股本性质": "stock_type",
-                "截至日期": "end_date",
-                "公告日期": "announcement_date",
-                "股东说明": "holder_explain",
-                "股东总数": "holder_total_num",
-                "平均持股数": "average_hold_num",
-            },
-            inplace=True,
+        # 重命名列、添加股票代码列并按列填充缺失值
+        main_holder_df = prepare_frame(
+            main_holder_df,
+            COLUMN_MAP,
+            symbol=formatted_symbol,
         )
 
-        # 添加股票代码列
-        main_holder_df["symbol"] = formatted_symbol
-
-        # 处理数值列中的 NaN 值
-        numeric_columns = main_holder_df.select_dtypes(include=[np.number]).columns
-        main_holder_df[numeric_columns] = main_holder_df[numeric_columns].fillna(0)
-
-        # 处理字符串列中的 NaN 值
-        string_columns = main_holder_df.select_dtypes(include=["object"]).columns
-        main_holder_df[string_columns] = main_holder_df[string_columns].fillna("")
-
-        # 转换为记录列表
-        main_holder_records = main_holder_df.to_dict("records")
-
-        # 转换 numpy 类型为 Python 原生类型
-        for record in main_holder_records:
-            for key, value in record.items():
-                if isinstance(value, np.integer):
-                    record[key] = int(value)
-                elif isinstance(value, np.floating):
-                    record[key] = float(value)
-                elif isinstance(value, pd.Timestamp):
-                    record[key] = str(value)
-
-        # 保存到数据库
-        db = get_db_session()
+        # 按自然键与已有数据比较，只写入变化的行
         try:
-            # 删除该股票已有的主要股东数据
-            db.query(StockMainHolderDB).filter(
-                StockMainHolderDB.symbol == formatted_symbol
-            ).delete()
-            
-            # 批量插入新数据
-            if main_holder_records:
-                db.bulk_insert_mappings(StockMainHolderDB, main_holder_records)
-                db.commit()
-                log.info(f"[{formatted_symbol}] 成功同步 {len(main_holder_records)} 条主要股东数据")
-            
+            write_symbol_frame(
+                main_holder_df,
+                StockMainHolderDB,
+                formatted_symbol,
+                KEY_COLUMNS,
+                DATASET,
+            )
+            log.info(f"[{formatted_symbol}] 成功同步 {len(main_holder_df)} 条主要股东数据")
         except Exception as e:
-            db.rollback()
             log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
             raise
-        finally:
-            db.close()
 
-        return main_holder_records
+        return main_holder_df.to_dict("records")
 
     except Exception as e:
         log.error(f"[{formatted_symbol}] 获取主要股东数据失败: {e}")
@@ -105,47 +87,17 @@ def sync_stock_main_holder(symbol: str) -> List[Dict]:
         raise
 
 
-def sync_all_stock_main_holders(max_workers: int = 5):
+def sync_all_stock_main_holders(max_workers: int = 5, swap: bool = False):
     """
     同步所有股票的主要股东数据
 
     Args:
         max_workers: 最大并发数
+        swap: 写入暂存表，全部完成后原子切换为线上表
     """
     log.info("开始同步所有股票的主要股东数据")
 
-    # 获取所有股票代码
-    db = get_db_session()
-    try:
-        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
-        log.info(f"获取到 {len(symbols)} 个股票代码")
-    except Exception as e:
-        log.error(f"获取股票代码失败: {e}")
-        log.error(f"详细错误信息:\n{traceback.format_exc()}")
-        raise
-    finally:
-        db.close()
-
-    # 逐个同步主要股东数据
-    success_count = 0
-    fail_count = 0
-
-    for i, symbol in enumerate(symbols, 1):
-        try:
-            sync_stock_main_holder(symbol)
-            success_count += 1
-            log.info(f"进度: {i}/{len(symbols)} - [{symbol}] 同步成功")
-        except Exception as e:
-            fail_count += 1
-            log.error(f"进度: {i}/{len(symbols)} - [{symbol}] 同步失败: {e}")
-            log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-
-        # 显示进度
-        if i % 100 == 0 or i == len(symbols):
-            log.info(
-                f"主要股东数据同步进度: {i}/{len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-            )
+    symbols = load_spot_symbols()
 
-    log.info(
-        f"主要股东数据同步完成，总计: {len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-    )
\ No newline at end of file
+    with staging_swap(StockMainHolderDB, enabled=swap):
+        return run_symbols(sync_stock_main_holder, symbols, max_workers, "主要股东数据")
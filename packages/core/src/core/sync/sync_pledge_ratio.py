@@ -0,0 +1,92 @@
+import datetime
+import traceback
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from core.models import StockPledgeRatioDB
+from core.logger import log
+from core.data.calendar import get_trading_calendar
+from .ak_client import ak
+from .convert import prepare_frame
+from .sync_business_composition import format_a_stock_symbol
+from .writer import upsert_dataframe
+
+# akshare 返回的中文列名 -> 数据库字段
+COLUMN_MAP = {
+    "序号": "index",
+    "股票代码": "symbol",
+    "股票简称": "name",
+    "交易日期": "trade_date",
+    "所属行业": "industry",
+    "质押比例": "pledge_ratio",
+    "质押股数": "pledge_shares",
+    "质押市值": "pledge_value",
+    "质押笔数": "pledge_count",
+    "无限售股质押数": "unrestricted_pledge",
+    "限售股质押数": "restricted_pledge",
+    "近一年涨跌幅": "ytd_change",
+    "所属行业代码": "industry_code",
+}
+
+# 未指定日期时向前查找有数据的交易日的天数（数据按周发布）
+LOOKBACK_DAYS = 14
+
+
+def _fetch_pledge_ratio(date: str) -> pd.DataFrame:
+    try:
+        return ak.stock_gpzy_pledge_ratio_em(date=date)
+    except (KeyError, TypeError, ValueError) as e:
+        # 非发布日接口返回空结果，akshare 在整理空结果时会抛出异常
+        log.info(f"{date} 无上市公司质押比例数据: {e}")
+        return pd.DataFrame()
+
+
+def sync_stock_pledge_ratio(date: Optional[str] = None) -> List[Dict]:
+    """
+    同步全市场上市公司质押比例（东方财富）
+
+    质押比例接口按交易日返回全市场数据，一次请求覆盖全部股票，不需要逐只
+    调用。按 (股票代码, 交易日期) upsert，重复同步同一日期不会重复写入。
+
+    Args:
+        date: 交易日期，如 "20240906"；None 时从最近的交易日向前查找有数据的一天
+
+    Returns:
+        List of pledge ratio records
+    """
+    if date is not None:
+        dates = [date]
+    else:
+        today = datetime.date.today()
+        trading_days = get_trading_calendar().trading_days(
+            today - datetime.timedelta(days=LOOKBACK_DAYS), today
+        )
+        dates = [
+            pd.Timestamp(day).strftime("%Y%m%d") for day in trading_days[::-1]
+        ]
+
+    for trade_date in dates:
+        pledge_df = _fetch_pledge_ratio(trade_date)
+        if not pledge_df.empty:
+            break
+    else:
+        log.info(f"未获取到上市公司质押比例数据: {dates}")
+        return []
+
+    log.info(f"获取到 {len(pledge_df)} 条上市公司质押比例数据（{trade_date}）")
+
+    try:
+        pledge_df = prepare_frame(pledge_df, COLUMN_MAP)
+        pledge_df["symbol"] = pledge_df["symbol"].map(format_a_stock_symbol)
+        pledge_df["index"] = pledge_df["index"].astype(str)
+        pledge_df["trade_date"] = pd.to_datetime(pledge_df["trade_date"]).dt.date
+
+        upsert_dataframe(pledge_df, StockPledgeRatioDB, label="pledge_ratio")
+        log.info(f"成功同步 {len(pledge_df)} 条上市公司质押比例数据")
+    except Exception as e:
+        log.error(f"同步上市公司质押比例数据失败: {e}")
+        log.error(f"详细错误信息:\n{traceback.format_exc()}")
+        raise
+
+    return pledge_df.to_dict("records")
@@ -1,15 +1,22 @@
 from typing import Dict, List
-import akshare as ak
-import numpy as np
+from .ak_client import ak
 import datetime
-from core.models import StockSpotDB
-from core.database import get_db_session
+import pandas as pd
+from core.models import StockSpotDB, StockSpotHistoryDB
+from core.data.spot_history import is_enabled as spot_history_enabled
+from core.data.spot_history import snapshot_trade_date
 from core.logger import log
+from core.symbols import sync_symbol_master
+from .staging import swap_dataframe
+from .convert import fill_missing
+from .writer import upsert_dataframe
 
 
 def sync_stock_zh_a_spot_em():
     """
-    Sync stock data with optimized performance. Deletes all existing data before inserting new data.
+    Sync stock data with optimized performance. The new snapshot is bulk-loaded
+    into a staging table and swapped in atomically, so readers never see an
+    empty or partial table.
     """
     try:
         # Get real-time stock data using akshare
@@ -51,50 +58,59 @@ def sync_stock_zh_a_spot_em():
     # Add sync timestamp
     stock_df["sync_data"] = datetime.datetime.now()
 
-    # Convert numpy types to Python native types in bulk
-    for col in stock_df.select_dtypes(include=[np.integer]).columns:
-        stock_df[col] = stock_df[col].astype(int, errors="ignore")
-    for col in stock_df.select_dtypes(include=[np.floating]).columns:
-        stock_df[col] = stock_df[col].astype(float, errors="ignore")
+    # Fill NaN per column: 0 for numeric, empty string for text
+    fill_missing(stock_df)
 
-    # Fill NaN values
-    numeric_cols = stock_df.select_dtypes(include=[np.number]).columns
-    string_cols = stock_df.select_dtypes(include=["object"]).columns
+    # Load into a staging table and swap it in atomically
+    try:
+        swap_dataframe(stock_df, StockSpotDB, label="spot")
+        log.info(f"Successfully synced {len(stock_df)} stock records")
 
-    stock_df[numeric_cols] = stock_df[numeric_cols].fillna(0)
-    stock_df[string_cols] = stock_df[string_cols].fillna("")
+        # Maintain the symbol dictionary (codes and names)
+        sync_symbol_master(
+            stock_df["symbol"].tolist(),
+            dict(zip(stock_df["symbol"], stock_df["name"])),
+        )
 
-    # Convert to records
-    stocks = stock_df.to_dict("records")
+        # Keep the day's snapshot, the live table only holds the latest one
+        if spot_history_enabled():
+            append_spot_history(stock_df)
 
-    # Save to database with batch processing
-    db = get_db_session()
-    try:
-        # Delete all existing data first
-        db.query(StockSpotDB).delete()
-        log.info("Deleted all existing stock spot data")
+    except Exception as e:
+        log.error(f"Database operation failed: {e}")
+        raise
 
-        batch_size = 1000
-        total_records = len(stocks)
+    return stock_df.to_dict("records")
 
-        for i in range(0, total_records, batch_size):
-            batch = stocks[i : i + batch_size]
-            for stock in batch:
-                db_stock = StockSpotDB(**stock)
-                db.add(
-                    db_stock
-                )  # Use add instead of merge since we're doing fresh insert
 
-            db.commit()  # Commit in batches
-            log.info(f"Committed batch {i//batch_size + 1}, records: {len(batch)}")
+def append_spot_history(stock_df: pd.DataFrame, trade_date=None) -> int:
+    """
+    Append a spot snapshot to stock_spot_history_data.
 
-        log.info(f"Successfully synced {total_records} stock records")
+    Re-running on the same trade date overwrites that day's snapshot. The
+    trade date comes from the trading calendar: a snapshot taken on a
+    non-trading day or before the session opens holds the previous trading
+    day's close and is recorded under that day.
 
-    except Exception as e:
-        db.rollback()
-        log.error(f"Database operation failed: {e}")
-        raise
-    finally:
-        db.close()
+    Args:
+        stock_df: Spot data with the StockSpotDB column names
+        trade_date: Snapshot date, defaults to the trading day of sync_data
 
-    return stocks
\ No newline at end of file
+    Returns:
+        Number of rows written
+    """
+    if stock_df.empty:
+        return 0
+    trade_date = trade_date or snapshot_trade_date(
+        pd.Timestamp(stock_df["sync_data"].iloc[0]).to_pydatetime()
+    )
+    if trade_date is None:
+        log.warning("No trading day found for the spot snapshot, skipping history")
+        return 0
+
+    history_df = stock_df.copy()
+    history_df["trade_date"] = trade_date
+    history_df["sync_time"] = history_df["sync_data"]
+    rows = upsert_dataframe(history_df, StockSpotHistoryDB, label="spot_history")
+    log.info(f"Appended {rows} records to spot snapshot history")
+    return rows
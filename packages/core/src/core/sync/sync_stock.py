@@ -1,6 +1,5 @@
 from typing import Dict, List
-import akshare as ak
-import numpy as np
+from .ak_client import ak
 import datetime
 import time
 import random
@@ -1,24 +1,101 @@
-import akshare as ak
-import numpy as np
+from .ak_client import ak
 import datetime
+import hashlib
 import pandas as pd
 import traceback
-from typing import List, Dict
-from core.models import StockNewsDB, StockSpotDB
-from core.database import get_db_session
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import func, select
+from core.models import StockNewsDB, StockSyncStateDB
+from core.database import get_db_session, session_scope
 from core.logger import log
+from core.symbols import parse_symbol
 from .sync_business_composition import format_a_stock_symbol
+from .convert import fill_missing
+from .writer import upsert_dataframe
+from .runner import load_spot_symbols, run_symbols
 
 
-def sync_stock_news(symbol: str) -> List[Dict]:
+# 增量状态中的数据集名称
+DATASET = "news"
+
+# akshare 返回的中文列名 -> 数据库字段
+COLUMN_MAP = {
+    "关键词": "keyword",
+    "新闻标题": "title",
+    "新闻内容": "content",
+    "发布时间": "publish_time",
+    "文章来源": "source",
+    "新闻链接": "link",
+}
+
+# 每只股票的增量状态：(已保存新闻的最新发布时间, 最新一条新闻的 content_hash)
+NewsState = Tuple[Optional[datetime.datetime], Optional[str]]
+
+
+def content_hash(title: str, content: str) -> str:
+    """标题与正文的 SHA-1，用于同一股票内的新闻去重"""
+    text = f"{(title or '').strip()}\n{(content or '').strip()}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _symbol_forms(formatted_symbol: str) -> List[str]:
+    # 早期新闻以不带前缀的代码写入
+    return [formatted_symbol, parse_symbol(formatted_symbol).code]
+
+
+def load_news_states(symbols: Optional[List[str]] = None) -> Dict[str, NewsState]:
+    """
+    新闻增量状态，一次查询
+
+    Args:
+        symbols: 带前缀的股票代码，None 表示全市场
+    """
+    stmt = select(
+        StockSyncStateDB.symbol,
+        StockSyncStateDB.watermark,
+        StockSyncStateDB.digest,
+    ).where(StockSyncStateDB.dataset == DATASET)
+    if symbols is not None:
+        stmt = stmt.where(StockSyncStateDB.symbol.in_(symbols))
+    db = get_db_session()
+    try:
+        rows = db.execute(stmt).all()
+    finally:
+        db.close()
+    return {symbol: (watermark, digest) for symbol, watermark, digest in rows}
+
+
+def _load_news_state(formatted_symbol: str) -> NewsState:
+    """单只股票的增量状态；还没有状态时以已保存新闻的最新发布时间为水位"""
+    state = load_news_states([formatted_symbol]).get(formatted_symbol)
+    if state is not None:
+        return state
+    db = get_db_session()
+    try:
+        watermark = db.execute(
+            select(func.max(StockNewsDB.publish_time)).where(
+                StockNewsDB.symbol.in_(_symbol_forms(formatted_symbol))
+            )
+        ).scalar()
+    finally:
+        db.close()
+    return watermark, None
+
+
+def sync_stock_news(symbol: str, state: Optional[NewsState] = None) -> List[Dict]:
     """
-    同步单个股票的新闻资讯数据
+    增量同步单个股票的新闻资讯数据
+
+    接口每次返回最近的若干条新闻，按标题与正文计算 content_hash：
+    最新一条新闻的哈希与上次相同时直接跳过；否则只插入发布时间不早于水位、
+    且尚未保存过的新闻，已有新闻不会被删除或重复写入。
 
     Args:
         symbol: 股票代码，如 "603777"
+        state: 增量状态，None 时从数据库读取
 
     Returns:
-        List of stock news records
+        List of newly inserted stock news records
     """
     # 格式化股票代码
     formatted_symbol = format_a_stock_symbol(symbol)
@@ -26,6 +103,8 @@ def sync_stock_news(symbol: str) -> List[Dict]:
         log.info(f"股票代码已从 {symbol} 格式化为 {formatted_symbol}")
 
     try:
+        watermark, digest = state if state is not None else _load_news_state(formatted_symbol)
+
         # 获取个股新闻数据
         stock_news_df = ak.stock_news_em(symbol=formatted_symbol)
         log.info(f"[{formatted_symbol}] 获取到 {len(stock_news_df)} 条新闻数据")
@@ -35,68 +114,81 @@ def sync_stock_news(symbol: str) -> List[Dict]:
             return []
 
         # 重命名列以匹配数据库模型
-        stock_news_df.rename(
-            columns={
-                "关键词": "keyword",
-                "新闻标题": "title",
-                "新闻内容": "content",
-                "发布时间": "publish_time",
-                "文章来源": "source",
-                "新闻链接": "link",
-            },
-            inplace=True,
-        )
+        stock_news_df.rename(columns=COLUMN_MAP, inplace=True)
 
         # 添加股票代码列
-        stock_news_df["symbol"] = symbol
+        stock_news_df["symbol"] = formatted_symbol
 
         # 处理日期列
         stock_news_df["publish_time"] = pd.to_datetime(stock_news_df["publish_time"])
 
-        # 处理数值列中的 NaN 值
-        numeric_columns = stock_news_df.select_dtypes(include=[np.number]).columns
-        stock_news_df[numeric_columns] = stock_news_df[numeric_columns].fillna(0)
-
-        # 处理字符串列中的 NaN 值
-        string_columns = stock_news_df.select_dtypes(include=["object"]).columns
-        stock_news_df[string_columns] = stock_news_df[string_columns].fillna("")
-
-        # 转换为记录列表
-        stock_news = stock_news_df.to_dict("records")
-
-        # 转换 numpy 类型为 Python 原生类型
-        for record in stock_news:
-            for key, value in record.items():
-                if isinstance(value, np.integer):
-                    record[key] = int(value)
-                elif isinstance(value, np.floating):
-                    record[key] = float(value)
-                elif isinstance(value, pd.Timestamp):
-                    record[key] = value
-
-        # 保存到数据库
-        db = get_db_session()
-        try:
-            # 删除该股票已有的新闻数据（可选，根据业务需求决定是否保留历史数据）
-            db.query(StockNewsDB).filter(StockNewsDB.symbol == symbol).delete()
+        # 按列填充缺失值：数值列填 0，字符串列填空字符串
+        fill_missing(stock_news_df)
 
-            # 插入新数据
-            for record in stock_news:
-                db_stock_news = StockNewsDB(**record)
-                db.add(db_stock_news)
+        stock_news_df["content_hash"] = [
+            content_hash(title, content)
+            for title, content in zip(stock_news_df["title"], stock_news_df["content"])
+        ]
+        stock_news_df = stock_news_df.drop_duplicates("content_hash")
 
-            db.commit()
-            log.info(f"[{formatted_symbol}] 成功同步 {len(stock_news)} 条新闻数据")
+        headline = stock_news_df.loc[stock_news_df["publish_time"].idxmax()]
+        if digest is not None and headline["content_hash"] == digest:
+            log.info(f"[{formatted_symbol}] 最新新闻未变化，跳过")
+            return []
+
+        # 只保留不早于水位的新闻，同一时刻发布的新闻再按 content_hash 去重
+        if watermark is not None:
+            stock_news_df = stock_news_df[stock_news_df["publish_time"] >= watermark]
+        newest = headline["publish_time"].to_pydatetime()
+        if watermark is not None:
+            newest = max(newest, watermark)
 
+        try:
+            with session_scope() as session:
+                if not stock_news_df.empty:
+                    saved = set(
+                        session.execute(
+                            select(StockNewsDB.content_hash).where(
+                                StockNewsDB.symbol.in_(_symbol_forms(formatted_symbol)),
+                                StockNewsDB.content_hash.in_(
+                                    stock_news_df["content_hash"].tolist()
+                                ),
+                            )
+                        ).scalars()
+                    )
+                    stock_news_df = stock_news_df[~stock_news_df["content_hash"].isin(saved)]
+                # 并发写入同一股票时由唯一索引兜底，重复的新闻被忽略
+                upsert_dataframe(
+                    stock_news_df,
+                    StockNewsDB,
+                    update_columns=[],
+                    db=session,
+                    label=formatted_symbol,
+                )
+
+                now = datetime.datetime.now()
+                news_state = {
+                    "dataset": DATASET,
+                    "symbol": formatted_symbol,
+                    "checked_at": now,
+                    "watermark": newest,
+                    "digest": headline["content_hash"],
+                    "inserted": len(stock_news_df),
+                }
+                if len(stock_news_df):
+                    news_state["changed_at"] = now
+                upsert_dataframe(
+                    pd.DataFrame([news_state]),
+                    StockSyncStateDB,
+                    db=session,
+                    label=formatted_symbol,
+                )
+            log.info(f"[{formatted_symbol}] 成功同步 {len(stock_news_df)} 条新新闻")
         except Exception as e:
-            db.rollback()
             log.error(f"[{formatted_symbol}] 数据库操作失败: {e}")
-            log.error(f"[{formatted_symbol}] 详细错误信息:\n{traceback.format_exc()}")
             raise
-        finally:
-            db.close()
 
-        return stock_news
+        return stock_news_df.to_dict("records")
 
     except Exception as e:
         log.error(f"[{formatted_symbol}] 获取新闻数据失败: {e}")
@@ -104,44 +196,24 @@ def sync_stock_news(symbol: str) -> List[Dict]:
         raise
 
 
-def sync_all_stock_news():
+def sync_all_stock_news(max_workers: int = 5):
     """
-    同步所有股票的新闻数据
+    增量同步所有股票的新闻数据
+
+    全市场的增量状态一次读出；最新新闻未变化的股票不写库。
+
+    Args:
+        max_workers: 最大并发数
     """
     log.info("开始同步所有股票的新闻数据")
 
-    # 获取所有股票代码
-    db = get_db_session()
-    try:
-        symbols = [s[0] for s in db.query(StockSpotDB.symbol).all() if s[0]]
-        log.info(f"获取到 {len(symbols)} 个股票代码")
-    except Exception as e:
-        log.error(f"获取股票代码失败: {e}")
-        log.error(f"详细错误信息:\n{traceback.format_exc()}")
-        raise
-    finally:
-        db.close()
-
-    # 逐个同步新闻数据
-    success_count = 0
-    fail_count = 0
+    symbols = load_spot_symbols()
+    states = load_news_states()
 
-    for i, symbol in enumerate(symbols, 1):
-        try:
-            sync_stock_news(symbol)
-            success_count += 1
-            log.info(f"进度: {i}/{len(symbols)} - [{symbol}] 同步成功")
-        except Exception as e:
-            fail_count += 1
-            log.error(f"进度: {i}/{len(symbols)} - [{symbol}] 同步失败: {e}")
-            log.error(f"[{symbol}] 详细错误信息:\n{traceback.format_exc()}")
-
-        # 显示进度
-        if i % 10 == 0 or i == len(symbols):
-            log.info(
-                f"新闻数据同步进度: {i}/{len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
-            )
+    def sync_one(symbol: str) -> List[Dict]:
+        formatted_symbol = format_a_stock_symbol(symbol)
+        return sync_stock_news(symbol, states.get(formatted_symbol))
 
-    log.info(
-        f"新闻数据同步完成，总计: {len(symbols)}, 成功: {success_count}, 失败: {fail_count}"
+    return run_symbols(
+        sync_one, symbols, max_workers, "新闻数据", progress_every=10
     )
@@ -0,0 +1,271 @@
+"""
+基于 stock_sync_task_data 的租约任务队列
+
+每个同步日期的每只股票是一条任务。worker 通过带条件的 UPDATE 领取任务：
+只有状态仍可领取（pending / 到期的 failed / 租约过期的 running）的行才会被
+更新为 running 并写入自己的租约，UPDATE 影响行数为 1 即领取成功。条件判断
+与写入在同一条语句中完成，多个线程、进程或节点同时领取也不会重复处理。
+
+- 租约过期（worker 崩溃或被杀）的任务会被其他 worker 重新领取
+- 失败任务按指数退避设置 next_run_at，超过 max_attempts 次后不再领取
+- 领取顺序为 priority 从高到低
+- drain 循环领取直到队列中没有可领取的任务，不再有单次 500 条的上限
+- 每完成一个任务都会续期本 worker 仍持有的其他任务，限速降低后一批任务
+  的总耗时超过租约时长也不会被其他 worker 重复领取
+- 多个 worker 同时创建任务时以主键去重（INSERT IGNORE / ON CONFLICT DO NOTHING）
+
+租约时间由 .env 中的 SYNC_TASK_LEASE_SECONDS 配置，多节点部署时各节点时钟
+需要同步。
+"""
+
+import datetime
+import os
+import socket
+import uuid
+from typing import Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import and_, func, or_, select, update
+
+from core.models import StockSyncTaskDB
+from core.database import session_scope
+from core.logger import log
+from .writer import upsert_dataframe
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# 默认租约时长（秒），需覆盖单个任务的处理时间（每完成一个任务续期一次）
+DEFAULT_LEASE_SECONDS = 900
+# 单个任务最多尝试次数
+MAX_ATTEMPTS = 5
+# 失败重试的退避基数与上限（秒）
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+
+
+def lease_seconds() -> int:
+    return int(os.getenv("SYNC_TASK_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+
+
+def worker_id() -> str:
+    """当前 worker 的标识：主机名:进程号:随机后缀"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"[:64]
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """第 attempts 次失败后的重试间隔：60s、120s、240s …，最长 1 小时"""
+    seconds = RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)
+    return datetime.timedelta(seconds=min(seconds, RETRY_MAX_SECONDS))
+
+
+class TaskQueue:
+    """
+    某个同步日期的任务队列
+
+    Args:
+        date: 同步日期（任务的 date 列）
+        owner: worker 标识，默认自动生成
+        max_attempts: 单个任务最多尝试次数
+    """
+
+    def __init__(
+        self,
+        date: datetime.date,
+        owner: Optional[str] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.date = date
+        self.owner = owner or worker_id()
+        self.max_attempts = max_attempts
+        self.lease = datetime.timedelta(seconds=lease_seconds())
+
+    def enqueue(self, symbols: Iterable[str], priority: int = 0) -> int:
+        """为还没有任务的股票创建 pending 任务，返回新增任务数"""
+        symbols = list(dict.fromkeys(s for s in symbols if s))
+        with session_scope() as db:
+            existing = set(
+                db.execute(
+                    select(StockSyncTaskDB.symbol).where(StockSyncTaskDB.date == self.date)
+                ).scalars()
+            )
+            now = datetime.datetime.now()
+            new_tasks = pd.DataFrame(
+                {
+                    "date": self.date,
+                    "symbol": [symbol for symbol in symbols if symbol not in existing],
+                    "status": PENDING,
+                    "message": "等待同步",
+                    "priority": priority,
+                    "attempts": 0,
+                    "next_run_at": now,
+                }
+            )
+            # 其他 worker 同时创建的任务以主键去重，已存在的行保持不变
+            upsert_dataframe(
+                new_tasks, StockSyncTaskDB, update_columns=[], db=db, label="task_queue"
+            )
+        log.info(f"股票代码: {len(symbols)}, 已有任务: {len(existing)}, 新增任务: {len(new_tasks)}")
+        return len(new_tasks)
+
+    def _claimable(self, now: datetime.datetime):
+        attempts = func.coalesce(StockSyncTaskDB.attempts, 0)
+        return and_(
+            StockSyncTaskDB.date == self.date,
+            attempts < self.max_attempts,
+            or_(
+                and_(
+                    StockSyncTaskDB.status.in_([PENDING, FAILED]),
+                    or_(
+                        StockSyncTaskDB.next_run_at.is_(None),
+                        StockSyncTaskDB.next_run_at <= now,
+                    ),
+                ),
+                # 租约过期的任务视为 worker 已退出
+                and_(
+                    StockSyncTaskDB.status == RUNNING,
+                    StockSyncTaskDB.lease_expires_at < now,
+                ),
+            ),
+        )
+
+    def claim(self, limit: int = 100) -> List[str]:
+        """
+        领取最多 limit 个任务
+
+        Returns:
+            List[str]: 领取成功的股票代码
+        """
+        now = datetime.datetime.now()
+        claimable = self._claimable(now)
+        with session_scope() as db:
+            candidates = db.execute(
+                select(StockSyncTaskDB.symbol)
+                .where(claimable)
+                .order_by(
+                    func.coalesce(StockSyncTaskDB.priority, 0).desc(),
+                    StockSyncTaskDB.next_run_at,
+                )
+                .limit(limit)
+            ).scalars().all()
+
+            claimed = []
+            for symbol in candidates:
+                # 条件 UPDATE：其他 worker 已领取的行不再满足条件，影响行数为 0
+                result = db.execute(
+                    update(StockSyncTaskDB)
+                    .where(claimable, StockSyncTaskDB.symbol == symbol)
+                    .values(
+                        status=RUNNING,
+                        lease_owner=self.owner,
+                        lease_expires_at=now + self.lease,
+                        attempts=func.coalesce(StockSyncTaskDB.attempts, 0) + 1,
+                        start_time=now,
+                        message="同步中",
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 1:
+                    claimed.append(symbol)
+        if claimed:
+            log.info(f"[{self.owner}] 领取任务: {len(claimed)}/{len(candidates)}")
+        return claimed
+
+    def _held(self):
+        return and_(
+            StockSyncTaskDB.date == self.date,
+            StockSyncTaskDB.lease_owner == self.owner,
+            StockSyncTaskDB.status == RUNNING,
+        )
+
+    def renew(self) -> int:
+        """续期本 worker 仍持有的全部任务的租约，返回续期的任务数"""
+        with session_scope() as db:
+            return self._renew(db)
+
+    def _renew(self, db) -> int:
+        result = db.execute(
+            update(StockSyncTaskDB)
+            .where(self._held())
+            .values(lease_expires_at=datetime.datetime.now() + self.lease)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    def _finish(self, symbol: str, **values) -> bool:
+        # 只更新自己仍持有租约的任务，租约过期后被其他 worker 领取的不覆盖；
+        # 同时续期同一批中尚未完成的任务
+        with session_scope() as db:
+            result = db.execute(
+                update(StockSyncTaskDB)
+                .where(self._held(), StockSyncTaskDB.symbol == symbol)
+                .values(lease_owner=None, lease_expires_at=None, **values)
+                .execution_options(synchronize_session=False)
+            )
+            self._renew(db)
+        if result.rowcount != 1:
+            log.warning(f"[{symbol}] 任务租约已失效，结果未写回")
+            return False
+        return True
+
+    def complete(self, symbol: str, message: str, duration: float) -> bool:
+        return self._finish(
+            symbol,
+            status=COMPLETED,
+            message=message[:500],
+            duration=duration,
+            end_time=datetime.datetime.now(),
+        )
+
+    def fail(self, symbol: str, message: str, duration: float) -> bool:
+        """标记失败，按已尝试次数指数退避安排重试"""
+        with session_scope() as db:
+            attempts = db.execute(
+                select(StockSyncTaskDB.attempts).where(
+                    StockSyncTaskDB.date == self.date, StockSyncTaskDB.symbol == symbol
+                )
+            ).scalar() or 1
+        now = datetime.datetime.now()
+        if attempts >= self.max_attempts:
+            message = f"{message}（已尝试 {attempts} 次，不再重试）"
+        return self._finish(
+            symbol,
+            status=FAILED,
+            message=message[:500],
+            duration=duration,
+            end_time=now,
+            next_run_at=now + retry_delay(attempts),
+        )
+
+    def drain(self, process_batch, batch_size: int = 100) -> int:
+        """
+        循环领取并处理任务，直到没有可领取的任务
+
+        Args:
+            process_batch: process_batch(symbols)，处理一批已领取的任务，
+                           由其负责对每个任务调用 complete / fail
+            batch_size: 每次领取的任务数
+
+        Returns:
+            int: 处理的任务总数
+        """
+        total = 0
+        while True:
+            symbols = self.claim(batch_size)
+            if not symbols:
+                break
+            process_batch(symbols)
+            total += len(symbols)
+        return total
+
+    def summary(self) -> dict:
+        """各状态的任务数"""
+        with session_scope() as db:
+            rows = db.execute(
+                select(StockSyncTaskDB.status, func.count())
+                .where(StockSyncTaskDB.date == self.date)
+                .group_by(StockSyncTaskDB.status)
+            ).all()
+        return {status: count for status, count in rows}
@@ -0,0 +1,163 @@
+"""
+自适应请求速率控制（AIMD）
+
+数据源健康时（请求成功且延迟没有明显升高）线性提高请求速率与并发数；
+出现异常、超时或连续空响应（常见的限流表现）时按比例减半。相比固定的
+随机休眠，全量同步可以跑到数据源允许的最快速度，被限流时又能及时退让。
+
+线程池中使用 acquire / release；异步引擎使用 try_acquire / release，
+由令牌桶按 controller.rate 限速。
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from core.logger import log
+
+# 每次健康请求后速率的线性增量（次/秒）
+RATE_STEP = 0.1
+# 异常时速率与并发数的乘性减小系数
+BACKOFF_FACTOR = 0.5
+# 延迟超过基线的倍数时停止加速
+LATENCY_TOLERANCE = 2.0
+# 连续空响应达到该次数视为被限流；零星的空响应（停牌、非交易日）不处理
+EMPTY_STREAK = 5
+# 每处理多少个请求输出一次当前速率
+LOG_EVERY = 50
+# 未指定 max_rate 时速率上限为初始速率的倍数，.env 中的 FETCH_MAX_RATE_FACTOR 优先
+MAX_RATE_FACTOR = 4.0
+
+
+def max_rate_factor() -> float:
+    value = os.getenv("FETCH_MAX_RATE_FACTOR")
+    return float(value) if value else MAX_RATE_FACTOR
+
+
+class AdaptiveRateController:
+    """
+    AIMD 速率与并发控制器，线程安全
+
+    Args:
+        rate: 初始请求速率（次/秒）
+        concurrency: 初始并发数
+        min_rate: 速率下限
+        max_rate: 速率上限，默认为初始速率的 FETCH_MAX_RATE_FACTOR 倍（默认 4 倍）
+        max_concurrency: 并发上限，一般等于线程池大小
+        label: 日志前缀
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        concurrency: int = 1,
+        min_rate: float = 0.2,
+        max_rate: Optional[float] = None,
+        max_concurrency: int = 5,
+        label: str = "限速",
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * max_rate_factor()
+        self.rate = min(max(rate, min_rate), self.max_rate)
+        self.concurrency = float(min(max(1, concurrency), self.max_concurrency))
+        self.label = label
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+        self._empty_streak = 0
+        self._next_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """当前允许的在途请求数"""
+        return max(1, int(self.concurrency))
+
+    def acquire(self):
+        """阻塞直到并发与速率都允许发出下一个请求"""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            wait = max(0.0, self._next_at - now)
+            self._next_at = max(now, self._next_at) + 1.0 / self.rate
+        if wait:
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """不阻塞地占用一个并发名额，速率由调用方的令牌桶控制"""
+        with self._cond:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """归还名额，不计入速率调整（任务没有实际发出请求）"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, ok: bool, latency: float, empty: bool = False):
+        """
+        归还名额并按请求结果调整速率
+
+        Args:
+            ok: 请求是否成功
+            latency: 请求耗时（秒）
+            empty: 成功但数据源返回空数据
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+                self._backoff("请求失败")
+            elif empty:
+                self._empty_streak += 1
+                if self._empty_streak >= EMPTY_STREAK:
+                    self._empty_streak = 0
+                    self._backoff(f"连续 {EMPTY_STREAK} 次空响应")
+            else:
+                self._empty_streak = 0
+                self._observe(latency)
+            if self.requests % LOG_EVERY == 0:
+                self.log_state()
+            self._cond.notify_all()
+
+    def _observe(self, latency: float):
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        self.baseline = (
+            self.latency if self.baseline is None else min(self.baseline, self.latency)
+        )
+        if self.latency > self.baseline * LATENCY_TOLERANCE:
+            # 延迟升高说明数据源接近上限，保持当前速率
+            return
+        self.rate = min(self.max_rate, self.rate + RATE_STEP)
+        # 并发数每一轮（concurrency 个成功请求）加一
+        self.concurrency = min(
+            float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency
+        )
+
+    def _backoff(self, reason: str):
+        self.rate = max(self.min_rate, self.rate * BACKOFF_FACTOR)
+        self.concurrency = max(1.0, self.concurrency * BACKOFF_FACTOR)
+        # 退让期间暂停发出新请求
+        self._next_at = max(self._next_at, time.monotonic()) + 1.0 / self.rate
+        log.warning(
+            f"[{self.label}] {reason}，降低速率至 {self.rate:.2f} 次/秒，并发 {self.limit}"
+        )
+
+    def log_state(self):
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "-"
+        log.info(
+            f"[{self.label}] 当前速率 {self.rate:.2f} 次/秒，并发 {self.limit}，"
+            f"平均延迟 {latency}，请求 {self.requests}，失败 {self.errors}"
+        )
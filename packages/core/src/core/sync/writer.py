@@ -0,0 +1,358 @@
+"""
+同步模块共用的批量写入
+
+所有 sync_* 把整理好的 DataFrame 交给这里写库：
+
+- upsert_dataframe: 按主键冲突更新（MySQL ON DUPLICATE KEY UPDATE，
+  SQLite / DuckDB ON CONFLICT DO UPDATE），重复同步同一区间不会主键冲突
+- replace_dataframe: 在同一事务中删除满足条件的旧数据并插入新数据，
+  用于主键为自增ID、按股票整体替换的表
+- diff_dataframe: 同样按条件整体同步，但先读出已有数据按自然键比较，
+  只插入新增、更新变化、删除消失的行，内容不变时不产生任何写入
+
+DataFrame 由 core.sync.convert 按列转换为行元组，编译好的 INSERT 按块
+交给驱动的 executemany（MySQL 驱动会合并为多行 INSERT），并记录写入速度（行/秒）。
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import Float, String, Table, Text, bindparam, delete, insert, select, update
+
+from core.database import get_backend, session_scope
+from core.logger import log
+
+from .convert import to_rows
+
+# 每次 executemany 的最大行数
+WRITE_CHUNK_SIZE = 1000
+
+
+# 暂存表切换期间（见 core.sync.staging），对线上表的写入重定向到暂存表
+_staging_tables: Dict[str, Table] = {}
+
+
+def register_staging(table_name: str, staging: Table):
+    _staging_tables[table_name] = staging
+
+
+def unregister_staging(table_name: str):
+    _staging_tables.pop(table_name, None)
+
+
+def staging_active(model) -> bool:
+    """对 model 的写入当前是否被重定向到暂存表"""
+    table = model.__table__ if hasattr(model, "__table__") else model
+    return table.name in _staging_tables
+
+
+def _table_of(model) -> Table:
+    table = model.__table__ if hasattr(model, "__table__") else model
+    return _staging_tables.get(table.name, table)
+
+
+def to_records(df: pd.DataFrame, model) -> List[Dict[str, Any]]:
+    """将 DataFrame 转换为可直接写库的记录（列名 -> 值），转换规则见 core.sync.convert"""
+    names, rows = to_rows(df, _table_of(model))
+    return [dict(zip(names, row)) for row in rows]
+
+
+def _upsert_statement(table, update_columns: Sequence[str]):
+    backend = get_backend()
+    if backend == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        if not update_columns:
+            return stmt.prefix_with("IGNORE")
+        return stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in update_columns}
+        )
+
+    if backend == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        # duckdb-engine 基于 PostgreSQL 方言，ON CONFLICT 语法一致
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+    stmt = dialect_insert(table)
+    index_elements = [column.name for column in table.primary_key.columns]
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+
+
+def _execute_many(session, stmt, names: List[str], rows: List[tuple], chunk_size: int):
+    """
+    把语句编译为驱动 SQL，按块交给驱动的 executemany
+
+    位置参数风格（SQLite 的 ?、MySQL 的 %s）直接传行元组，不再构造字典；
+    命名参数风格才按列名组装。
+    """
+    connection = session.connection()
+    compiled = stmt.compile(dialect=connection.dialect, column_keys=names)
+    if set(compiled.binds) - set(names):
+        # 语句带有列默认值等额外参数时交给 SQLAlchemy 处理
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i : i + chunk_size]
+            session.execute(stmt, [dict(zip(names, row)) for row in chunk])
+        return
+    if compiled.positional:
+        order = [names.index(key) for key in compiled.positiontup]
+        if order != list(range(len(names))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+        params = rows
+    else:
+        params = [dict(zip(names, row)) for row in rows]
+    for i in range(0, len(params), chunk_size):
+        connection.exec_driver_sql(compiled.string, params[i : i + chunk_size])
+
+
+def _filter(stmt, table: Table, where: Optional[Dict[str, Any]]):
+    """按 {列名: 值} 追加条件，值为列表时按 IN 匹配"""
+    for column, value in (where or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            stmt = stmt.where(table.columns[column].in_(list(value)))
+        else:
+            stmt = stmt.where(table.columns[column] == value)
+    return stmt
+
+
+def _log_rate(label: str, action: str, table_name: str, rows: int, started: float):
+    elapsed = time.time() - started
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    log.info(
+        f"[{label}] {action} {table_name} {rows} 条，耗时 {elapsed:.2f}s，{rate:.0f} 行/秒"
+    )
+
+
+def _run(write, db=None):
+    """在调用方会话中执行（由调用方提交），或使用独立会话并提交"""
+    if db is not None:
+        return write(db)
+    with session_scope() as session:
+        return write(session)
+
+
+def upsert_dataframe(
+    df: pd.DataFrame,
+    model,
+    update_columns: Optional[Sequence[str]] = None,
+    chunk_size: int = WRITE_CHUNK_SIZE,
+    db=None,
+    label: str = "writer",
+) -> int:
+    """
+    按主键批量写入，主键冲突时更新
+
+    Args:
+        df: 待写入数据，多余的列会被忽略
+        model: 目标 ORM 模型或 Table
+        update_columns: 冲突时更新的列，默认除主键外的全部写入列；空列表表示忽略冲突
+        chunk_size: 每次 executemany 的最大行数
+        db: 调用方会话，传入时不提交事务
+        label: 日志前缀，通常为股票代码
+
+    Returns:
+        int: 写入行数
+    """
+    table = _table_of(model)
+    names, rows = to_rows(df, table)
+    if not rows:
+        return 0
+
+    primary_keys = {column.name for column in table.primary_key.columns}
+    if update_columns is None:
+        update_columns = [c for c in names if c not in primary_keys]
+
+    def write(session):
+        started = time.time()
+        stmt = _upsert_statement(table, update_columns)
+        _execute_many(session, stmt, names, rows, chunk_size)
+        _log_rate(label, "写入", table.name, len(rows), started)
+        return len(rows)
+
+    return _run(write, db)
+
+
+def replace_dataframe(
+    df: pd.DataFrame,
+    model,
+    where: Optional[Dict[str, Any]] = None,
+    chunk_size: int = WRITE_CHUNK_SIZE,
+    db=None,
+    label: str = "writer",
+    allow_empty: bool = False,
+) -> int:
+    """
+    在同一事务中删除旧数据并批量插入新数据
+
+    df 为空时默认不做任何操作，避免接口偶发返回空数据时清空已有数据。
+
+    Args:
+        df: 待写入数据，多余的列会被忽略
+        model: 目标 ORM 模型或 Table
+        where: 删除条件 {列名: 值}，值为列表时按 IN 匹配，None 表示清空整表
+        chunk_size: 每次 executemany 的最大行数
+        db: 调用方会话，传入时不提交事务
+        label: 日志前缀，通常为股票代码
+        allow_empty: df 为空时仍删除 where 匹配的旧数据
+
+    Returns:
+        int: 插入行数
+    """
+    table = _table_of(model)
+    names, rows = to_rows(df, table)
+    if not rows and not allow_empty:
+        return 0
+
+    def write(session):
+        started = time.time()
+        session.execute(_filter(delete(table), table, where))
+        if rows:
+            _execute_many(session, insert(table), names, rows, chunk_size)
+        _log_rate(label, "替换", table.name, len(rows), started)
+        return len(rows)
+
+    return _run(write, db)
+
+
+@dataclass
+class DiffResult:
+    """diff_dataframe 的变更统计"""
+
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+
+def _comparer(column_type) -> Callable[[Any], Any]:
+    """比较前统一已有数据与新数据的取值"""
+    if isinstance(column_type, (String, Text)):
+        return lambda value: value if value is None else str(value)
+    if isinstance(column_type, Float):
+        # MySQL FLOAT 为单精度，读回的值与写入的双精度不完全相同，按 6 位有效数字比较
+        return lambda value: value if value is None else float(f"{value:.6g}")
+    return lambda value: value
+
+
+def diff_dataframe(
+    df: pd.DataFrame,
+    model,
+    key_columns: Sequence[str],
+    where: Optional[Dict[str, Any]] = None,
+    chunk_size: int = WRITE_CHUNK_SIZE,
+    db=None,
+    label: str = "writer",
+) -> DiffResult:
+    """
+    按自然键比较后增量写入，结果与 replace_dataframe 相同
+
+    读出满足 where 的已有行，与新数据按 key_columns 配对：新数据独有的行插入，
+    已有数据独有的行删除，两边都有且写入列内容不同的行按主键更新，其余不动。
+    任一边存在重复的自然键时无法配对，退回整体替换。
+
+    Args:
+        df: 待写入数据，多余的列会被忽略
+        model: 目标 ORM 模型或 Table，需有单列主键（自增ID）
+        key_columns: 自然键，须为写入列
+        where: 同步范围 {列名: 值}，值为列表时按 IN 匹配，None 表示整表
+        chunk_size: 每次 executemany 的最大行数
+        db: 调用方会话，传入时不提交事务
+        label: 日志前缀，通常为股票代码
+
+    Returns:
+        DiffResult: 新增 / 更新 / 删除 / 未变的行数
+    """
+    table = _table_of(model)
+    primary_keys = [column.name for column in table.primary_key.columns]
+    if len(primary_keys) != 1:
+        raise ValueError(f"{table.name} 需要单列主键才能按差异写入")
+    primary_key = table.columns[primary_keys[0]]
+
+    names, rows = to_rows(df, table)
+    if not rows:
+        # 与 replace_dataframe 一致：新数据为空时保留已有数据
+        return DiffResult()
+    compare = [name for name in names if name != primary_key.name]
+    missing_keys = [key for key in key_columns if key not in compare]
+    if missing_keys:
+        raise ValueError(f"{table.name} 写入列中缺少自然键: {missing_keys}")
+    positions = [names.index(name) for name in compare]
+    comparers = [_comparer(table.columns[name].type) for name in compare]
+    key_positions = [compare.index(key) for key in key_columns]
+
+    def signature(values) -> tuple:
+        return tuple(comparer(value) for comparer, value in zip(comparers, values))
+
+    def key_of(values: tuple) -> tuple:
+        return tuple(values[i] for i in key_positions)
+
+    incoming = {}
+    for row in rows:
+        values = signature(row[i] for i in positions)
+        incoming[key_of(values)] = (row, values)
+
+    def write(session):
+        started = time.time()
+        query = select(primary_key, *[table.columns[name] for name in compare])
+        existing = session.execute(_filter(query, table, where)).all()
+        current = {}
+        for row in existing:
+            values = signature(row[1:])
+            current[key_of(values)] = (row[0], values)
+
+        if len(incoming) != len(rows) or len(current) != len(existing):
+            log.warning(f"[{label}] {table.name} 自然键 {list(key_columns)} 存在重复，整体替换")
+            session.execute(_filter(delete(table), table, where))
+            if rows:
+                _execute_many(session, insert(table), names, rows, chunk_size)
+            result = DiffResult(inserted=len(rows), deleted=len(existing))
+            _log_rate(label, "替换", table.name, len(rows), started)
+            return result
+
+        inserts = [row for key, (row, _) in incoming.items() if key not in current]
+        deletes = [pk for key, (pk, _) in current.items() if key not in incoming]
+        updates = [
+            (current[key][0], row)
+            for key, (row, values) in incoming.items()
+            if key in current and current[key][1] != values
+        ]
+        result = DiffResult(
+            inserted=len(inserts),
+            updated=len(updates),
+            deleted=len(deletes),
+            unchanged=len(incoming) - len(inserts) - len(updates),
+        )
+
+        for i in range(0, len(deletes), chunk_size):
+            session.execute(delete(table).where(primary_key.in_(deletes[i : i + chunk_size])))
+        if inserts:
+            _execute_many(session, insert(table), names, inserts, chunk_size)
+        if updates:
+            stmt = update(table).where(primary_key == bindparam("row_pk"))
+            params = [
+                {"row_pk": pk, **{name: row[i] for name, i in zip(compare, positions)}}
+                for pk, row in updates
+            ]
+            for i in range(0, len(params), chunk_size):
+                session.execute(stmt, params[i : i + chunk_size])
+
+        elapsed = time.time() - started
+        log.info(
+            f"[{label}] 差异写入 {table.name}: 新增 {result.inserted}，更新 {result.updated}，"
+            f"删除 {result.deleted}，未变 {result.unchanged}，耗时 {elapsed:.2f}s"
+        )
+        return result
+
+    return _run(write, db)
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+import pytest
+
+# core.database 在导入时按环境变量创建引擎，测试使用临时 SQLite 库
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault(
+    "SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="core-test-"), "test.db")
+)
+os.environ.setdefault("AK_CACHE_MODE", "off")
+
+
+@pytest.fixture(scope="session")
+def db():
+    """在临时库中创建全部表"""
+    from core.database import init_db
+
+    init_db()
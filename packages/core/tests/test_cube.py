@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from core.data.cube import OhlcvCube
+from core.models import StockHistoryDB
+from core.symbols import symbol_registry
+from core.sync.writer import upsert_dataframe
+
+ADJUST = "cube-test"
+DAYS = pd.bdate_range("2024-09-02", "2024-09-13")
+
+
+def _write_bars(symbol: str, days, close: float):
+    upsert_dataframe(
+        pd.DataFrame(
+            {
+                "symbol": symbol,
+                "symbol_id": symbol_registry.id_of(symbol),
+                "adjust": ADJUST,
+                "date": [day.date() for day in days],
+                "close": close,
+            }
+        ),
+        StockHistoryDB,
+    )
+
+
+def test_wide_frame_is_a_view_over_the_memmap(db, tmp_path):
+    _write_bars("600010", DAYS, 1.0)
+    cube = OhlcvCube(ADJUST, root=tmp_path)
+    cube.build()
+
+    view = cube.open()
+    frame = view.frame("close")
+    assert np.shares_memory(frame.to_numpy(), view.values)
+    assert frame.loc["600010"].tolist() == [1.0] * len(DAYS)
+    assert view.sel(start_date=DAYS[5]).frame("close").shape == (1, len(DAYS) - 5)
+
+
+def test_update_since_rewrites_repaired_history(db, tmp_path):
+    gap = DAYS[3:6]
+    _write_bars("600011", DAYS, 1.0)
+    _write_bars("600012", DAYS.difference(gap), 2.0)
+    cube = OhlcvCube(ADJUST, root=tmp_path)
+    cube.build()
+    assert np.isnan(cube.open().frame("close").loc["600012", gap]).all()
+
+    # 修补中间缺口：默认的增量更新只从最后一个交易日起重写
+    _write_bars("600012", gap, 2.0)
+    cube.update()
+    assert np.isnan(cube.open().frame("close").loc["600012", gap]).all()
+
+    cube.update(since=gap[0])
+    assert (cube.open().frame("close").loc["600012", gap] == 2.0).all()
@@ -0,0 +1,29 @@
+from core.sync.engine import FetchEngine, FetchJob
+
+
+def _jobs(batch: int, count: int):
+    return [
+        FetchJob(key=f"{batch}:{i}", provider="em", func=lambda i=i: i)
+        for i in range(count)
+    ]
+
+
+def test_engine_reused_across_batches():
+    # sync_hist_all 的 async 引擎跨多个领取批次复用同一个 FetchEngine，
+    # 每批都会在新的事件循环中运行
+    engine = FetchEngine(max_workers=4, rates={"em": 200.0}, adaptive=False)
+    # 桶容量为 1，并发请求需要在锁内等待令牌
+    bucket = engine.bucket("em")
+    bucket.capacity = bucket.tokens = 1
+    written = []
+
+    def write(job, data):
+        written.append(job.key)
+        return 1
+
+    for batch in range(3):
+        result = engine.run(_jobs(batch, 5), write, label="测试")
+        assert result.failed == 0, result.failures
+        assert result.success == 5
+
+    assert len(written) == 15
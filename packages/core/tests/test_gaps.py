@@ -0,0 +1,59 @@
+import datetime
+
+import pandas as pd
+
+from core.data.calendar import TradingCalendar
+from core.sync.gaps import find_gaps
+
+# 2024 年国庆假期 10-01 ~ 10-07 休市
+HOLIDAY = pd.date_range("2024-10-01", "2024-10-07")
+CALENDAR_DAYS = pd.bdate_range("2024-09-02", "2024-10-31").difference(HOLIDAY)
+
+
+def _bars(symbol: str, days) -> pd.DataFrame:
+    return pd.DataFrame({"symbol": symbol, "date": [day.date() for day in days]})
+
+
+def _day(text: str) -> datetime.date:
+    return datetime.date.fromisoformat(text)
+
+
+def test_suspension_span_is_one_gap():
+    calendar = TradingCalendar(CALENDAR_DAYS)
+    suspended = pd.bdate_range("2024-09-10", "2024-09-13")
+    bars = _bars("600000", CALENDAR_DAYS.difference(suspended))
+
+    gaps = find_gaps(bars, calendar)
+    assert gaps.to_dict("records") == [
+        {
+            "symbol": "600000",
+            "start_date": _day("2024-09-10"),
+            "end_date": _day("2024-09-13"),
+            "missing": 4,
+        }
+    ]
+
+
+def test_gaps_within_five_trading_days_are_merged():
+    calendar = TradingCalendar(CALENDAR_DAYS)
+    # 09-03 与 09-11 之间有 5 个交易日（09-04 ~ 09-10），合并为一个区间；
+    # 09-20 与前一个缺口之间有 6 个交易日（09-12 ~ 09-19），单独成为一个区间
+    missing = pd.to_datetime(["2024-09-03", "2024-09-11", "2024-09-20"])
+    bars = _bars("000001", CALENDAR_DAYS.difference(missing))
+
+    gaps = find_gaps(bars, calendar)
+    ranges = gaps[["start_date", "end_date", "missing"]].to_records(index=False)
+    assert [tuple(row) for row in ranges] == [
+        (_day("2024-09-03"), _day("2024-09-11"), 2),
+        (_day("2024-09-20"), _day("2024-09-20"), 1),
+    ]
+    assert find_gaps(bars, calendar, merge_within=4)["missing"].tolist() == [1, 1, 1]
+
+
+def test_holiday_is_not_a_gap_inside_or_beyond_the_calendar():
+    bars = _bars("600519", CALENDAR_DAYS)
+    assert find_gaps(bars, TradingCalendar(CALENDAR_DAYS)).empty
+
+    # 交易日历止于假期前，假期之后的行情不按工作日推断为缺口
+    known = CALENDAR_DAYS[CALENDAR_DAYS < "2024-10-01"]
+    assert find_gaps(bars, TradingCalendar(known)).empty
@@ -0,0 +1,56 @@
+import datetime
+import threading
+import time
+
+from core.sync.task_queue import TaskQueue
+
+
+def test_concurrent_enqueue_creates_each_task_once(db):
+    # 多个分片 worker 同时为同一日期创建任务，读到的已有任务都为空
+    date = datetime.date(2001, 1, 1)
+    symbols = [f"{i:06d}" for i in range(500)]
+    errors = []
+
+    def enqueue():
+        try:
+            TaskQueue(date).enqueue(symbols)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=enqueue) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert TaskQueue(date).summary() == {"pending": 500}
+    assert TaskQueue(date).enqueue(symbols) == 0
+
+
+def test_finishing_a_task_renews_the_rest_of_the_batch(db, monkeypatch):
+    monkeypatch.setenv("SYNC_TASK_LEASE_SECONDS", "1")
+    date = datetime.date(2001, 1, 2)
+    queue = TaskQueue(date)
+    queue.enqueue(["000001", "000002"])
+    assert sorted(queue.claim(10)) == ["000001", "000002"]
+
+    # 第一个任务耗时超过租约，完成时续期同一批中的第二个任务
+    time.sleep(1.1)
+    assert queue.complete("000001", "ok", 1.1)
+    assert TaskQueue(date).claim(10) == []
+    assert queue.complete("000002", "ok", 0.1)
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(db, monkeypatch):
+    monkeypatch.setenv("SYNC_TASK_LEASE_SECONDS", "1")
+    date = datetime.date(2001, 1, 3)
+    first = TaskQueue(date)
+    first.enqueue(["000001"])
+    assert first.claim(10) == ["000001"]
+
+    time.sleep(1.1)
+    second = TaskQueue(date)
+    assert second.claim(10) == ["000001"]
+    assert not first.complete("000001", "ok", 1.1)
+    assert second.complete("000001", "ok", 0.1)
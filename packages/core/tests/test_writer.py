@@ -0,0 +1,198 @@
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+
+from core.database import session_scope
+from core.models import StockGdhsDB, StockSyncStateDB
+from core.sync import writer
+from core.sync.fundamentals import write_symbol_frame
+from core.sync.writer import diff_dataframe, replace_dataframe, upsert_dataframe
+
+
+def _states(dataset: str):
+    with session_scope() as db:
+        return db.execute(
+            select(StockSyncStateDB.symbol, StockSyncStateDB.inserted)
+            .where(StockSyncStateDB.dataset == dataset)
+            .order_by(StockSyncStateDB.symbol)
+        ).all()
+
+
+def _gdhs(symbol: str):
+    with session_scope() as db:
+        return db.execute(
+            select(StockGdhsDB.end_date, StockGdhsDB.current_gdhs)
+            .where(StockGdhsDB.symbol == symbol)
+            .order_by(StockGdhsDB.end_date)
+        ).all()
+
+
+def _gdhs_ids(symbols):
+    with session_scope() as db:
+        return db.execute(
+            select(StockGdhsDB.id, StockGdhsDB.symbol, StockGdhsDB.end_date)
+            .where(StockGdhsDB.symbol.in_(symbols))
+            .order_by(StockGdhsDB.end_date)
+        ).all()
+
+
+def _gdhs_frame(symbol: str, values: dict) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "symbol": symbol,
+            "end_date": list(values),
+            "current_gdhs": list(values.values()),
+        }
+    )
+
+
+def test_upsert_is_idempotent(db):
+    df = pd.DataFrame(
+        {"dataset": "upsert", "symbol": ["SH600000", "SZ000001"], "inserted": [1, 2]}
+    )
+    assert upsert_dataframe(df, StockSyncStateDB) == 2
+    assert upsert_dataframe(df, StockSyncStateDB) == 2
+    assert _states("upsert") == [("SH600000", 1), ("SZ000001", 2)]
+
+    # 主键冲突时更新写入列
+    df["inserted"] = [3, 4]
+    upsert_dataframe(df, StockSyncStateDB)
+    assert _states("upsert") == [("SH600000", 3), ("SZ000001", 4)]
+
+
+def test_upsert_with_empty_update_columns_keeps_existing_rows(db):
+    df = pd.DataFrame({"dataset": "ignore", "symbol": ["SH600000"], "inserted": [1]})
+    upsert_dataframe(df, StockSyncStateDB)
+
+    df = pd.DataFrame(
+        {"dataset": "ignore", "symbol": ["SH600000", "SZ000001"], "inserted": [9, 2]}
+    )
+    upsert_dataframe(df, StockSyncStateDB, update_columns=[])
+    assert _states("ignore") == [("SH600000", 1), ("SZ000001", 2)]
+
+
+def test_conflict_statement_per_backend(monkeypatch):
+    table = StockSyncStateDB.__table__
+
+    monkeypatch.setattr(writer, "get_backend", lambda: "mysql")
+    ignore = str(writer._upsert_statement(table, []).compile(dialect=mysql.dialect()))
+    assert ignore.startswith("INSERT IGNORE INTO stock_sync_state_data")
+    update = str(
+        writer._upsert_statement(table, ["inserted"]).compile(dialect=mysql.dialect())
+    )
+    assert "ON DUPLICATE KEY UPDATE inserted = VALUES(inserted)" in update
+
+    monkeypatch.setattr(writer, "get_backend", lambda: "sqlite")
+    ignore = str(writer._upsert_statement(table, []).compile(dialect=sqlite.dialect()))
+    assert ignore.endswith("ON CONFLICT (dataset, symbol) DO NOTHING")
+
+
+def test_replace_keeps_rows_when_frame_is_empty(db):
+    df = pd.DataFrame(
+        {
+            "symbol": "SH600001",
+            "end_date": ["2024-06-30", "2024-09-30"],
+            "current_gdhs": [1.0, 2.0],
+        }
+    )
+    assert replace_dataframe(df, StockGdhsDB, {"symbol": "SH600001"}) == 2
+
+    # 接口偶发返回空数据时默认不清空已有数据
+    empty = df.iloc[0:0]
+    assert replace_dataframe(empty, StockGdhsDB, {"symbol": "SH600001"}) == 0
+    assert _gdhs("SH600001") == [("2024-06-30", 1.0), ("2024-09-30", 2.0)]
+
+    assert (
+        replace_dataframe(
+            empty, StockGdhsDB, {"symbol": "SH600001"}, allow_empty=True
+        )
+        == 0
+    )
+    assert _gdhs("SH600001") == []
+
+
+def test_diff_counts_inserts_updates_and_deletes(db):
+    where = {"symbol": "SH600002"}
+    df = _gdhs_frame("SH600002", {"2024-03-31": 1.0, "2024-06-30": 2.0})
+    result = diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+    assert (result.inserted, result.updated, result.deleted) == (2, 0, 0)
+    ids = dict((end_date, id_) for id_, _, end_date in _gdhs_ids(["SH600002"]))
+
+    df = _gdhs_frame("SH600002", {"2024-06-30": 5.0, "2024-09-30": 3.0})
+    result = diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+    assert (result.inserted, result.updated, result.deleted) == (1, 1, 1)
+    assert result.unchanged == 0
+    assert _gdhs("SH600002") == [("2024-06-30", 5.0), ("2024-09-30", 3.0)]
+    # 更新的行按主键原地修改
+    assert _gdhs_ids(["SH600002"])[0][0] == ids["2024-06-30"]
+
+    result = diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+    assert (result.changed, result.unchanged) == (0, 2)
+
+
+def test_diff_compares_floats_at_six_significant_digits(db):
+    where = {"symbol": "SH600003"}
+
+    def write(value: float):
+        df = pd.DataFrame(
+            {
+                "symbol": "SH600003",
+                "end_date": ["2024-06-30"],
+                "average_hold_value": [value],
+            }
+        )
+        return diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+
+    write(123456.1)
+    # MySQL FLOAT 读回的单精度误差不算变化
+    result = write(123456.1000001)
+    assert (result.updated, result.unchanged) == (0, 1)
+    assert write(123457.0).updated == 1
+
+
+def test_diff_falls_back_to_replace_on_duplicate_keys(db):
+    where = {"symbol": "SH600004"}
+    df = _gdhs_frame("SH600004", {"2024-06-30": 1.0})
+    diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+
+    df = pd.DataFrame(
+        {
+            "symbol": "SH600004",
+            "end_date": ["2024-09-30", "2024-09-30"],
+            "current_gdhs": [2.0, 3.0],
+        }
+    )
+    result = diff_dataframe(df, StockGdhsDB, ["end_date"], where)
+    assert (result.inserted, result.deleted) == (2, 1)
+    assert _gdhs("SH600004") == [("2024-09-30", 2.0), ("2024-09-30", 3.0)]
+
+
+def test_diff_rewrites_legacy_unprefixed_symbols(db):
+    diff_dataframe(
+        _gdhs_frame("600005", {"2024-06-30": 1.0}),
+        StockGdhsDB,
+        ["end_date"],
+        {"symbol": "600005"},
+    )
+    legacy_id = _gdhs_ids(["600005"])[0][0]
+
+    result = diff_dataframe(
+        _gdhs_frame("SH600005", {"2024-06-30": 1.0}),
+        StockGdhsDB,
+        ["end_date"],
+        {"symbol": ["SH600005", "600005"]},
+    )
+    assert (result.inserted, result.updated, result.deleted) == (0, 1, 0)
+    assert _gdhs_ids(["SH600005", "600005"]) == [(legacy_id, "SH600005", "2024-06-30")]
+
+
+def test_fundamentals_default_to_diff_writes(db, monkeypatch):
+    monkeypatch.delenv("FUNDAMENTALS_WRITE_MODE", raising=False)
+    df = _gdhs_frame("SH600006", {"2024-06-30": 1.0})
+    write_symbol_frame(df, StockGdhsDB, "SH600006", ["end_date"], "test_gdhs")
+    ids = _gdhs_ids(["SH600006"])
+
+    result = write_symbol_frame(df, StockGdhsDB, "SH600006", ["end_date"], "test_gdhs")
+    assert (result.changed, result.unchanged) == (0, 1)
+    # 未变化的行不删除重插，自增ID保持不变
+    assert _gdhs_ids(["SH600006"]) == ids